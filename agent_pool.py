@@ -0,0 +1,126 @@
+"""
+agent_pool.py - one agent per (browser) session, from a bounded pool
+
+A module-level Agent is shared by every session of the Streamlit server: users
+see each other's chat history (it lives in the agent's memory) and their runs
+serialize on one object. AgentPool hands out a separate agent per session key
+(the agent's session id, one per chat - kept in the Streamlit session state)
+instead
+    - agents are built lazily, on the session's first request
+    - once there are more than max_agents, the least recently used idle agents
+      are evicted (an agent that is in use is never evicted); so are agents idle
+      for longer than idle_ttl (abandoned browser tabs)
+    - an evicted session just gets a new agent next time - its history is
+      reloaded from the agent's storage. So a new chat needs a new key (not
+      agent.new_session(), which is lost when the agent is rebuilt) - discard()
+      the old one
+Pool hits/misses & the no of active agents are available from stats().
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Generic, Iterator, Optional, TypeVar
+
+from tracing import span
+
+T = TypeVar("T")
+
+# max no of agents kept around
+MAX_AGENTS = 32
+# agents not used for this long are evicted (seconds)
+IDLE_TTL = 30 * 60
+
+
+class AgentPool(Generic[T]):
+    def __init__(
+        self,
+        factory: Callable[[str], T],
+        max_agents: int = MAX_AGENTS,
+        idle_ttl: Optional[float] = IDLE_TTL,
+    ):
+        """factory - builds the agent for a session key"""
+        self.factory = factory
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl
+
+        # key -> agent, least recently used first
+        self._agents: "OrderedDict[str, T]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        # no of runs using each agent right now
+        self._in_use: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> T:
+        """the agent for a session, built on first use"""
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self.hits += 1
+                self._touch(key)
+                return agent
+            self.misses += 1
+
+        # build outside the lock, so other sessions are not held up
+        with span("agent_pool.build"):
+            agent = self.factory(key)
+        with self._lock:
+            # another request of the same session may have beaten us to it
+            agent = self._agents.setdefault(key, agent)
+            self._touch(key)
+            self._evict()
+        return agent
+
+    @contextmanager
+    def checkout(self, key: str) -> Iterator[T]:
+        """the agent for a session, which is not evicted while the block runs"""
+        agent = self.get(key)
+        with self._lock:
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+        try:
+            yield agent
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                if self._in_use[key] == 0:
+                    del self._in_use[key]
+                self._touch(key)
+
+    def discard(self, key: str) -> None:
+        """forget the agent of a session (e.g. the session has ended)"""
+        with self._lock:
+            self._agents.pop(key, None)
+            self._last_used.pop(key, None)
+
+    def _touch(self, key: str) -> None:
+        if key in self._agents:
+            self._agents.move_to_end(key)
+            self._last_used[key] = time.monotonic()
+
+    def _evict(self) -> None:
+        """drop idle agents - expired ones & the least recently used over max_agents"""
+        now = time.monotonic()
+        for key in list(self._agents):
+            if key in self._in_use:
+                continue
+            expired = self.idle_ttl is not None and now - self._last_used[key] > self.idle_ttl
+            if not expired and len(self._agents) <= self.max_agents:
+                # the rest were used more recently
+                break
+            del self._agents[key]
+            del self._last_used[key]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "active_agents": len(self._agents),
+                "busy_agents": len(self._in_use),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
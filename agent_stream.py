@@ -0,0 +1,172 @@
+"""
+agent_stream.py - stream an agent's run (tool calls & all) to a Streamlit app
+
+agent.run(prompt, stream=True) runs the agent on the Streamlit script thread, so
+the script blocks in there for every tool call & the app shows nothing till the
+first token of the answer arrives. AgentStream instead
+    - runs agent.arun() on a background asyncio event loop (one per process,
+      shared by all sessions)
+    - passes the chunks to the script thread through a bounded queue - if the
+      app falls behind, the run waits (backpressure) instead of piling up chunks
+    - turns the intermediate steps into events, so the app can show which tool
+      is running (& when it's done) while the agent works
+If the script stops (e.g. the user sends another prompt), the run is cancelled.
+
+Each run is traced (see tracing.py) as an "agent.run" span - with the time to
+first token, tokens/second & the time spent in the model vs in tools - with a
+span for each tool call in it.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+
+from agno.agent import Agent
+from agno.run.response import RunEvent, RunResponse
+
+from tracing import record_output, start_span, use_span
+
+# max no of chunks waiting for the app
+QUEUE_SIZE = 64
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+# marks the end of a run in the queue
+_DONE = object()
+
+
+def event_loop() -> asyncio.AbstractEventLoop:
+    """the background event loop the agents run on (started on first use)"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-stream-loop", daemon=True).start()
+        return _loop
+
+
+@dataclass
+class StreamEvent:
+    # "content", "tool_started" or "tool_completed"
+    kind: str
+    content: str = ""
+    tool: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def tool_label(self) -> str:
+        """e.g. duckduckgo_search(query=ipl final)"""
+        args = ", ".join(f"{name}={value}" for name, value in (self.tool.get("tool_args") or {}).items())
+        return f"{self.tool.get('tool_name')}({args})"
+
+
+class AgentStream:
+    def __init__(self, agent: Agent, message: str, queue_size: int = QUEUE_SIZE, **run_kwargs):
+        self.agent = agent
+        self.message = message
+        self.queue_size = queue_size
+        self.run_kwargs = run_kwargs
+        self._started: Set[str] = set()
+        self._completed: Set[str] = set()
+
+    async def _produce(self, queue: asyncio.Queue, run_span) -> None:
+        # tool call id -> its span
+        tool_spans: Dict[str, Any] = {}
+        first, chars, error = None, 0, None
+        try:
+            # (spans started by the tools nest under the run)
+            with use_span(run_span):
+                response = await self.agent.arun(
+                    self.message, stream=True, stream_intermediate_steps=True, **self.run_kwargs
+                )
+                async for chunk in response:
+                    if isinstance(chunk, RunResponse):
+                        if chunk.event == RunEvent.run_response and isinstance(chunk.content, str):
+                            first = first or time.time_ns()
+                            chars += len(chunk.content)
+                        elif chunk.event in (RunEvent.tool_call_started, RunEvent.tool_call_completed):
+                            self._trace_tools(chunk, run_span, tool_spans)
+                    # waits while the queue is full
+                    await queue.put(chunk)
+        except Exception as e:
+            error = e
+            await queue.put(e)
+        finally:
+            for tool_span in tool_spans.values():
+                tool_span.end(error=error)
+            tool_ms = sum(tool_span.duration_ms for tool_span in tool_spans.values())
+            record_output(run_span, chars, first)
+            # the rest is (mostly) the model's time
+            run_span.set(
+                tools=len(tool_spans),
+                tool_ms=round(tool_ms, 1),
+                model_ms=round(run_span.duration_ms - tool_ms, 1),
+            )
+            run_span.end(error=error)
+            await queue.put(_DONE)
+
+    @staticmethod
+    def _trace_tools(chunk: RunResponse, run_span, tool_spans: Dict[str, Any]) -> None:
+        for tool in chunk.tools or []:
+            tool_id = tool.get("tool_call_id") or tool.get("tool_name")
+            if tool_id not in tool_spans:
+                tool_spans[tool_id] = start_span(
+                    f"tool.{tool.get('tool_name')}",
+                    run_span,
+                    args_chars=len(json.dumps(tool.get("tool_args") or {}, default=str)),
+                )
+            tool_span = tool_spans[tool_id]
+            if tool.get("content") is not None and "result_chars" not in tool_span.attributes:
+                tool_span.set(result_chars=len(str(tool["content"])))
+                tool_span.end()
+
+    def __iter__(self) -> Iterator[StreamEvent]:
+        loop = event_loop()
+        # the queue must be created on the loop's thread
+        queue: asyncio.Queue = asyncio.run_coroutine_threadsafe(
+            self._make_queue(), loop
+        ).result()
+        run_span = start_span("agent.run", agent=self.agent.name or "agent", prompt_chars=len(self.message))
+        producer: Future = asyncio.run_coroutine_threadsafe(self._produce(queue, run_span), loop)
+        try:
+            while True:
+                chunk = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+                if chunk is _DONE:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield from self._events(chunk)
+        finally:
+            # no-op if the run is done, else we were stopped half way
+            producer.cancel()
+
+    async def _make_queue(self) -> asyncio.Queue:
+        return asyncio.Queue(maxsize=self.queue_size)
+
+    def _events(self, chunk: Any) -> Iterator[StreamEvent]:
+        if not isinstance(chunk, RunResponse):
+            return
+        if chunk.event == RunEvent.run_response and isinstance(chunk.content, str):
+            yield StreamEvent("content", chunk.content)
+        elif chunk.event in (RunEvent.tool_call_started, RunEvent.tool_call_completed):
+            # chunk.tools has all the tool calls of the run so far
+            for tool in chunk.tools or []:
+                tool_id = tool.get("tool_call_id") or tool.get("tool_name")
+                if tool_id not in self._started:
+                    self._started.add(tool_id)
+                    yield StreamEvent("tool_started", tool=tool)
+                if tool.get("content") is not None and tool_id not in self._completed:
+                    self._completed.add(tool_id)
+                    yield StreamEvent("tool_completed", tool=tool)
+
+    def content(self, on_event: Optional[Callable[[StreamEvent], None]] = None) -> Iterator[str]:
+        """only the answer's text (for st.write_stream) - the tool events are
+        passed to on_event as they happen"""
+        for event in self:
+            if event.kind == "content":
+                yield event.content
+            elif on_event is not None:
+                on_event(event)
@@ -0,0 +1,212 @@
+"""
+batch_transcriber.py - transcribe & summarize a whole list of YouTube videos, headless
+
+Reads a file of YouTube URLs (one per line, # for comments) & runs each video
+through the same pipeline as video_transcriber.py (transcribe_video - the sections
+are summarized as they are punctuated & the summary lands in the same cache entry
+the app shows), several videos at a time. For overnight runs over whole playlists:
+    - all LLM requests go through one rate limiter, tuned to the API quota
+    - transient errors (rate limited, server errors, timeouts) are retried with
+      exponential backoff - the raw transcript, each punctuated chunk & each
+      summary section are cached on disk as they complete, so a retry only
+      redoes the LLM calls that failed (or never ran)
+    - each result is appended to a JSONL file as soon as the video is done. Run
+      the same command again to resume an interrupted run - videos that are
+      already done are skipped (failed ones are tried again). If the output file
+      ends in .parquet, the results are also written there at the end
+
+Usage:
+    python batch_transcriber.py urls.txt -o results.jsonl [--concurrency 2] [--rpm 15]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Set
+
+import requests
+
+import video_transcriber
+from llm_backend import RateLimitedBackend
+from tracing import span
+from video_transcriber import get_video_id, transcribe_video
+
+# no of videos processed at the same time (each one also punctuates & summarizes
+# its chunks in parallel)
+CONCURRENCY = 2
+# LLM requests/minute - the Gemini free tier quota for gemini-2.0-flash
+REQUESTS_PER_MINUTE = 15
+MAX_RETRIES = 4
+# HTTP status codes worth retrying
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def read_urls(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+def is_transient(error: Exception) -> bool:
+    """is the error likely to go away if we try again later?"""
+    # (youtube_transcript_api fetches with requests)
+    if isinstance(error, (TimeoutError, ConnectionError, requests.ConnectionError, requests.Timeout)):
+        return True
+    # google.api_core errors have .code, openai errors .status_code
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    # e.g. google.api_core.exceptions.ResourceExhausted, ServiceUnavailable, DeadlineExceeded
+    return type(error).__name__ in {"ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError"}
+
+
+def completed_videos(journal: str) -> Set[str]:
+    """ids of the videos the journal has a successful result for"""
+    done = set()
+    if os.path.exists(journal):
+        for row in read_journal(journal):
+            if row.get("status") == "ok":
+                done.add(row["video_id"])
+    return done
+
+
+def read_journal(journal: str) -> List[Dict[str, Any]]:
+    rows = []
+    with open(journal, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                # the last line of an interrupted run may be cut short
+                continue
+    return rows
+
+
+class ResultWriter:
+    """appends results to the JSONL journal - one line per video, flushed to disk
+    right away, so nothing is lost if the run is interrupted"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        with self.lock:
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def process_video(url: str, video_id: str, max_retries: int = MAX_RETRIES) -> Dict[str, Any]:
+    # one trace per video (see tracing.py)
+    with span("batch.video", video_id=video_id) as trace:
+        row = _process_video(url, video_id, max_retries)
+        trace.set(status=row["status"], attempts=row["attempts"])
+        return row
+
+
+def _process_video(url: str, video_id: str, max_retries: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            transcript, summary = transcribe_video(video_id)
+            status, error = "ok", None
+            break
+        except Exception as e:
+            if attempt > max_retries or not is_transient(e):
+                transcript = summary = None
+                status, error = "error", f"{type(e).__name__}: {e}"
+                break
+            # exponential backoff with jitter, so the workers don't retry in lockstep
+            time.sleep(min(2**attempt, 60) * random.uniform(0.5, 1.5))
+
+    return {
+        "url": url,
+        "video_id": video_id,
+        "status": status,
+        "error": error,
+        "transcript": transcript,
+        "summary": summary,
+        "attempts": attempt,
+        "seconds": round(time.perf_counter() - start, 2),
+        "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_parquet(journal: str, path: str) -> None:
+    """the latest result of each video, as a Parquet file"""
+    import pandas as pd
+
+    latest = {row["video_id"]: row for row in read_journal(journal)}
+    pd.DataFrame(list(latest.values())).to_parquet(path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("urls", help="file with one YouTube URL per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="results file (.jsonl or .parquet)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="videos processed at once")
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE, help="max LLM requests/minute")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="retries per video (transient errors)")
+    args = parser.parse_args()
+
+    # the results are always journaled as JSONL (that's what makes runs resumable)
+    parquet = args.output.endswith(".parquet")
+    journal = args.output + ".jsonl" if parquet else args.output
+
+    videos: Dict[str, str] = {}
+    for url in read_urls(args.urls):
+        video_id = get_video_id(url)
+        if video_id is None:
+            print(f"skipping invalid URL: {url}", file=sys.stderr)
+        else:
+            videos.setdefault(video_id, url)
+    done = completed_videos(journal)
+    todo = [(url, video_id) for video_id, url in videos.items() if video_id not in done]
+    print(f"{len(videos)} videos, {len(videos) - len(todo)} already done, {len(todo)} to go")
+
+    # one rate limiter for all the LLM requests of all the workers
+    video_transcriber.set_backend(
+        RateLimitedBackend(video_transcriber.llm, args.rpm, burst=max(1, int(args.rpm // 10)))
+    )
+
+    writer = ResultWriter(journal)
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    failed = 0
+    try:
+        futures = {pool.submit(process_video, url, video_id, args.retries): video_id for url, video_id in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            writer.write(row)
+            if row["status"] != "ok":
+                failed += 1
+            detail = f"{row['seconds']}s" if row["status"] == "ok" else row["error"]
+            print(f"[{i}/{len(todo)}] {row['video_id']} {row['status']} ({detail})")
+    except KeyboardInterrupt:
+        print("interrupted - run the same command again to resume", file=sys.stderr)
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        writer.close()
+    pool.shutdown()
+
+    if parquet:
+        write_parquet(journal, args.output)
+        print(f"results written to {args.output}")
+    if failed:
+        print(f"{failed} videos failed - run again to retry them", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
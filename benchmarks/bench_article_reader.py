@@ -0,0 +1,124 @@
+"""
+bench_article_reader.py - sequential vs parallel article reading
+
+Starts a local HTTP server that serves canned news articles, each delayed by a
+given latency (?delay=seconds), and times reading 5 of them one after another
+(like Newspaper4kTools does, one tool call per URL) vs all at once with
+ParallelArticleTools.read_articles - also with one very slow site in the mix.
+Then times the article cache: cold, fresh (no network) & revalidated (the server
+answers the conditional GET with 304 Not Modified, so nothing is parsed).
+
+Usage:
+    python benchmarks/bench_article_reader.py [--latency 0.5] [--slow 30]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# make the modules in the repo root & the research agent importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "sports_research_agent"))
+
+from article_reader import ParallelArticleTools
+from disk_cache import DiskCache
+
+PARAGRAPH = (
+    "The home side dominated possession from the first whistle, pressing high up the "
+    "pitch and forcing mistakes from a nervous defence. Their captain opened the scoring "
+    "with a curling effort from the edge of the box, before a second-half penalty sealed "
+    "a comfortable win that lifts them to the top of the league table. "
+)
+
+
+def article_html(i: int) -> str:
+    paragraphs = "".join(f"<p>{PARAGRAPH}</p>" for _ in range(12))
+    return f"""<html><head><title>Match report {i}</title>
+        <meta name="author" content="Sports Desk">
+        <meta property="article:published_time" content="2025-03-0{i % 9 + 1}T10:00:00Z">
+        </head><body><article><h1>Match report {i}</h1>{paragraphs}</article></body></html>"""
+
+
+class ArticleHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        time.sleep(float(query.get("delay", ["0"])[0]))
+        etag = f'"article-{query.get("id", ["0"])[0]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = article_html(int(query.get("id", ["0"])[0])).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ArticleHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--articles", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.5, help="per-article latency (seconds)")
+    parser.add_argument("--slow", type=float, default=30.0, help="latency of the slow site (seconds)")
+    args = parser.parse_args()
+
+    server = start_server()
+    base = f"http://127.0.0.1:{server.server_port}/article"
+    urls = [f"{base}?id={i}&delay={args.latency}" for i in range(args.articles)]
+    tools = ParallelArticleTools(cache=None, index_articles=False)
+
+    start = time.perf_counter()
+    for url in urls:
+        tools.get_article_data(url)
+    print(f"sequential ({args.articles} articles):     {time.perf_counter() - start:6.2f}s")
+
+    start = time.perf_counter()
+    articles = json.loads(tools.read_articles(urls))
+    read = sum("text" in article for article in articles)
+    print(f"parallel ({read}/{args.articles} read):        {time.perf_counter() - start:6.2f}s")
+
+    slow_urls = urls[:-1] + [f"{base}?id=99&delay={args.slow}"]
+    start = time.perf_counter()
+    articles = json.loads(tools.read_articles(slow_urls))
+    read = sum("text" in article for article in articles)
+    print(
+        f"parallel + 1 slow site ({read}/{args.articles} read): {time.perf_counter() - start:6.2f}s "
+        f"(url timeout {tools.url_timeout}s, deadline {tools.deadline}s)"
+    )
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cached_tools = ParallelArticleTools(cache=DiskCache(cache_dir), index_articles=False)
+        for label in ["cold cache", "fresh cache"]:
+            start = time.perf_counter()
+            cached_tools.read_articles(urls)
+            print(f"{label + ':':<32}{time.perf_counter() - start:6.2f}s")
+        # everything is stale now - revalidate with conditional GETs
+        cached_tools.fresh_for = 0
+        start = time.perf_counter()
+        cached_tools.read_articles(urls)
+        print(f"{'revalidated (304s):':<32}{time.perf_counter() - start:6.2f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+bench_knowledge_base.py - query latency & recall of the knowledge base's IVF index
+
+Fills a knowledge base (in a temp folder) with synthetic, clustered embeddings -
+no embedding model needed - then times queries with the IVF index (nprobe lists)
+against an exhaustive search of every row, and reports recall@k (how many of the
+true k nearest neighbours the index finds) & the RAM the index itself needs
+(the vectors stay on disk, memory-mapped).
+
+Usage:
+    python benchmarks/bench_knowledge_base.py [--chunks 200000] [--dim 384] [--nprobe 8]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# make the modules in the repo root importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from knowledge_base import KnowledgeBase
+
+
+class VectorsOnly:
+    """stands in for an embedder - the benchmark adds vectors directly"""
+
+    name = "synthetic"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+
+def clustered_vectors(rng, centers: np.ndarray, n: int) -> np.ndarray:
+    vectors = centers[rng.integers(0, len(centers), n)]
+    vectors = vectors + rng.standard_normal(vectors.shape, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((1000, args.dim), dtype=np.float32)
+    with tempfile.TemporaryDirectory() as path:
+        kb = KnowledgeBase(path, embedder=VectorsOnly(args.dim), nprobe=args.nprobe)
+
+        start = time.perf_counter()
+        batch = 50_000
+        for offset in range(0, args.chunks, batch):
+            n = min(batch, args.chunks - offset)
+            kb.add_vectors("synthetic", [f"chunk {offset + i}" for i in range(n)], clustered_vectors(rng, centers, n))
+        print(
+            f"indexed {kb.count:,} chunks in {time.perf_counter() - start:.1f}s "
+            f"({len(kb.centroids)} lists, {kb.count * args.dim * 4 / 2**20:,.0f} MB of vectors on disk, "
+            f"{sum(lst.nbytes for lst in kb._lists) / 2**20:.1f} MB of lists in RAM)"
+        )
+
+        queries = clustered_vectors(rng, centers, args.queries)
+        results = {}
+        for label, nprobe in [("exhaustive", len(kb.centroids)), (f"IVF nprobe={args.nprobe}", args.nprobe)]:
+            times, found = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = kb.search_vector(query, args.k, nprobe=nprobe)
+                times.append(time.perf_counter() - start)
+                found.append({hit["text"] for hit in hits})
+            results[label] = found
+            p95 = statistics.quantiles(times, n=100)[94]
+            print(f"{label:>18}: p50 {statistics.median(times) * 1000:7.2f}ms  p95 {p95 * 1000:7.2f}ms")
+
+        exact, approximate = results.values()
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(approximate, exact)])
+        print(f"recall@{args.k}: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
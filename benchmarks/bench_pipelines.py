@@ -0,0 +1,371 @@
+"""
+bench_pipelines.py - repeatable benchmarks of the agent & transcription pipelines
+
+Runs each pipeline headless, against local stand-ins for everything remote - the
+fake LLM backend (with a fixed latency per token), canned transcripts & a local
+HTTP server for the articles & search results - so the numbers only change when
+the code does. For each pipeline it reports p50/p95 latency, throughput & peak
+memory (see harness.py):
+    - transcript: get_transcript() - punctuate a (canned) transcript, chunks in parallel
+    - summary:    get_summary() - the summary tree of a long transcript
+    - chat:       a chat_gpt_clone.py turn - bounded history + streamed answer
+    - research:   a research agent turn (sports_research_agent), streamed with AgentStream
+    - tutorial_01..03: a turn of the tutorial agents (the scripts, fed from stdin)
+    - articles:   ParallelArticleTools.read_articles() over 5 (local) articles
+    - search:     CachedDuckDuckGoTools - half the queries are repeats (cache hits)
+
+All caches, the session db, the knowledge base & the traces go to a temp dir.
+
+Save a baseline & compare a later run (e.g. after a change) against it - the
+run fails (exit code 1) if any metric got worse by more than --threshold:
+    python benchmarks/bench_pipelines.py --save before
+    python benchmarks/bench_pipelines.py --compare before
+
+Usage:
+    python benchmarks/bench_pipelines.py [--only chat,summary] [--iterations 20]
+        [--concurrency 1] [--save [NAME]] [--compare NAME]
+"""
+
+import argparse
+import contextlib
+import os
+import queue
+import runpy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# make the modules in the repo root & the research agent importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "sports_research_agent"))
+
+from harness import (
+    THRESHOLD,
+    Benchmark,
+    compare,
+    git_commit,
+    load_baseline,
+    print_results,
+    run_benchmarks,
+    save_baseline,
+)
+
+# fake LLM latency (seconds) - roughly a fast hosted model
+FIRST_TOKEN_LATENCY = 0.05
+TOKEN_LATENCY = 0.001
+# latency of the local article & search servers (seconds)
+HTTP_LATENCY = 0.05
+# entries in a canned transcript (~25k chars - a 20 min video)
+TRANSCRIPT_ENTRIES = 600
+
+WORDS = (
+    "so today we are going to talk about how the team prepared for the final and what "
+    "the captain said after the match about the pitch the weather and the crowd"
+).split()
+
+# the temp dir everything is written to (set in main())
+WORKSPACE = ""
+
+
+def transcript_entries(seed: int, n: int = TRANSCRIPT_ENTRIES):
+    """a canned YouTube transcript - like YouTubeTranscriptApi.get_transcript()"""
+    entries = []
+    for i in range(n):
+        words = [WORDS[(seed * 7 + i * 3 + j) % len(WORDS)] for j in range(8)]
+        entries.append({"text": " ".join(words), "start": i * 2.0, "duration": 2.0})
+    return entries
+
+
+def transcript_text(seed: int) -> str:
+    return " ".join(entry["text"] for entry in transcript_entries(seed))
+
+
+class FixtureTranscriptApi:
+    """stands in for YouTubeTranscriptApi - a canned transcript for any video id"""
+
+    @staticmethod
+    def get_transcript(video_id: str):
+        return transcript_entries(int(video_id.removeprefix("bench")))
+
+
+@contextmanager
+def transcript():
+    import video_transcriber
+    from disk_cache import DiskCache
+
+    old = video_transcriber.cache, video_transcriber.YouTubeTranscriptApi
+    video_transcriber.cache = DiskCache(tempfile.mkdtemp(dir=WORKSPACE))
+    video_transcriber.YouTubeTranscriptApi = FixtureTranscriptApi
+    try:
+        # a new video every time, so nothing is cached
+        yield lambda i: video_transcriber.get_transcript(f"bench{i:06d}")
+    finally:
+        video_transcriber.cache, video_transcriber.YouTubeTranscriptApi = old
+
+
+@contextmanager
+def summary():
+    import video_transcriber
+    from disk_cache import DiskCache
+
+    summarizer = video_transcriber.summarizer
+    old_cache = summarizer.cache
+    summarizer.cache = DiskCache(tempfile.mkdtemp(dir=WORKSPACE))
+    try:
+        # a different text every time, so nothing is cached
+        yield lambda i: video_transcriber.get_summary(transcript_text(i))
+    finally:
+        summarizer.cache = old_cache
+
+
+@contextmanager
+def chat():
+    from chat_history import HistoryManager
+    from llm_backend import get_backend
+
+    # as in chat_gpt_clone.py - one long conversation, so the history gets folded
+    llm = get_backend(default="openai")
+    history = HistoryManager(lambda prompt: llm.generate(prompt, model="fast", max_output_tokens=512))
+
+    def run(i: int):
+        history.add("user", f"question {i}: " + " ".join(WORDS[i % 7 :]))
+        response = "".join(llm.chat(history.prompt_messages(), stream=True))
+        history.add("assistant", response)
+        return response
+
+    yield run
+
+
+@contextmanager
+def research():
+    from agent_stream import AgentStream
+    from agents import agent_pool
+
+    def run(i: int):
+        # a few turns per session, so the history is loaded (& grows)
+        with agent_pool.checkout(f"bench-{i // 5}") as agent:
+            return "".join(AgentStream(agent, f"research topic {i}: IPL 2025 final").content())
+
+    yield run
+
+
+class ScriptDriver:
+    """runs an interactive script (in a thread) & answers its input() prompts -
+    each turn ends when the script asks for the next input"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lines: "queue.Queue[str]" = queue.Queue()
+        self.waiting = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        try:
+            runpy.run_path(self.path, run_name="__main__")
+        except BaseException as e:
+            self.error = e
+        finally:
+            # don't leave turn() waiting if the script ended
+            self.waiting.set()
+
+    # (the script's stdin)
+    def readline(self) -> str:
+        self.waiting.set()
+        return self.lines.get()
+
+    def start(self):
+        self.thread.start()
+        self.waiting.wait()
+
+    def turn(self, line: str):
+        self.waiting.clear()
+        self.lines.put(line + "\n")
+        self.waiting.wait()
+        if self.error is not None:
+            raise RuntimeError(f"{os.path.basename(self.path)} failed") from self.error
+
+    def stop(self):
+        self.lines.put("bye\n")
+        self.thread.join()
+
+
+def tutorial(script: str):
+    @contextmanager
+    def setup():
+        from agno.utils.log import set_log_level_to_info
+
+        from llm_backend import hash_responder
+
+        # a copy, so its answer cache (next to the script) is in the temp dir
+        path = os.path.join(tempfile.mkdtemp(dir=WORKSPACE), script)
+        shutil.copy(os.path.join(ROOT, "tutorial", script), path)
+        driver = ScriptDriver(path)
+        stdin = sys.stdin
+        sys.stdin = driver
+        # the scripts print a lot (debug_mode) - the benchmark's output goes to stderr
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                driver.start()
+                # questions with nothing in common, so they're not answered from the answer cache
+                yield lambda i: driver.turn(f"tell me about {hash_responder(str(i))}")
+                driver.stop()
+        finally:
+            sys.stdin = stdin
+            # (debug_mode turns on agno's debug logs for the whole process)
+            set_log_level_to_info()
+
+    return setup
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """canned search results (/search?q=...)"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(HTTP_LATENCY)
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        results = [
+            {"title": f"{query} - result {n}", "href": f"https://example.com/{n}", "body": " ".join(WORDS)}
+            for n in range(5)
+        ]
+        body = repr(results).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@contextmanager
+def serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+
+
+@contextmanager
+def articles():
+    from article_reader import ParallelArticleTools
+    from bench_article_reader import ArticleHandler
+
+    tools = ParallelArticleTools(cache=None, index_articles=False)
+    with serve(ArticleHandler) as base:
+        yield lambda i: tools.read_articles(
+            [f"{base}/article?id={i * 5 + n}&delay={HTTP_LATENCY}" for n in range(5)]
+        )
+
+
+@contextmanager
+def search():
+    import requests
+
+    from disk_cache import DiskCache
+    from search_cache import CachedDuckDuckGoTools
+
+    tools = CachedDuckDuckGoTools(cache=DiskCache(tempfile.mkdtemp(dir=WORKSPACE)))
+    session = requests.Session()
+    with serve(FixtureHandler) as base:
+
+        def run(i: int):
+            # every other query repeats the one before it, reworded
+            query = f"IPL 2025 final result {i // 2}" if i % 2 == 0 else f"result ipl final 2025 {i // 2}"
+            fetch = lambda: session.get(f"{base}/search", params={"q": query}, timeout=10).text
+            return tools._search("text", query, 5, fetch)
+
+        yield run
+
+
+BENCHMARKS = [
+    Benchmark("transcript", transcript, parallel=True),
+    Benchmark("summary", summary, parallel=True),
+    Benchmark("chat", chat),
+    Benchmark("research", research),
+    Benchmark("tutorial_01", tutorial("01_basic_agent.py")),
+    Benchmark("tutorial_02", tutorial("02_agent_with_memory.py")),
+    Benchmark("tutorial_03", tutorial("03_agent_with_memory_and_tools.py")),
+    Benchmark("articles", articles, parallel=True),
+    Benchmark("search", search, parallel=True),
+]
+
+
+def main():
+    global WORKSPACE
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    names = [benchmark.name for benchmark in BENCHMARKS]
+    parser.add_argument("--only", help=f"comma separated, from: {','.join(names)}")
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs of each pipeline")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed runs first")
+    parser.add_argument("--memory-iterations", type=int, default=3, help="runs to measure the peak memory of")
+    parser.add_argument("--concurrency", type=int, default=1, help="runs at once (if the pipeline allows it)")
+    parser.add_argument("--save", nargs="?", const="", metavar="NAME", help="save as a baseline (default name: git commit)")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a saved baseline (name or .json path)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="regression threshold (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    selected = BENCHMARKS
+    if args.only:
+        wanted = set(args.only.split(","))
+        unknown = wanted - set(names)
+        if unknown:
+            parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+        selected = [benchmark for benchmark in BENCHMARKS if benchmark.name in wanted]
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    settings = {
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "first_token_latency": FIRST_TOKEN_LATENCY,
+        "token_latency": TOKEN_LATENCY,
+        "http_latency": HTTP_LATENCY,
+    }
+    with tempfile.TemporaryDirectory() as workspace:
+        WORKSPACE = workspace
+        # must be set before the pipelines' modules are imported
+        os.environ["LLM_BACKEND"] = "fake"
+        os.environ["FAKE_LLM_FIRST_TOKEN_LATENCY"] = str(FIRST_TOKEN_LATENCY)
+        os.environ["FAKE_LLM_TOKEN_LATENCY"] = str(TOKEN_LATENCY)
+        os.environ.setdefault("EMBEDDING_MODEL", "hashing")
+        os.environ["KNOWLEDGE_DIR"] = os.path.join(workspace, "knowledge")
+        os.environ["TRACE_FILE"] = os.path.join(workspace, "traces.jsonl")
+        # (the research agent keeps its session db in the working dir)
+        cwd = os.getcwd()
+        os.chdir(workspace)
+        try:
+            results = run_benchmarks(
+                selected, args.iterations, args.warmup, args.concurrency, args.memory_iterations
+            )
+        finally:
+            os.chdir(cwd)
+
+    print_results(results)
+    if args.save is not None:
+        path = save_baseline(args.save or git_commit() or time.strftime("%Y%m%d-%H%M%S"), results, settings)
+        print(f"\nbaseline saved to {path}")
+    if baseline is not None:
+        if baseline.get("settings") != settings:
+            print(f"\nnote: the baseline was run with other settings {baseline.get('settings')}")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions (over {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+bench_rerun_overhead.py - what a Streamlit rerun costs each app, before any LLM call
+
+Streamlit re-runs the app script on every interaction. This runs each app with
+Streamlit's AppTest (no browser, the fake LLM backend) & times --reruns reruns
+of one session, with no input - so it measures only what the script does on
+every rerun (building clients, models & agents, rendering). AppTest itself
+adds a few ms per rerun - an empty app is timed first & "own" is the app's time
+over that.
+
+It also times the Gemini client objects on their own (no API calls are made):
+    - "per call": a new GenerativeModel + GenerationConfig for every request
+    - "per rerun": genai.configure() + a new API client on every rerun (the
+      client's connection would then be set up again for the next request)
+against the shared ones (see registry.py).
+
+Usage:
+    python benchmarks/bench_rerun_overhead.py [--reruns 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# make the modules in the repo root importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ.setdefault("EMBEDDING_MODEL", "hashing")
+# a (fake) key, so the apps configure Gemini as they would in production
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+
+from streamlit.testing.v1 import AppTest
+
+APPS = [
+    "chat_gpt_clone.py",
+    "tutorial/01_basic_agent_streamlit.py",
+    "sports_research_agent/app.py",
+    "video_summarizer.py",
+    "video_transcriber.py",
+]
+MODEL_ID = "gemini-2.0-flash"
+GENERATION_CONFIG = {"temperature": 0.0, "max_output_tokens": 1024 * 5}
+
+
+def time_calls(fn, n: int):
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(name: str, times, extra: str = ""):
+    print(
+        f"{name:<44} p50 {statistics.median(times) * 1000:8.3f}ms  "
+        f"mean {statistics.mean(times) * 1000:8.3f}ms{extra}"
+    )
+
+
+def bench_apps(reruns: int):
+    print(f"per rerun of each app ({reruns} reruns of one session)")
+    empty = AppTest.from_string("import streamlit as st\nst.write('')")
+    empty.run()
+    baseline = statistics.median(time_calls(empty.run, reruns))
+    print(f"{'(empty app)':<44} p50 {baseline * 1000:8.3f}ms")
+    for app in APPS:
+        at = AppTest.from_file(os.path.join(ROOT, app), default_timeout=60)
+        # the first run imports the app's modules & creates the shared objects
+        start = time.perf_counter()
+        at.run()
+        first = time.perf_counter() - start
+        if at.exception:
+            print(f"{app:<44} failed: {at.exception[0].message}")
+            continue
+        times = time_calls(at.run, reruns)
+        own = statistics.median(times) - baseline
+        report(app, times, f"  own {own * 1000:7.3f}ms  (first run {first * 1000:.0f}ms)")
+
+
+def bench_clients(n: int):
+    import google.generativeai as genai
+    from google.generativeai import client
+
+    from llm_backend import GeminiBackend, configure_gemini
+
+    api_key = os.environ["GOOGLE_API_KEY"]
+    backend = GeminiBackend()
+
+    def new_model():
+        gen_config = genai.GenerationConfig(**GENERATION_CONFIG)
+        return genai.GenerativeModel(MODEL_ID, generation_config=gen_config)
+
+    def reconfigure():
+        genai.configure(api_key=api_key)
+        client.get_default_generative_client()
+
+    print(f"\nGemini client objects ({n} calls)")
+    report("model per call", time_calls(new_model, n))
+    report("shared model", time_calls(lambda: backend._model(MODEL_ID, **GENERATION_CONFIG), n))
+    report("configure + API client per rerun", time_calls(reconfigure, n))
+    report("configure once (configure_gemini)", time_calls(configure_gemini, n))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--reruns", type=int, default=50)
+    args = parser.parse_args()
+
+    bench_apps(args.reruns)
+    bench_clients(args.reruns * 20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+bench_session_storage.py - SqliteAgentStorage vs PooledSqliteStorage, with many
+concurrent sessions in several processes
+
+Each process (think: Streamlit server) runs a few sessions in threads. A session
+does what the agent does on each run - read the session, add a run (with its
+messages) & write the session back - for a number of runs, so histories grow as
+they would in a long chat. Sessions wait --gap seconds between runs (the model
+call & the user typing their next question). Reports the total time, read &
+write latencies (p50/p95) and errors (e.g. "database is locked").
+
+Usage:
+    python benchmarks/bench_session_storage.py [--processes 4] [--sessions 8] [--runs 30] [--gap 0.05]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# make the modules in the repo root importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agno.storage.agent.sqlite import SqliteAgentStorage
+from agno.storage.session.agent import AgentSession
+
+from session_storage import PooledSqliteStorage
+
+ANSWER = "The home side won 2-1, with a late penalty sealing the result. " * 20
+
+
+def make_storage(kind: str, db_file: str):
+    if kind == "sqlite":
+        return SqliteAgentStorage(table_name="agent_sessions", db_file=db_file)
+    return PooledSqliteStorage(table_name="agent_sessions", db_file=db_file)
+
+
+def run_session(storage, session_id: str, runs: int, gap: float, stats: dict, lock: threading.Lock):
+    for i in range(runs):
+        time.sleep(gap)
+        try:
+            start = time.perf_counter()
+            session = storage.read(session_id)
+            read_time = time.perf_counter() - start
+
+            memory = session.memory if session is not None else {}
+            memory.setdefault("runs", [])
+            memory.setdefault("messages", [{"role": "system", "content": "You are a sports researcher."}])
+            user = {"role": "user", "content": f"question {i} from {session_id}"}
+            assistant = {"role": "assistant", "content": ANSWER}
+            memory["runs"].append({"message": user, "response": {"content": ANSWER, "messages": [user, assistant]}})
+            memory["messages"] += [user, assistant]
+
+            start = time.perf_counter()
+            storage.upsert(
+                AgentSession(
+                    session_id=session_id,
+                    agent_id="bench",
+                    memory=memory,
+                    agent_data={"name": "bench"},
+                    session_data={},
+                    created_at=int(time.time()),
+                )
+            )
+            write_time = time.perf_counter() - start
+            with lock:
+                stats["reads"].append(read_time)
+                stats["writes"].append(write_time)
+        except Exception as e:
+            with lock:
+                stats["errors"].append(str(e).splitlines()[0])
+
+
+def run_process(kind: str, db_file: str, process: int, sessions: int, runs: int, gap: float) -> dict:
+    storage = make_storage(kind, db_file)
+    stats = {"reads": [], "writes": [], "errors": []}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_session, args=(storage, f"p{process}-s{s}", runs, gap, stats, lock))
+        for s in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if isinstance(storage, PooledSqliteStorage):
+        storage.close()
+    return stats
+
+
+def percentile(values, p):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[p - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=8, help="sessions per process")
+    parser.add_argument("--runs", type=int, default=30, help="runs per session")
+    parser.add_argument("--gap", type=float, default=0.05, help="time between runs of a session (seconds)")
+    args = parser.parse_args()
+
+    total_runs = args.processes * args.sessions * args.runs
+    print(f"{args.processes} processes x {args.sessions} sessions x {args.runs} runs = {total_runs} runs")
+    for kind in ["sqlite", "pooled"]:
+        with tempfile.TemporaryDirectory() as db_dir:
+            db_file = os.path.join(db_dir, "agent.db")
+            # create the tables up front, so the processes don't race to do it
+            make_storage(kind, db_file).create()
+
+            start = time.perf_counter()
+            with ProcessPoolExecutor(args.processes) as pool:
+                futures = [
+                    pool.submit(run_process, kind, db_file, p, args.sessions, args.runs, args.gap)
+                    for p in range(args.processes)
+                ]
+                results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - start
+
+        reads = [t for r in results for t in r["reads"]]
+        writes = [t for r in results for t in r["writes"]]
+        errors = [e for r in results for e in r["errors"]]
+        print(
+            f"{kind:>7}: {elapsed:6.2f}s | "
+            f"read p50 {percentile(reads, 50) * 1000:6.1f}ms p95 {percentile(reads, 95) * 1000:6.1f}ms | "
+            f"write p50 {percentile(writes, 50) * 1000:6.1f}ms p95 {percentile(writes, 95) * 1000:6.1f}ms | "
+            f"errors {len(errors)}"
+        )
+        if errors:
+            print(f"         e.g. {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+bench_tree_summary.py - single-shot vs tree (hierarchical) summarization
+
+Runs both approaches against a fake model on synthetic transcripts of 10k, 100k
+and 1M characters & reports latency, no of LLM calls and tokens used. The fake
+model sleeps for a fixed time per input token (prefill) and per output token
+(decode), and - like the real one - caps its output at max_output_tokens.
+
+Usage:
+    python benchmarks/bench_tree_summary.py [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+
+# make the modules in the repo root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tree_summarizer import TreeSummarizer
+
+WORDS = (
+    "the match team player goal season coach league win score first half second "
+    "minute penalty ball field fans great game play defence attack final"
+).split()
+
+
+def make_transcript(n_chars: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    words, size = [], 0
+    while size < n_chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:n_chars]
+
+
+def count_tokens(text: str) -> int:
+    # rule of thumb - ~4 characters per token
+    return max(1, len(text) // 4)
+
+
+class FakeModel:
+    """deterministic stand-in for the LLM, that keeps count of calls & tokens"""
+
+    def __init__(self, prefill_s=5e-6, decode_s=5e-4, max_output_tokens=1024 * 5):
+        self.prefill_s = prefill_s
+        self.decode_s = decode_s
+        self.max_output_tokens = max_output_tokens
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = self.input_tokens = self.output_tokens = 0
+
+    def generate(self, prompt: str) -> str:
+        in_tokens = count_tokens(prompt)
+        # a summary is ~1/8th of its input, but never more than the output cap
+        out_tokens = min(self.max_output_tokens, max(16, in_tokens // 8))
+        time.sleep(in_tokens * self.prefill_s + out_tokens * self.decode_s)
+        with self.lock:
+            self.calls += 1
+            self.input_tokens += in_tokens
+            self.output_tokens += out_tokens
+        # the output depends only on the prompt
+        return make_transcript(out_tokens * 4, seed=zlib.crc32(prompt.encode()))
+
+    def summarize(self, text: str) -> str:
+        return self.generate(f"Please summarize the following text:\n\n{text}")
+
+    def merge(self, summaries) -> str:
+        return self.generate("Combine these summaries:\n\n" + "\n\n".join(summaries))
+
+
+def run(label, fn, model):
+    model.reset()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {label:<22} {elapsed:8.2f}s {model.calls:6d} calls "
+        f"{model.input_tokens:10,d} in {model.output_tokens:9,d} out"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=8000)
+    parser.add_argument("--fan-out", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    model = FakeModel()
+    for size in args.sizes:
+        text = make_transcript(size)
+        print(f"\ntranscript of {size:,} characters ({count_tokens(text):,} tokens)")
+        run("single-shot", lambda: model.summarize(text), model)
+
+        tree = TreeSummarizer(
+            model.summarize,
+            model.merge,
+            chunk_size=args.chunk_size,
+            fan_out=args.fan_out,
+            max_workers=args.workers,
+        )
+        run("tree (cold cache)", lambda: tree.summarize(text), model)
+        # a growing transcript - only the last section's path to the root is redone
+        more = text + " " + make_transcript(args.chunk_size // 2, seed=7)
+        run("tree (text appended)", lambda: tree.summarize(more), model)
+        run("tree (warm cache)", lambda: tree.summarize(more), model)
+
+
+if __name__ == "__main__":
+    main()
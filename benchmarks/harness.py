@@ -0,0 +1,192 @@
+"""
+harness.py - run benchmarks, report p50/p95 latency, throughput & peak memory, and
+save/compare the results as JSON baselines
+
+A benchmark is a context manager that sets up the pipeline (fixtures, servers,
+temp caches...) & yields a function that runs it once - called with the no of
+the iteration, so every iteration can use fresh inputs (no cache hits, unless
+that's what's measured):
+
+    @contextmanager
+    def summary():
+        ...
+        yield lambda i: get_summary(transcripts[i])
+
+measure() runs it a few times to warm up, then times --iterations runs (with
+--concurrency threads, if the benchmark can run in parallel) and finally runs
+it a few more times under tracemalloc for the peak memory (tracemalloc slows
+everything down, so those runs are not timed).
+
+Baselines are saved to benchmarks/baselines/<name>.json (named after the git
+commit by default), so a later run can be compared against them.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+# a result this much worse than the baseline is a regression (10%)
+THRESHOLD = 0.1
+# (metric, True if higher is better)
+METRICS = [("p50_ms", False), ("p95_ms", False), ("throughput_per_s", True), ("peak_mb", False)]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], ContextManager[Callable[[int], Any]]]
+    # can iterations run at the same time (threads)?
+    parallel: bool = False
+
+
+def percentile(values: List[float], p: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def measure(
+    benchmark: Benchmark,
+    iterations: int = 20,
+    warmup: int = 2,
+    concurrency: int = 1,
+    memory_iterations: int = 3,
+) -> Dict[str, float]:
+    with benchmark.setup() as run:
+        for i in range(warmup):
+            run(i)
+
+        def timed(i: int) -> float:
+            start = time.perf_counter()
+            run(i)
+            return time.perf_counter() - start
+
+        ids = range(warmup, warmup + iterations)
+        start = time.perf_counter()
+        if benchmark.parallel and concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(timed, ids))
+        else:
+            latencies = [timed(i) for i in ids]
+        elapsed = time.perf_counter() - start
+
+        # peak memory allocated (by Python) during one run
+        peak = 0
+        tracemalloc.start()
+        try:
+            for i in range(warmup + iterations, warmup + iterations + memory_iterations):
+                tracemalloc.reset_peak()
+                baseline, _ = tracemalloc.get_traced_memory()
+                run(i)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "n": iterations,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "throughput_per_s": round(iterations / elapsed, 3),
+        "peak_mb": round(peak / 1e6, 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        commit = out.stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def baseline_path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name: str, results: Dict[str, Dict[str, float]], settings: Dict[str, Any]) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    baseline = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+    return path
+
+
+def load_baseline(name: str) -> Dict[str, Any]:
+    with open(baseline_path(name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_results(results: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'benchmark':<22} {'p50':>10} {'p95':>10} {'throughput':>12} {'peak mem':>10}")
+    for name, r in results.items():
+        print(
+            f"{name:<22} {r['p50_ms']:8.1f}ms {r['p95_ms']:8.1f}ms "
+            f"{r['throughput_per_s']:10.2f}/s {r['peak_mb']:8.2f}MB"
+        )
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float = THRESHOLD
+) -> List[str]:
+    """print the change of each metric vs the baseline & return the regressions"""
+    print(f"\nvs baseline {baseline.get('commit')} ({baseline.get('created_at')}):")
+    print(f"{'benchmark':<22} " + " ".join(f"{metric:>18}" for metric, _ in METRICS))
+    regressions = []
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<22} (not in baseline)")
+            continue
+        cells = []
+        for metric, higher_is_better in METRICS:
+            if not old.get(metric):
+                cells.append(f"{'-':>18}")
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            worse = -change if higher_is_better else change
+            flag = "!" if worse > threshold else " "
+            if worse > threshold:
+                regressions.append(f"{name} {metric}: {old[metric]} -> {result[metric]} ({change:+.0%})")
+            cells.append(f"{change:+16.1%} {flag}")
+        print(f"{name:<22} " + " ".join(cells))
+    return regressions
+
+
+def run_benchmarks(
+    benchmarks: List[Benchmark],
+    iterations: int,
+    warmup: int,
+    concurrency: int,
+    memory_iterations: int,
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for benchmark in benchmarks:
+        print(f"running {benchmark.name}...", file=sys.stderr, flush=True)
+        results[benchmark.name] = measure(benchmark, iterations, warmup, concurrency, memory_iterations)
+    return results
@@ -0,0 +1,259 @@
+"""
+load_test.py - how many concurrent users can one Streamlit app process take?
+
+Simulates users chatting with chat_gpt_clone.py or the sports research agent at
+the same time, each with its own Streamlit session (AppTest - no browser), with
+the fake LLM backend. A Streamlit server also runs all its sessions in one
+process (each rerun in a thread), so this measures what one server process/worker
+can take. Every user opens the app, then sends --turns chat messages, thinking
+for a while before each (random, --think-time seconds on average); after each
+answer the app is also rerun with no input (like a click on a widget).
+
+This is done for each number of users in --users & reported per level:
+    - turn latency (p50/p95) - from sending the message till the answer is on screen
+    - rerun time (p50/p95) - a rerun with no input
+    - throughput - chat turns/second over all users
+    - memory per session - what a session keeps (session state, agent, history),
+      measured on its own, before the load test
+The saturation point is the first level where more users no longer bring more
+throughput (under --min-gain more), or where the p95 turn latency goes over
+--slo - choose the no of workers so each gets fewer users than that.
+
+Usage:
+    python benchmarks/load_test.py [--app chat|research] [--users 1,2,4,8,16,32]
+        [--turns 5] [--think-time 1.0] [--slo 5.0] [--json results.json]
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+# make the modules in the repo root importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from harness import percentile
+
+APPS = {
+    "chat": "chat_gpt_clone.py",
+    "research": "sports_research_agent/app.py",
+}
+# fake LLM latency (seconds), unless set in the environment - as in bench_pipelines.py
+FIRST_TOKEN_LATENCY = "0.05"
+TOKEN_LATENCY = "0.001"
+# a level saturates if it brings less than this much more throughput (10%)
+MIN_GAIN = 0.1
+
+
+def share_runtime() -> None:
+    """AppTest is made for one test at a time - let sessions run at the same time,
+    like on a Streamlit server:
+        - AppTest sets up a (mock) runtime for each run & removes it when the run
+          ends, which breaks the runs of other sessions that are still going -
+          keep the latest one for them (they're all alike)
+        - one script cache for all sessions (as a server has), instead of
+          compiling the script on every rerun - it also keeps the compiles of
+          different threads apart"""
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import local_script_runner
+
+    latest = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest[:] = [cls._instance]
+            return cls._instance
+        if latest:
+            return latest[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(latest))
+    script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+class SimulatedUser:
+    """one browser session, chatting with the app"""
+
+    def __init__(self, app: str, user: int, turns: int, think_time: float, timeout: float):
+        self.app = app
+        self.user = user
+        self.turns = turns
+        self.think_time = think_time
+        self.timeout = timeout
+        self.turn_times: List[float] = []
+        self.rerun_times: List[float] = []
+        self.errors: List[str] = []
+
+    def run(self, start: threading.Barrier) -> None:
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(self.app, default_timeout=self.timeout)
+        start.wait()
+        try:
+            at.run()
+            for turn in range(self.turns):
+                if self.think_time > 0:
+                    time.sleep(random.expovariate(1 / self.think_time))
+                t0 = time.perf_counter()
+                at.chat_input[0].set_value(f"user {self.user}, question {turn}: who won the IPL final?").run()
+                self.turn_times.append(time.perf_counter() - t0)
+                if at.exception:
+                    self.errors.append(at.exception[0].message)
+                    return
+                t0 = time.perf_counter()
+                at.run()
+                self.rerun_times.append(time.perf_counter() - t0)
+        except Exception as e:
+            # e.g. the rerun timed out
+            self.errors.append(f"{type(e).__name__}: {e}")
+
+
+def run_level(app: str, n_users: int, turns: int, think_time: float, timeout: float) -> Dict[str, Any]:
+    users = [SimulatedUser(app, user, turns, think_time, timeout) for user in range(n_users)]
+    # all users open the app at the same time
+    start = threading.Barrier(n_users + 1)
+    threads = [threading.Thread(target=user.run, args=(start,)) for user in users]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+
+    turn_times = [t for user in users for t in user.turn_times]
+    rerun_times = [t for user in users for t in user.rerun_times]
+    return {
+        "users": n_users,
+        "turns": len(turn_times),
+        "errors": sum(len(user.errors) for user in users),
+        "first_error": next((user.errors[0] for user in users if user.errors), None),
+        "turn_p50_s": round(percentile(turn_times, 50), 3),
+        "turn_p95_s": round(percentile(turn_times, 95), 3),
+        "rerun_p50_ms": round(percentile(rerun_times, 50) * 1000, 1),
+        "rerun_p95_ms": round(percentile(rerun_times, 95) * 1000, 1),
+        "turns_per_s": round(len(turn_times) / elapsed, 2),
+    }
+
+
+def memory_per_session(app: str, sessions: int, turns: int, timeout: float) -> float:
+    """memory (MB) each session keeps after `turns` chat turns - Python allocations,
+    with the sessions kept alive, over what the first (warm-up) session left"""
+    from streamlit.testing.v1 import AppTest
+
+    def session(user: int) -> AppTest:
+        at = AppTest.from_file(app, default_timeout=timeout)
+        at.run()
+        for turn in range(turns):
+            at.chat_input[0].set_value(f"user {user}, question {turn}: who won the IPL final?").run()
+        return at
+
+    # imports, shared clients & caches are made once per process - not per session
+    warm = session(-1)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        alive = [session(user) for user in range(sessions)]
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    del warm, alive
+    return used / sessions / 1e6
+
+
+def saturation(levels: List[Dict[str, Any]], slo: float, min_gain: float) -> Dict[str, Any]:
+    """the first level past which adding users doesn't pay"""
+    for previous, level in zip([None] + levels, levels):
+        if level["errors"]:
+            return {"users": level["users"], "reason": "errors"}
+        if level["turn_p95_s"] > slo:
+            return {"users": level["users"], "reason": f"p95 turn latency over {slo}s"}
+        if previous and level["turns_per_s"] < previous["turns_per_s"] * (1 + min_gain):
+            return {"users": level["users"], "reason": f"throughput grew less than {min_gain:.0%}"}
+    return {"users": None, "reason": "not reached - try more users"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--app", default="chat", help=f"{' or '.join(APPS)}, or the path of an app")
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="no of concurrent users, per level")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per user")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between a user's turns")
+    parser.add_argument("--slo", type=float, default=5.0, help="max acceptable p95 turn latency (seconds)")
+    parser.add_argument("--min-gain", type=float, default=MIN_GAIN, help="min throughput gain per level")
+    parser.add_argument("--memory-sessions", type=int, default=5, help="sessions to measure the memory of")
+    parser.add_argument("--timeout", type=float, default=120, help="max seconds per rerun")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    app = os.path.abspath(os.path.join(ROOT, APPS.get(args.app, args.app)))
+    levels = [int(n) for n in args.users.split(",")]
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ.setdefault("FAKE_LLM_FIRST_TOKEN_LATENCY", FIRST_TOKEN_LATENCY)
+    os.environ.setdefault("FAKE_LLM_TOKEN_LATENCY", TOKEN_LATENCY)
+    os.environ.setdefault("EMBEDDING_MODEL", "hashing")
+    share_runtime()
+    # AppTest sessions are created outside a script run
+    # (Streamlit resets the log levels on every run - a filter stays)
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+
+    results: Dict[str, Any] = {"app": os.path.relpath(app, ROOT), "settings": vars(args), "levels": []}
+    with tempfile.TemporaryDirectory() as workspace:
+        # the session db, knowledge base & traces go to a temp dir
+        os.environ["KNOWLEDGE_DIR"] = os.path.join(workspace, "knowledge")
+        os.environ["TRACE_FILE"] = os.path.join(workspace, "traces.jsonl")
+        cwd = os.getcwd()
+        os.chdir(workspace)
+        try:
+            print(f"{results['app']}: {args.turns} turns/user, think time {args.think_time}s", file=sys.stderr)
+            results["memory_per_session_mb"] = round(
+                memory_per_session(app, args.memory_sessions, args.turns, args.timeout), 3
+            )
+            print(f"memory per session: {results['memory_per_session_mb']:.2f}MB\n")
+            print(
+                f"{'users':>6} {'turns/s':>8} {'turn p50':>9} {'turn p95':>9} "
+                f"{'rerun p50':>10} {'rerun p95':>10} {'errors':>7}"
+            )
+            for n_users in levels:
+                level = run_level(app, n_users, args.turns, args.think_time, args.timeout)
+                results["levels"].append(level)
+                print(
+                    f"{level['users']:>6} {level['turns_per_s']:>8.2f} {level['turn_p50_s']:>8.2f}s "
+                    f"{level['turn_p95_s']:>8.2f}s {level['rerun_p50_ms']:>8.1f}ms "
+                    f"{level['rerun_p95_ms']:>8.1f}ms {level['errors']:>7}",
+                    flush=True,
+                )
+                if level["first_error"]:
+                    print(f"       first error: {level['first_error']}")
+        finally:
+            os.chdir(cwd)
+
+    results["saturation"] = saturation(results["levels"], args.slo, args.min_gain)
+    if results["saturation"]["users"] is None:
+        print(f"\nsaturation point {results['saturation']['reason']}")
+    else:
+        print(f"\nsaturates at {results['saturation']['users']} users ({results['saturation']['reason']})")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
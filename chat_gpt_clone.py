@@ -2,53 +2,63 @@
 chat_gpt_clone.py - a Chat-GPT like app
 """
 
+import os
 import streamlit as st
-from utils import apply_styles
+from utils import apply_styles, render_chat_history
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_backend import get_backend
+from chat_history import HistoryManager
+from tracing import render_trace_panel, span, traced
 
 # load all API keys
 load_dotenv()
 
-# create my LLM
-llm = OpenAI()
-
-st.title("ChatGPT Clone")
-
-if st.button("💬 New Chat"):
-    # reset chat history
-    st.session_state.messages = []
-    st.rerun()
-
-apply_styles()
-
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-
-# display all previous messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-if prompt := st.chat_input("What's up?"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    with st.chat_message("assistant"):
-        stream = llm.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": m["role"], "content": m["content"]}
-                for m in st.session_state.messages
-            ],
-            stream=True,
-        )
-        response = st.write_stream(stream)
-
-    st.session_state.messages.append(
-        {
-            "role": "assistant",
-            "content": response,
-        }
-    )
+# create my LLM (OpenAI, unless another backend is picked with LLM_BACKEND)
+llm = get_backend(default="openai")
+# model that folds older turns into the rolling summary - the backend's fast
+# model, unless set in the environment (a model tier or id, see llm_backend.py)
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "fast")
+
+
+def new_history() -> HistoryManager:
+    # older turns are folded into a rolling summary by a small, fast model
+    return HistoryManager(lambda prompt: llm.generate(prompt, model=SUMMARY_MODEL, max_output_tokens=512))
+
+
+@traced("chat_gpt_clone.rerun")
+def main():
+    st.title("ChatGPT Clone")
+
+    if st.button("💬 New Chat"):
+        # reset chat history
+        st.session_state.history = new_history()
+        st.session_state.messages = st.session_state.history.messages
+        st.rerun()
+
+    apply_styles()
+
+    if "history" not in st.session_state:
+        st.session_state.history = new_history()
+        # full chat (for display) - the LLM only gets history.prompt_messages()
+        st.session_state.messages = st.session_state.history.messages
+    history = st.session_state.history
+
+    # display previous messages (only the most recent ones, unless asked for more)
+    with span("render.history", messages=len(st.session_state.messages)):
+        render_chat_history(st.session_state.messages)
+
+    if prompt := st.chat_input("What's up?"):
+        history.add("user", prompt)
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            # bounded prompt - rolling summary of older turns + the latest turns
+            stream = llm.chat(history.prompt_messages(), stream=True)
+            response = st.write_stream(stream)
+
+        history.add("assistant", response)
+
+
+main()
+render_trace_panel("chat_gpt_clone")
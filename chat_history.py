@@ -0,0 +1,159 @@
+"""
+chat_history.py - keep the prompt we send to the LLM bounded, however long the chat
+
+The full chat is still kept (for display), but the LLM only gets
+    - a rolling summary of the older turns, plus
+    - the most recent turns, verbatim
+Tokens are counted once per message, as it is added. When enough older turns have
+piled up outside the "recent" window, they are folded into the summary by a
+background thread, so no chat turn ever waits for the summary to be refreshed.
+If folding keeps failing (MAX_FOLD_FAILURES times in a row), the history falls
+back to plain truncation - older turns are dropped from the prompt instead of
+summarized - so a broken summarizer isn't called again after every message.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+
+except ImportError:
+
+    def count_tokens(text: str) -> int:
+        # rule of thumb - ~4 characters per token
+        return len(text) // 4 + 1
+
+
+# total tokens of history (summary + turns) we send with each prompt
+MAX_PROMPT_TOKENS = 4000
+# tokens of the most recent turns that are always sent verbatim
+RECENT_TOKENS = 2000
+# don't refresh the summary for less than this many tokens of older turns
+MIN_FOLD_TOKENS = 500
+# failed folds in a row, after which the older turns are dropped (not summarized)
+MAX_FOLD_FAILURES = 3
+# overhead per message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = """
+    You are maintaining a running summary of a conversation between a user and an AI assistant.
+    Update the summary below with the new messages that follow it. Keep all facts, names,
+    numbers, decisions and open questions the assistant may need later. Be concise - no more
+    than 300 words. Respond with the updated summary only.
+
+    Current summary:
+    {summary}
+
+    New messages:
+    {messages}
+    """
+
+
+class HistoryManager:
+    def __init__(
+        self,
+        summarize: Callable[[str], str],
+        max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+        recent_tokens: int = RECENT_TOKENS,
+        min_fold_tokens: int = MIN_FOLD_TOKENS,
+        max_fold_failures: int = MAX_FOLD_FAILURES,
+    ):
+        """summarize - sends a prompt to an LLM & returns its response"""
+        self.summarize = summarize
+        self.max_prompt_tokens = max_prompt_tokens
+        self.recent_tokens = recent_tokens
+        self.min_fold_tokens = min_fold_tokens
+        self.max_fold_failures = max_fold_failures
+
+        self.messages: List[Dict[str, str]] = []
+        self._tokens: List[int] = []
+        self.summary = ""
+        self._summary_tokens = 0
+        # messages before this index are already part of the summary
+        self._summarized = 0
+        self._lock = threading.Lock()
+        self._refresh: Optional[threading.Thread] = None
+        self._fold_failures = 0
+
+    def add(self, role: str, content: str) -> None:
+        self.messages.append({"role": role, "content": content})
+        self._tokens.append(count_tokens(content) + MESSAGE_OVERHEAD)
+        self._maybe_refresh()
+
+    def _suffix_start(self, start: int, budget: int) -> int:
+        """index of the oldest message (from `start` on) such that all messages from
+        it to the end fit in budget tokens - the last message is always included"""
+        i = len(self.messages)
+        used = 0
+        while i > start and (i == len(self.messages) or used + self._tokens[i - 1] <= budget):
+            used += self._tokens[i - 1]
+            i -= 1
+        return i
+
+    def prompt_messages(self) -> List[Dict[str, str]]:
+        """messages to send to the LLM - the summary (if any) + as many of the latest
+        messages as fit in the token budget"""
+        with self._lock:
+            summary, summarized, summary_tokens = self.summary, self._summarized, self._summary_tokens
+        start = self._suffix_start(summarized, self.max_prompt_tokens - summary_tokens)
+
+        messages = []
+        if summary:
+            messages.append(
+                {"role": "system", "content": f"Summary of the conversation so far:\n{summary}"}
+            )
+        messages.extend(self.messages[start:])
+        return messages
+
+    def _maybe_refresh(self) -> None:
+        """fold older turns into the summary (in the background), once there are enough of them"""
+        if self._refresh is not None and self._refresh.is_alive():
+            return
+        cutoff = self._suffix_start(self._summarized, self.recent_tokens)
+        if sum(self._tokens[self._summarized : cutoff]) < self.min_fold_tokens:
+            return
+        self._refresh = threading.Thread(
+            target=self._fold, args=(self._summarized, cutoff), daemon=True
+        )
+        self._refresh.start()
+
+    def _fold(self, start: int, end: int) -> None:
+        if self._fold_failures >= self.max_fold_failures:
+            # truncation - the turns are dropped, the summary stays as it was
+            with self._lock:
+                self._summarized = end
+            return
+        messages = "\n\n".join(f"{m['role']}: {m['content']}" for m in self.messages[start:end])
+        try:
+            summary = self.summarize(
+                SUMMARY_PROMPT.format(summary=self.summary or "(none yet)", messages=messages)
+            )
+        except Exception as e:
+            self._fold_failures += 1
+            if self._fold_failures < self.max_fold_failures:
+                # keep the old summary - we try again after the next message
+                logger.warning("Could not summarize the chat history, will retry: %s", e)
+                return
+            logger.warning(
+                "Could not summarize the chat history %d times in a row, "
+                "falling back to dropping older messages from the prompt: %s",
+                self._fold_failures,
+                e,
+            )
+            with self._lock:
+                self._summarized = end
+            return
+        self._fold_failures = 0
+        with self._lock:
+            self.summary = summary
+            self._summary_tokens = count_tokens(summary) + MESSAGE_OVERHEAD
+            self._summarized = end
@@ -0,0 +1,154 @@
+"""
+disk_cache.py - a small persistent (on-disk), content-addressed cache
+
+Values are stored as JSON files named by the SHA-256 hash of their key, so the
+same inputs always map to the same file. The cache is safe to share between
+several processes (e.g. Streamlit workers): every write goes to a temp file
+first and is then atomically renamed into place, so readers never see a
+partially written entry.
+
+- entries older than `ttl` seconds are treated as missing (and deleted)
+- when the cache grows beyond `max_bytes`, the least recently used entries
+  are evicted, down to 90% of it (a cache hit "touches" the file, so mtime =
+  last used time). The cache's size is kept as a running total, so a write
+  only scans the folder when the total goes over max_bytes (or every
+  RESCAN_WRITES writes, to pick up what other processes wrote)
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# defaults - 256 MB on disk, entries live for a week
+MAX_BYTES = 256 * 1024 * 1024
+TTL = 7 * 24 * 60 * 60
+# eviction frees space down to this fraction of max_bytes, so the next writes
+# don't have to evict (& scan the folder) again right away
+EVICT_TO = 0.9
+# the folder is re-scanned after this many writes (other processes share it)
+RESCAN_WRITES = 1000
+
+
+def hash_text(text: str) -> str:
+    """SHA-256 hex digest of some text (e.g. a prompt template or transcript)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_key(**parts: Any) -> str:
+    """build a cache key from any JSON serializable parts (order doesn't matter)"""
+    return hash_text(json.dumps(parts, sort_keys=True, default=str))
+
+
+class DiskCache:
+    def __init__(self, cache_dir: str, max_bytes: int = MAX_BYTES, ttl: Optional[float] = TTL):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # bytes on disk (as of the last scan + our writes since) - None till the first scan
+        self._size: Optional[int] = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        # fan out into sub-folders, so no one folder gets too many files
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """return the cached value for key, or default if missing/expired"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return default
+
+        if self.ttl is not None and time.time() - entry["created"] > self.ttl:
+            path.unlink(missing_ok=True)
+            return default
+
+        try:
+            # mark as recently used (for LRU eviction)
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process in the meantime - we still have the value
+            pass
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        """store value (must be JSON serializable) under key"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write to a temp file in the same folder & atomically move it in place
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "value": value}, f)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+            try:
+                replaced = path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += size - replaced
+            scan = self._size is None or self._size > self.max_bytes or self._writes % RESCAN_WRITES == 0
+        if scan:
+            self._evict()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """return the cached value for key, calling compute() (and caching its result) on a miss"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        for path in self.cache_dir.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._size = None
+
+    def _evict(self) -> None:
+        """delete least recently used entries till we are below EVICT_TO * max_bytes
+        (if over max_bytes)"""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total > self.max_bytes:
+            # oldest (least recently used) first
+            entries.sort(key=lambda entry: entry[0])
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+        with self._lock:
+            self._size = total
@@ -0,0 +1,90 @@
+"""
+embeddings.py - embed text locally (no API calls), for the caches & knowledge base
+
+Uses a sentence-transformers model if the package is installed. Otherwise falls
+back to a hashing embedder - word & character trigram counts hashed into a fixed
+no of dimensions - which needs nothing but NumPy and is good at spotting
+rephrasings of the same question (same words, different casing, order or typos),
+though not synonyms.
+
+All embedders return L2-normalized float32 vectors, so a dot product is the
+cosine similarity.
+"""
+
+import os
+import re
+import threading
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+# sentence-transformers model used when available
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# no of dimensions of the hashing embedder
+HASHING_DIM = 512
+
+_WORD = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    name = "hashing"
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.casefold())
+        # whole words, plus character trigrams (so typos & plurals still overlap)
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # the sign bit keeps hash collisions from adding up
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype(np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(name: Optional[str] = None):
+    """the embedder to use - set EMBEDDING_MODEL=hashing to skip sentence-transformers.
+    Loaded once per process (models are big)"""
+    name = name or os.getenv("EMBEDDING_MODEL", EMBEDDING_MODEL)
+    with _embedders_lock:
+        if name not in _embedders:
+            if name == "hashing":
+                _embedders[name] = HashingEmbedder()
+            else:
+                try:
+                    _embedders[name] = SentenceTransformerEmbedder(name)
+                except ImportError:
+                    _embedders[name] = HashingEmbedder()
+        return _embedders[name]
@@ -0,0 +1,193 @@
+"""
+job_queue.py - run each expensive job once, and only a few at a time
+
+When a video link gets shared, many people paste it into the transcriber within
+seconds of each other - and every session would start its own transcript &
+summary run, against the same API quota. JobQueue sits in front of such jobs
+(one per process, shared by all sessions):
+    - single-flight: jobs have a key (e.g. the video id) - asking for a job that
+      is already waiting or running gets a ticket for that one job, instead of
+      a second run. The job's results are cached, so once it's done, the other
+      tickets get them from the cache
+    - admission control: at most max_running jobs run at the same time & up to
+      max_waiting more wait in line (first come, first served) - so a burst of
+      requests queues up instead of running into rate limits (429s). Past that,
+      requests are turned away (QueueFull)
+A waiting ticket knows its position in the line, to show the user. If the
+session that runs a job goes away before it's done (closed tab, rerun), the
+next session waiting for the same job takes it over.
+
+    with jobs.ticket(video_id) as ticket:
+        while not ticket.wait(timeout=0.5):
+            show(ticket.position())
+        ...                                     # run the job (or read its results)
+
+Counts of coalesced, rejected & completed jobs are available from stats().
+"""
+
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Hashable, Iterator, List, Optional
+
+# max no of jobs running at the same time
+MAX_RUNNING = 2
+# max no of jobs waiting in line for a free slot
+MAX_WAITING = 20
+
+
+class QueueFull(Exception):
+    """too many jobs waiting already - try again later"""
+
+
+class _Job:
+    __slots__ = ("key", "tickets", "running", "finished", "error")
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        # the first ticket runs the job, the others wait for it to finish
+        self.tickets: List["Ticket"] = []
+        self.running = False
+        self.finished = False
+        self.error: Optional[Exception] = None
+
+
+class Ticket:
+    """one request's place in a job - see JobQueue.ticket()"""
+
+    def __init__(self, queue: "JobQueue", job: _Job):
+        self._queue = queue
+        self._job = job
+
+    @property
+    def key(self) -> Hashable:
+        return self._job.key
+
+    @property
+    def leader(self) -> bool:
+        """does this ticket run the job? (the others wait for its results)"""
+        with self._queue._lock:
+            return bool(self._job.tickets) and self._job.tickets[0] is self
+
+    def position(self) -> int:
+        """the job's place in line (1 = next to run), 0 once it runs"""
+        return self._queue._position(self._job)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """wait till it's this ticket's turn - the job has a free slot (if this
+        ticket runs it) or has finished (if it waits for its results). False if
+        it's not its turn yet after `timeout` seconds. Raises the job's error, if
+        it failed"""
+        with self._queue._changed:
+            self._queue._changed.wait_for(self._ready, timeout)
+            if self._job.error is not None:
+                raise self._job.error
+            return self._ready()
+
+    def _ready(self) -> bool:
+        job = self._job
+        return job.finished or (job.running and bool(job.tickets) and job.tickets[0] is self)
+
+    def done(self, error: Optional[BaseException] = None) -> None:
+        """the request is over - the job is done (error=None) or failed (an
+        Exception), or the request went away (anything else, e.g. a rerun)"""
+        self._queue._leave(self, error)
+
+
+class JobQueue:
+    def __init__(self, max_running: int = MAX_RUNNING, max_waiting: int = MAX_WAITING):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        # jobs waiting or running, by key
+        self._jobs: Dict[Hashable, _Job] = {}
+        self._line: Deque[_Job] = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.coalesced = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def submit(self, key: Hashable) -> Ticket:
+        """a ticket for the job `key` - the job's own, or one waiting for the same
+        job already in line/running. Raises QueueFull if the line is full. Call
+        ticket.done() when the request is over (or use ticket())"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self.coalesced += 1
+            else:
+                if self._running >= self.max_running and len(self._line) >= self.max_waiting:
+                    self.rejected += 1
+                    raise QueueFull(f"{len(self._line)} jobs are waiting already - try again later")
+                job = self._jobs[key] = _Job(key)
+                if self._running < self.max_running:
+                    job.running = True
+                    self._running += 1
+                else:
+                    self._line.append(job)
+            ticket = Ticket(self, job)
+            job.tickets.append(ticket)
+            return ticket
+
+    @contextmanager
+    def ticket(self, key: Hashable) -> Iterator[Ticket]:
+        """submit(key), with the ticket done() when the block ends - the job
+        failed if the block raises an Exception"""
+        ticket = self.submit(key)
+        try:
+            yield ticket
+        except BaseException as e:
+            ticket.done(e)
+            raise
+        ticket.done()
+
+    def _position(self, job: _Job) -> int:
+        with self._lock:
+            if job.running or job.finished:
+                return 0
+            return self._line.index(job) + 1
+
+    def _leave(self, ticket: Ticket, error: Optional[BaseException]) -> None:
+        job = ticket._job
+        with self._changed:
+            if job.finished or ticket not in job.tickets:
+                return
+            leader = job.tickets[0] is ticket
+            job.tickets.remove(ticket)
+            if not leader:
+                return
+            if job.running and (error is None or isinstance(error, Exception)):
+                # done (or failed) - the waiting tickets get the results (or the error)
+                job.finished = True
+                job.error = error
+                self.completed += 1
+                self._release(job)
+            elif not job.tickets:
+                # gone before the job was done & nobody else wants it
+                if job.running:
+                    self._release(job)
+                else:
+                    self._line.remove(job)
+                    del self._jobs[job.key]
+            # (else the next ticket of the job takes it over, in its place)
+            self._changed.notify_all()
+
+    def _release(self, job: _Job) -> None:
+        """the job's slot is free - for the next job in line"""
+        del self._jobs[job.key]
+        self._running -= 1
+        if self._line:
+            next_job = self._line.popleft()
+            next_job.running = True
+            self._running += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self._running,
+                "waiting": len(self._line),
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+                "completed": self.completed,
+            }
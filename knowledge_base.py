@@ -0,0 +1,437 @@
+"""
+knowledge_base.py - a local knowledge base (retrieval) for the agents
+
+Documents (video transcripts, news articles...) are split into chunks, embedded
+(see embeddings.py) & indexed, so agents can look things up in what we have
+already read instead of searching the web again.
+
+Layout (in one folder):
+    vectors.f32     float32 matrix of all chunk embeddings, one row per chunk.
+                    It's memory-mapped, so it never has to fit in RAM - the OS
+                    pages in only the rows a query touches
+    lists.i32       the IVF list (nearest centroid) of each row
+    centroids.npy   the IVF centroids (k-means over a sample of the vectors)
+    chunks.db       SQLite - chunk text & source, the documents indexed so far
+                    (with a hash of their content) & the row count
+
+Search is approximate (IVF - inverted file index): the query is compared to the
+centroids first, then only to the vectors in the `nprobe` nearest lists - a few
+thousand rows out of millions. Until there are enough vectors to train the
+centroids, every row is searched (which is fast enough at that size). The
+centroids are retrained whenever the index has grown 4x since they were trained.
+
+Indexing is incremental: a document whose content has not changed is skipped,
+a changed one replaces its old chunks & new rows are appended to the matrix.
+Writes from several processes are serialized by a SQLite write transaction and
+readers pick up the new rows on their next search. k-means runs on a snapshot of
+the rows, outside the lock (searches go on meanwhile, with the old centroids) -
+only the swap to the new centroids & lists is done under it. Searches read the
+chunks with their own (read-only) connection, so they never see a write
+transaction that's still going on.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from agno.tools import Toolkit
+from agno.utils.log import log_debug, logger
+
+from disk_cache import hash_text
+from embeddings import get_embedder
+from tracing import span
+
+# (set KNOWLEDGE_DIR to keep it elsewhere, e.g. for benchmarks)
+KNOWLEDGE_DIR = os.getenv(
+    "KNOWLEDGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "knowledge")
+)
+# chunks are at most this long (characters), overlapping by a sentence
+CHUNK_CHARS = 1000
+# no of IVF lists searched per query
+NPROBE = 8
+# the IVF centroids are trained once there are this many vectors
+TRAIN_MIN = 4096
+# k-means is trained on a sample of this many vectors per list (at most 100k)
+TRAIN_PER_LIST = 32
+TRAIN_SAMPLE = 100_000
+KMEANS_ITERATIONS = 10
+# rows processed at a time when scanning the whole matrix
+BLOCK_ROWS = 65536
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """split text into chunks of whole sentences - each chunk starts with the
+    last sentence of the one before, so no fact is cut in two"""
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+    chunks, current = [], []
+    for sentence in sentences:
+        if current and sum(len(s) + 1 for s in current) + len(sentence) > max_chars:
+            chunks.append(" ".join(current))
+            current = current[-1:] if len(current[-1]) < max_chars // 2 else []
+        current.append(sentence[:max_chars])
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def num_lists(count: int) -> int:
+    """no of IVF lists for an index of `count` vectors (~4 x sqrt)"""
+    return int(np.clip(4 * np.sqrt(count), 16, 4096))
+
+
+def inverted_lists(assignments: np.ndarray, nlist: int) -> List[np.ndarray]:
+    """the row ids in each IVF list, in row order"""
+    order = np.argsort(assignments, kind="stable")
+    bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+    return [order[bounds[i] : bounds[i + 1]] for i in range(nlist)]
+
+
+class KnowledgeBase:
+    def __init__(self, path: str = KNOWLEDGE_DIR, embedder=None, nprobe: int = NPROBE):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder or get_embedder()
+        self.dim = self.embedder.dim
+        self.nprobe = nprobe
+
+        self.db = sqlite3.connect(self.path / "chunks.db", check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA busy_timeout = 30000")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS documents (source TEXT PRIMARY KEY, hash TEXT, indexed_at REAL);
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY, source TEXT, text TEXT, metadata TEXT, deleted INTEGER DEFAULT 0);
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            """
+        )
+        embedder_name = self._meta("embedder")
+        if embedder_name is None:
+            self._set_meta("embedder", self.embedder.name)
+            self._set_meta("dim", self.dim)
+        elif embedder_name != self.embedder.name or int(self._meta("dim")) != self.dim:
+            raise ValueError(
+                f"{self.path} was built with the {embedder_name} embedder, not {self.embedder.name}"
+            )
+
+        self._lock = threading.RLock()
+        # one k-means at a time (in this process)
+        self._train_lock = threading.Lock()
+        # read-only connections for searches, one per thread
+        self._readers = threading.local()
+        self._version: Optional[str] = None
+        self._refresh()
+
+    def _reader(self) -> sqlite3.Connection:
+        """this thread's read-only connection - it only sees committed writes"""
+        reader = getattr(self._readers, "connection", None)
+        if reader is None:
+            reader = sqlite3.connect(
+                f"file:{(self.path / 'chunks.db').resolve()}?mode=ro", uri=True, check_same_thread=False
+            )
+            reader.execute("PRAGMA busy_timeout = 30000")
+            self._readers.connection = reader
+        return reader
+
+    # ---- metadata ----
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """one writer at a time (across processes too) - with an up to date view"""
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                self._set_meta("version", time.time_ns())
+                self.db.execute("COMMIT")
+                self._version = self._meta("version")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                # the matrix may have rows the database doesn't know about -
+                # they are simply overwritten by the next write
+                self._version = None
+                raise
+
+    # ---- the matrix & the IVF index ----
+
+    def _map(self, name: str, dtype, columns: int, rows: int) -> np.memmap:
+        """memory-map a file of (at least) `rows` rows, growing it if needed"""
+        file = self.path / name
+        row_bytes = np.dtype(dtype).itemsize * columns
+        size = file.stat().st_size if file.exists() else 0
+        if size < max(rows, 1) * row_bytes:
+            # grow in big steps, so we don't remap on every write
+            with open(file, "ab") as f:
+                f.truncate(max(rows, 2 * size // row_bytes, 1024) * row_bytes)
+            size = file.stat().st_size
+        shape = (size // row_bytes, columns) if columns > 1 else (size // row_bytes,)
+        return np.memmap(file, dtype=dtype, mode="r+", shape=shape)
+
+    def _refresh(self) -> None:
+        """reload the index if it was changed (by us or by another process)"""
+        version = self._meta("version")
+        if version == self._version and version is not None:
+            return
+        self.count = int(self._meta("count") or 0)
+        self.trained_count = int(self._meta("trained_count") or 0)
+        self.vectors = self._map("vectors.f32", np.float32, self.dim, self.count)
+        self.assignments = self._map("lists.i32", np.int32, 1, self.count)
+        centroids_file = self.path / "centroids.npy"
+        self.centroids = np.load(centroids_file) if self.trained_count and centroids_file.exists() else None
+        self._build_lists()
+        self._version = version
+
+    def _build_lists(self) -> None:
+        """the inverted lists - the row ids in each IVF list, in row order (kept in RAM,
+        4 bytes per row)"""
+        self._lists: List[np.ndarray] = []
+        if self.centroids is not None:
+            self._lists = inverted_lists(np.asarray(self.assignments[: self.count]), len(self.centroids))
+
+    def _assign(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+    def _needs_training(self) -> bool:
+        return self.count >= TRAIN_MIN and (self.centroids is None or self.count >= 4 * self.trained_count)
+
+    def _train(self) -> None:
+        """(re)train the IVF centroids with k-means & reassign every row - on a
+        snapshot of the rows, outside the lock; then swap them in (with the rows
+        added meanwhile) in one write"""
+        with self._train_lock:
+            with self._lock:
+                self._refresh()
+                if not self._needs_training():
+                    return
+                count, trained_count, vectors = self.count, self.trained_count, self.vectors
+
+            centroids = self._kmeans(vectors, count)
+            assignments = np.concatenate(
+                [self._assign(np.asarray(vectors[s : min(s + BLOCK_ROWS, count)]), centroids)
+                 for s in range(0, count, BLOCK_ROWS)]
+            )
+            lists = inverted_lists(assignments, len(centroids))
+
+            with self._write():
+                if self.trained_count != trained_count:
+                    # another process trained them meanwhile
+                    return
+                # rows added while we were training
+                new_rows = np.asarray(self.vectors[count : self.count])
+                new_assignments = self._assign(new_rows, centroids) if len(new_rows) else assignments[:0]
+                for list_id in np.unique(new_assignments):
+                    new_ids = np.arange(count, self.count)[new_assignments == list_id]
+                    lists[list_id] = np.concatenate([lists[list_id], new_ids])
+                self.assignments[:count] = assignments
+                self.assignments[count : self.count] = new_assignments
+                self.assignments.flush()
+
+                fd, temp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, centroids)
+                os.replace(temp_path, self.path / "centroids.npy")
+                self.centroids, self._lists = centroids, lists
+                self.trained_count = count
+                self._set_meta("trained_count", count)
+
+    def _kmeans(self, vectors: np.ndarray, count: int) -> np.ndarray:
+        """the IVF centroids - spherical k-means over a sample of the first `count` rows"""
+        rng = np.random.default_rng(0)
+        nlist = num_lists(count)
+        sample_size = min(count, TRAIN_PER_LIST * nlist, TRAIN_SAMPLE)
+        sample_ids = np.sort(rng.choice(count, sample_size, replace=False))
+        sample = np.asarray(vectors[sample_ids])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            # spherical k-means - the vectors are normalized, so we use cosine
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            # sum the vectors of each list (sorted by list, so it's one reduceat)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # empty lists get a random vector, so no centroid is wasted
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        return centroids.astype(np.float32)
+
+    # ---- indexing ----
+
+    def add_document(self, source: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """index a document (replacing an older version of it) - returns the no of
+        chunks added (0 if it's already indexed, unchanged)"""
+        content_hash = hash_text(text)
+        row = self._reader().execute("SELECT hash FROM documents WHERE source = ?", (source,)).fetchone()
+        if row is not None and row[0] == content_hash:
+            return 0
+
+        chunks = chunk_text(text)
+        # embedding is the slow part - do it before taking the write lock
+        vectors = self.embedder.embed(chunks) if chunks else np.zeros((0, self.dim), np.float32)
+        with self._write():
+            self.db.execute("UPDATE chunks SET deleted = 1 WHERE source = ?", (source,))
+            self._append(source, chunks, vectors, metadata or {})
+            self.db.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (source, content_hash, time.time())
+            )
+        if self._needs_training():
+            self._train()
+        return len(chunks)
+
+    def add_vectors(self, source: str, chunks: List[str], vectors: np.ndarray, metadata=None) -> None:
+        """index chunks that are already embedded (e.g. in bulk)"""
+        with self._write():
+            self._append(source, chunks, vectors, metadata or {})
+        if self._needs_training():
+            self._train()
+
+    def _append(self, source: str, chunks: List[str], vectors: np.ndarray, metadata: Dict[str, Any]) -> None:
+        start, end = self.count, self.count + len(chunks)
+        self.vectors = self._map("vectors.f32", np.float32, self.dim, end)
+        self.assignments = self._map("lists.i32", np.int32, 1, end)
+        self.vectors[start:end] = vectors
+        self.vectors.flush()
+        metadata_json = json.dumps(metadata)
+        self.db.executemany(
+            "INSERT OR REPLACE INTO chunks (id, source, text, metadata) VALUES (?, ?, ?, ?)",
+            [(start + i, source, chunk, metadata_json) for i, chunk in enumerate(chunks)],
+        )
+        self.count = end
+        self._set_meta("count", end)
+
+        # (the centroids are (re)trained after the write, see _train)
+        if self.centroids is not None and end > start:
+            lists = self._assign(vectors)
+            self.assignments[start:end] = lists
+            self.assignments.flush()
+            for list_id in np.unique(lists):
+                new_ids = np.arange(start, end)[lists == list_id]
+                self._lists[list_id] = np.concatenate([self._lists[list_id], new_ids])
+
+    # ---- search ----
+
+    def search_vector(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """the k chunks most similar to an (embedded) query"""
+        with self._lock:
+            self._refresh()
+            count, vectors, centroids, lists = self.count, self.vectors, self.centroids, self._lists
+        if count == 0:
+            return []
+
+        if centroids is None:
+            # too few vectors for an index yet - scan them all
+            ids = np.arange(count)
+            scores = np.concatenate(
+                [np.asarray(vectors[s : min(s + BLOCK_ROWS, count)]) @ query for s in range(0, count, BLOCK_ROWS)]
+            )
+        else:
+            probe = np.argsort(-(centroids @ query))[: nprobe or self.nprobe]
+            # sorted row ids read the memory-mapped file front to back
+            ids = np.sort(np.concatenate([lists[i] for i in probe]))
+            scores = vectors[ids] @ query
+
+        # a few extra in case some of them were replaced (deleted)
+        top = min(len(ids), 2 * k + 8)
+        best = np.argpartition(-scores, top - 1)[:top] if top < len(ids) else np.arange(len(ids))
+        best = best[np.argsort(-scores[best])]
+        return self._results([int(i) for i in ids[best]], [float(s) for s in scores[best]], k)
+
+    def _results(self, ids: List[int], scores: List[float], k: int) -> List[Dict[str, Any]]:
+        rows = self._reader().execute(
+            f"SELECT id, source, text, metadata FROM chunks WHERE deleted = 0 AND id IN ({','.join('?' * len(ids))})",
+            ids,
+        ).fetchall()
+        by_id = {row[0]: row for row in rows}
+        results = []
+        for chunk_id, score in zip(ids, scores):
+            if chunk_id in by_id:
+                _, source, text, metadata = by_id[chunk_id]
+                results.append({"source": source, "score": round(score, 4), "text": text, **json.loads(metadata)})
+            if len(results) == k:
+                break
+        return results
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """the k chunks most relevant to a query"""
+        with span("knowledge.search", k=k) as trace:
+            results = self.search_vector(self.embedder.embed([query])[0], k)
+            trace.set(results=len(results), result_chars=sum(len(result["text"]) for result in results))
+            return results
+
+
+_knowledge_base: Optional[KnowledgeBase] = None
+_knowledge_base_lock = threading.Lock()
+# documents are indexed in the background, one at a time
+_indexer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge-indexer")
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """the knowledge base shared by everything in this process"""
+    global _knowledge_base
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            _knowledge_base = KnowledgeBase()
+        return _knowledge_base
+
+
+def index_in_background(source: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+    """add a document to the knowledge base without waiting for it"""
+
+    def index():
+        try:
+            get_knowledge_base().add_document(source, text, metadata)
+        except Exception as e:
+            # the knowledge base is a nice to have - never fail the caller
+            logger.warning(f"Could not index {source}: {e}")
+
+    _indexer.submit(index)
+
+
+class KnowledgeTools(Toolkit):
+    def __init__(self, knowledge_base: Optional[KnowledgeBase] = None, num_results: int = 5, **kwargs):
+        super().__init__(name="knowledge_tools", **kwargs)
+        self._knowledge_base = knowledge_base
+        self.num_results = num_results
+        self.register(self.search_knowledge_base)
+
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        # opened on first use, not when the agent is built
+        return self._knowledge_base or get_knowledge_base()
+
+    def search_knowledge_base(self, query: str, num_results: Optional[int] = None) -> str:
+        """Use this function to search the local knowledge base of video transcripts and
+        news articles read earlier. Search it before searching the web.
+
+        Args:
+            query (str): What to look for.
+            num_results (int, optional): The no of passages to return (default 5).
+
+        Returns:
+            str: JSON list of the most relevant passages, with their source & similarity score.
+        """
+        log_debug(f"Searching the knowledge base for: {query}")
+        return json.dumps(self.knowledge_base.search(query, num_results or self.num_results), indent=2)
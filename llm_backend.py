@@ -0,0 +1,430 @@
+"""
+llm_backend.py - pluggable LLM backends, used by all the apps in this repo
+
+All apps get their LLM through get_backend(), instead of calling the Gemini or
+OpenAI APIs directly. Which backend is used is picked by the LLM_BACKEND environment
+variable (or the app's default, if it's not set):
+
+    gemini - Google Gemini (google.generativeai / agno Gemini)
+    openai - OpenAI (openai / agno OpenAIChat)
+    fake   - a local, deterministic fake LLM - no network or API keys needed.
+             Use it to profile/load-test the apps offline. Its latency can be set with
+             FAKE_LLM_FIRST_TOKEN_LATENCY & FAKE_LLM_TOKEN_LATENCY (in seconds)
+
+Every backend can
+    - generate(prompt, model) -> the response text
+    - stream(prompt, model) -> iterator of response tokens
+    - chat(messages, model, stream) -> same, for a list of {"role":..., "content":...}
+    - agno_model(model) -> an agno Model, to use with agno Agents
+
+Apps don't name provider models - `model` is one of the backend's tiers (see
+MODEL_TIERS; the backend's own model for it is in its `models`), or left out
+for the "default" tier (agno_model(): "agent"). A model id can still be given,
+it's used as is.
+
+RateLimitedBackend wraps any backend to keep it under a requests/minute quota
+(e.g. for batch jobs). The backends from get_backend() are wrapped in a
+TracedBackend, which times every call (see tracing.py).
+
+Backends, their API clients & models are created once per process (see
+registry.py) and reused by every call, so connections stay warm.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from agno.models.base import Model
+from agno.models.message import Message
+from agno.models.response import ModelResponse
+
+from registry import shared
+from tracing import record_output, span, start_span, trace_stream
+
+_TOKEN = re.compile(r"\S+\s*")
+
+_VOCABULARY = (
+    "the a of and to in is for on that with as it this be are from by at an was "
+    "match team player goal video model data time city food street local best "
+    "first good new great game summary point result people place key also"
+).split()
+
+
+# default - most calls, fast - cheap helper calls (e.g. summarizing a chat
+# history), agent - the model behind agno agents (tool calls)
+MODEL_TIERS = ("default", "fast", "agent")
+
+
+class LLMBackend:
+    name = "base"
+    # model tier -> the backend's model id
+    models: Dict[str, str] = {}
+
+    def model_id(self, model: Optional[str] = None) -> str:
+        """the backend's model for `model` - a tier (None = "default") or a model id"""
+        model = model or "default"
+        return self.models.get(model, model)
+
+    def generate(self, prompt: str, model: Optional[str] = None, **config) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: Optional[str] = None, **config) -> Iterator[str]:
+        raise NotImplementedError
+
+    def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False, **config):
+        raise NotImplementedError
+
+    def agno_model(self, model: Optional[str] = None) -> Model:
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    models = {"default": "gemini-2.0-flash", "fast": "gemini-2.0-flash", "agent": "gemini-2.0-flash-exp"}
+
+    def __init__(self, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        self.genai = genai
+        configure_gemini(api_key)
+        # (model, config) -> GenerativeModel - they all share genai's API client
+        self._models: Dict[Any, Any] = {}
+        self._models_lock = threading.Lock()
+
+    def _model(self, model: str, **config):
+        key = (model, tuple(sorted(config.items())))
+        with self._models_lock:
+            if key not in self._models:
+                gen_config = self.genai.GenerationConfig(**config)
+                self._models[key] = self.genai.GenerativeModel(model, generation_config=gen_config)
+            return self._models[key]
+
+    def generate(self, prompt: str, model: Optional[str] = None, **config) -> str:
+        return self._model(self.model_id(model), **config).generate_content(prompt).text
+
+    def stream(self, prompt: str, model: Optional[str] = None, **config) -> Iterator[str]:
+        response = self._model(self.model_id(model), **config).generate_content(prompt, stream=True)
+        for chunk in response:
+            yield chunk.text
+
+    def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False, **config):
+        # Gemini calls the assistant "model"
+        contents = [
+            {
+                "role": "model" if m["role"] == "assistant" else "user",
+                "parts": [m["content"]],
+            }
+            for m in messages
+        ]
+        response = self._model(self.model_id(model), **config).generate_content(contents, stream=stream)
+        if stream:
+            return (chunk.text for chunk in response)
+        return response.text
+
+    def agno_model(self, model: Optional[str] = None) -> Model:
+        from agno.models.google import Gemini
+
+        model = self.model_id(model or "agent")
+        # every agent gets its own model (agents configure their model), but
+        # they all share one API client
+        client = shared("gemini.agno_client", lambda: Gemini(id=model).get_client())
+        return Gemini(id=model, client=client)
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+    models = {"default": "gpt-4o", "fast": "gpt-4o-mini", "agent": "gpt-4o"}
+
+    def __init__(self):
+        from openai import OpenAI
+
+        self.client = OpenAI()
+
+    @staticmethod
+    def _config(config: Dict[str, Any]) -> Dict[str, Any]:
+        # same config names as Gemini, so apps can switch backends
+        config = dict(config)
+        if "max_output_tokens" in config:
+            config["max_tokens"] = config.pop("max_output_tokens")
+        return config
+
+    def generate(self, prompt: str, model: Optional[str] = None, **config) -> str:
+        return self.chat([{"role": "user", "content": prompt}], model, **config)
+
+    def stream(self, prompt: str, model: Optional[str] = None, **config) -> Iterator[str]:
+        return self.chat([{"role": "user", "content": prompt}], model, stream=True, **config)
+
+    def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False, **config):
+        response = self.client.chat.completions.create(
+            model=self.model_id(model), messages=messages, stream=stream, **self._config(config)
+        )
+        if stream:
+            return (
+                chunk.choices[0].delta.content
+                for chunk in response
+                if chunk.choices and chunk.choices[0].delta.content
+            )
+        return response.choices[0].message.content
+
+    def agno_model(self, model: Optional[str] = None) -> Model:
+        from agno.models.openai import OpenAIChat
+
+        model = self.model_id(model or "agent")
+        async_client = shared("openai.agno_async_client", lambda: OpenAIChat(id=model).get_async_client())
+        return OpenAIChat(id=model, client=self.client, async_client=async_client)
+
+
+def echo_responder(prompt: str) -> str:
+    """fake response that repeats the last block (after the last blank line) of the
+    prompt - handy to test pipelines that should preserve their input text"""
+    blocks = [block.strip() for block in prompt.split("\n\n") if block.strip()]
+    return blocks[-1] if blocks else ""
+
+
+def hash_responder(prompt: str) -> str:
+    """fake response - pseudo-random words seeded by the prompt, ~1/8th as long"""
+    seed = hashlib.sha256(prompt.encode("utf-8")).digest()
+    n_words = min(512, max(8, len(prompt) // 32))
+    return " ".join(
+        _VOCABULARY[seed[i % len(seed)] * (i + 1) % len(_VOCABULARY)]
+        for i in range(n_words)
+    )
+
+
+class FakeBackend(LLMBackend):
+    """deterministic, local stand-in for a real LLM (the same prompt always gets
+    the same response), with configurable latency"""
+
+    name = "fake"
+    models = {tier: "fake" for tier in MODEL_TIERS}
+
+    def __init__(
+        self,
+        first_token_latency: Optional[float] = None,
+        token_latency: Optional[float] = None,
+        responder: Callable[[str], str] = hash_responder,
+    ):
+        if first_token_latency is None:
+            first_token_latency = float(os.getenv("FAKE_LLM_FIRST_TOKEN_LATENCY", "0"))
+        if token_latency is None:
+            token_latency = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0"))
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.responder = responder
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _tokens(self, prompt: str, max_output_tokens: Optional[int] = None) -> List[str]:
+        with self._lock:
+            self.calls += 1
+        tokens = _TOKEN.findall(self.responder(prompt))
+        return tokens[:max_output_tokens] if max_output_tokens else tokens
+
+    def generate(self, prompt: str, model: Optional[str] = None, **config) -> str:
+        tokens = self._tokens(prompt, config.get("max_output_tokens"))
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        return "".join(tokens)
+
+    def stream(self, prompt: str, model: Optional[str] = None, **config) -> Iterator[str]:
+        tokens = self._tokens(prompt, config.get("max_output_tokens"))
+        time.sleep(self.first_token_latency)
+        for token in tokens:
+            time.sleep(self.token_latency)
+            yield token
+
+    async def astream(self, prompt: str, **config) -> AsyncIterator[str]:
+        tokens = self._tokens(prompt, config.get("max_output_tokens"))
+        await asyncio.sleep(self.first_token_latency)
+        for token in tokens:
+            await asyncio.sleep(self.token_latency)
+            yield token
+
+    def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False, **config):
+        # respond to the whole conversation, so the answer changes with the history
+        prompt = "\n\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if stream:
+            return self.stream(prompt, model, **config)
+        return self.generate(prompt, model, **config)
+
+    def agno_model(self, model: Optional[str] = None) -> Model:
+        return FakeModel(id=self.model_id(model or "agent"), backend=self)
+
+
+@dataclass
+class FakeModel(Model):
+    """agno Model backed by a FakeBackend (no tool calls - it only ever answers)"""
+
+    id: str = "fake"
+    name: str = "FakeModel"
+    provider: str = "Fake"
+    backend: Optional[FakeBackend] = None
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.backend is None:
+            self.backend = FakeBackend()
+
+    @staticmethod
+    def _prompt(messages: List[Message]) -> str:
+        return "\n\n".join(f"{m.role}: {m.get_content_string()}" for m in messages)
+
+    def invoke(self, messages: List[Message]) -> str:
+        return self.backend.generate(self._prompt(messages))
+
+    async def ainvoke(self, messages: List[Message]) -> str:
+        return "".join([token async for token in self.backend.astream(self._prompt(messages))])
+
+    def invoke_stream(self, messages: List[Message]) -> Iterator[str]:
+        return self.backend.stream(self._prompt(messages))
+
+    async def ainvoke_stream(self, messages: List[Message]) -> AsyncIterator[str]:
+        async for token in self.backend.astream(self._prompt(messages)):
+            yield token
+
+    def parse_provider_response(self, response: str) -> ModelResponse:
+        return ModelResponse(role="assistant", content=response)
+
+    def parse_provider_response_delta(self, response: str) -> ModelResponse:
+        return ModelResponse(content=response)
+
+
+class TokenBucket:
+    """allows `rate` requests per second on average, with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """wait (if needed) till a request is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedBackend(LLMBackend):
+    """a backend whose requests (shared by all threads) are kept under a quota"""
+
+    def __init__(self, backend: LLMBackend, requests_per_minute: float, burst: int = 1):
+        self.backend = backend
+        self.name = backend.name
+        self.models = backend.models
+        self.limiter = TokenBucket(requests_per_minute / 60, burst)
+
+    def generate(self, prompt: str, model: Optional[str] = None, **config) -> str:
+        self.limiter.acquire()
+        return self.backend.generate(prompt, model, **config)
+
+    def stream(self, prompt: str, model: Optional[str] = None, **config) -> Iterator[str]:
+        # the request is made (& counted) when the stream is first read, not when
+        # it's created - streams are often created well before they're read
+        self.limiter.acquire()
+        yield from self.backend.stream(prompt, model, **config)
+
+    def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False, **config):
+        if stream:
+            return self._chat_stream(messages, model, **config)
+        self.limiter.acquire()
+        return self.backend.chat(messages, model, **config)
+
+    def _chat_stream(self, messages: List[Dict[str, str]], model: Optional[str], **config) -> Iterator[str]:
+        self.limiter.acquire()
+        yield from self.backend.chat(messages, model, stream=True, **config)
+
+    def agno_model(self, model: Optional[str] = None) -> Model:
+        # agno makes its own requests - not rate limited
+        return self.backend.agno_model(model)
+
+
+class TracedBackend(LLMBackend):
+    """a backend whose calls are timed as spans - with the time to first token,
+    tokens/second & prompt/response sizes"""
+
+    def __init__(self, backend: LLMBackend):
+        self.backend = backend
+        self.name = backend.name
+        self.models = backend.models
+
+    def __getattr__(self, name: str):
+        # anything else (e.g. FakeBackend.calls) is the wrapped backend's
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def generate(self, prompt: str, model: Optional[str] = None, **config) -> str:
+        with span("llm.generate", backend=self.name, model=self.model_id(model), prompt_chars=len(prompt)) as s:
+            response = self.backend.generate(prompt, model, **config)
+            record_output(s, len(response or ""))
+        return response
+
+    def stream(self, prompt: str, model: Optional[str] = None, **config) -> Iterator[str]:
+        s = start_span("llm.stream", backend=self.name, model=self.model_id(model), prompt_chars=len(prompt))
+        try:
+            return trace_stream(self.backend.stream(prompt, model, **config), s)
+        except Exception as e:
+            s.end(error=e)
+            raise
+
+    def chat(self, messages: List[Dict[str, str]], model: Optional[str] = None, stream: bool = False, **config):
+        attributes = dict(
+            backend=self.name,
+            model=self.model_id(model),
+            messages=len(messages),
+            prompt_chars=sum(len(m["content"] or "") for m in messages),
+        )
+        if not stream:
+            with span("llm.chat", **attributes) as s:
+                response = self.backend.chat(messages, model, **config)
+                record_output(s, len(response or ""))
+            return response
+        s = start_span("llm.chat", stream=True, **attributes)
+        try:
+            return trace_stream(self.backend.chat(messages, model, stream=True, **config), s)
+        except Exception as e:
+            s.end(error=e)
+            raise
+
+    def agno_model(self, model: Optional[str] = None) -> Model:
+        # agents are traced by their runs (see agent_stream.py)
+        return self.backend.agno_model(model)
+
+
+def configure_gemini(api_key: Optional[str] = None) -> None:
+    """configure google.generativeai (once per process) - genai.configure() drops
+    the API clients & their open connections, so don't call it on every rerun"""
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    if api_key:
+        import google.generativeai as genai
+
+        shared(("gemini.configure", api_key), lambda: genai.configure(api_key=api_key))
+
+
+_BACKENDS = {
+    "gemini": GeminiBackend,
+    "openai": OpenAIBackend,
+    "fake": FakeBackend,
+}
+
+
+def get_backend(name: Optional[str] = None, default: str = "gemini") -> LLMBackend:
+    """the (shared, traced) backend called `name` - if not given, the one set in the
+    LLM_BACKEND environment variable, else `default`"""
+    name = (name or os.getenv("LLM_BACKEND") or default).lower()
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}, use one of {list(_BACKENDS)}")
+    return shared(("backend", name), lambda: TracedBackend(_BACKENDS[name]()))
@@ -0,0 +1,61 @@
+"""
+registry.py - process-wide registry of shared objects (API clients, models, agents)
+
+Streamlit re-runs the app script on every interaction, so anything the script
+creates at the top level (API clients, models, agents) is created again on
+every click - and a new API client means a new HTTP connection (DNS, TLS) for
+the next request. Objects got through shared() are created once per process
+(the first time they're asked for) & then reused by every rerun, session &
+thread - so their connections stay warm.
+
+Modules the app imports are only run once per process (Python caches them), so
+they can also keep their objects at module level - shared() is for the app
+scripts themselves & for objects made lazily.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, TypeVar
+
+T = TypeVar("T")
+
+_resources: Dict[Hashable, Any] = {}
+# when each resource was created (time.time()) - see registered()
+_created: Dict[Hashable, float] = {}
+# one lock per key, so a slow factory does not block other keys
+_locks: Dict[Hashable, threading.Lock] = {}
+_lock = threading.Lock()
+
+
+def shared(key: Hashable, factory: Callable[[], T]) -> T:
+    """the object registered as `key` - made with factory() the first time it's
+    asked for (threads asking for it at the same time wait for that one call)"""
+    try:
+        return _resources[key]
+    except KeyError:
+        pass
+    with _lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _resources:
+            _resources[key] = factory()
+            _created[key] = time.time()
+        return _resources[key]
+
+
+def registered() -> List[Dict[str, Any]]:
+    """the registered objects - key, type & age (seconds), oldest first"""
+    now = time.time()
+    with _lock:
+        keys = sorted(_created, key=_created.get)
+        return [
+            {"key": key, "type": type(_resources[key]).__name__, "age": now - _created[key]}
+            for key in keys
+        ]
+
+
+def release(key: Hashable) -> None:
+    """forget the object registered as `key` (the next shared() makes a new one)"""
+    with _lock:
+        _resources.pop(key, None)
+        _created.pop(key, None)
@@ -0,0 +1,125 @@
+"""
+search_cache.py - DuckDuckGo search with a (short lived) result cache
+
+Agents often search for the same thing several times within a few minutes, with
+queries that only differ in casing, whitespace or word order ("IPL 2025 final
+result" vs "ipl  final result 2025"). CachedDuckDuckGoTools is a drop-in
+replacement for DuckDuckGoTools that
+    - normalizes the query & keeps the results in a disk cache (shared by all
+      sessions & processes) for a few minutes - search results go stale quickly
+    - coalesces identical searches that are in flight at the same time, so
+      only one request is sent & everyone else waits for its results
+This cuts tool call latency and keeps us under the search provider's rate limits.
+"""
+
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from agno.tools.duckduckgo import DuckDuckGoTools
+from agno.utils.log import log_debug
+
+from disk_cache import DiskCache, make_key
+from tracing import span
+
+# search results are reused for this long (seconds)
+SEARCH_TTL = 10 * 60
+# punctuation that doesn't change what a search finds
+STRIP_CHARS = ".,;:!?\"'()[]{}"
+
+search_cache = DiskCache(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "search"),
+    max_bytes=32 * 1024 * 1024,
+    ttl=SEARCH_TTL,
+)
+
+# searches in flight (in this process) by cache key - shared by all toolkits
+_in_flight: Dict[str, Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+def normalize_query(query: str) -> str:
+    """queries that differ only in casing, whitespace, surrounding punctuation or
+    word order normalize to the same string"""
+    words = (word.strip(STRIP_CHARS) for word in query.casefold().split())
+    return " ".join(sorted(word for word in words if word))
+
+
+class CachedDuckDuckGoTools(DuckDuckGoTools):
+    def __init__(self, cache: Optional[DiskCache] = search_cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def _search(self, kind: str, query: str, max_results: int, search: Callable[[], str]) -> str:
+        with span("search.duckduckgo", kind=kind, query=query) as trace:
+            results = self._cached_search(kind, query, max_results, search, trace)
+            trace.set(result_chars=len(results or ""))
+            return results
+
+    def _cached_search(self, kind: str, query: str, max_results: int, search: Callable[[], str], trace) -> str:
+        key = make_key(
+            stage="search",
+            kind=kind,
+            query=normalize_query(query),
+            modifier=self.modifier,
+            max_results=self.fixed_max_results or max_results,
+        )
+        if self.cache is not None and (results := self.cache.get(key)) is not None:
+            log_debug(f"DDG {kind} cache hit for: {query}")
+            trace.set(source="cache")
+            return results
+
+        with _in_flight_lock:
+            future = _in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = _in_flight[key] = Future()
+        if not leader:
+            log_debug(f"Waiting for identical DDG {kind} in flight: {query}")
+            trace.set(source="in_flight")
+            return future.result()
+
+        try:
+            # the search we were waiting on may have just finished
+            results = self.cache.get(key) if self.cache is not None else None
+            trace.set(source="cache" if results is not None else "search")
+            if results is None:
+                results = search()
+                if self.cache is not None:
+                    self.cache.set(key, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            # errors are passed on to the waiting searches, but never cached
+            future.set_exception(e)
+            raise
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
+
+    def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+        """Use this function to search DuckDuckGo for a query.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The result from DuckDuckGo.
+        """
+        search = super().duckduckgo_search
+        return self._search("text", query, max_results, lambda: search(query, max_results))
+
+    def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+        """Use this function to get the latest news from DuckDuckGo.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The latest news from DuckDuckGo.
+        """
+        search = super().duckduckgo_news
+        return self._search("news", query, max_results, lambda: search(query, max_results))
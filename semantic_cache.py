@@ -0,0 +1,330 @@
+"""
+semantic_cache.py - answer repeated questions from a cache, even when reworded
+
+"best vada pav in Mumbai?" and "Mumbai's best vada pav" need the same answer,
+but an exact-match cache would miss. SemanticCache embeds each prompt (locally,
+see embeddings.py) & keeps the vectors in a NumPy matrix; a lookup is one
+matrix-vector product. If the most similar cached prompt is above `threshold`
+(cosine similarity), its response is returned & the LLM call is skipped.
+
+- the threshold depends on the embedder (THRESHOLDS) - the hashing embedder
+  scores rewordings lower than a sentence-transformers model does
+- similar isn't always the same question: "IPL 2023" vs "IPL 2024", "safe to
+  swim" vs "not safe to swim". A hit needs the same numbers & the same
+  negations/contrast words (CONTRAST_WORDS) in both prompts
+- the hashing embedder only sees shared words & trigrams, so "cook rice in a
+  pressure cooker" & "cook dal in a pressure cooker" look alike to it. With
+  that embedder (WORD_MATCH_EMBEDDERS), a hit also needs the same content
+  words - up to order, stop words, plurals & typos
+- a cache has a `scope` - e.g. the LLM backend & model that produced its
+  answers. Entries (also those loaded from disk) only match in their own scope
+
+- the cache holds at most `max_entries`; beyond that entries are evicted "lru"
+  (least recently used), "lfu" (least often hit) or "fifo" (oldest first)
+- entries older than `ttl` seconds are ignored (& evicted)
+- prompts shorter than `min_words` are never cached - those are usually
+  follow-ups ("tell me more") that only make sense in their conversation
+- with a `path`, the cache is saved to disk (as one file) after every new entry
+  & loaded on start, so it is shared across runs & processes - a save merges in
+  what other processes saved meanwhile, under a file lock
+- stats() reports the hit rate & the LLM time saved
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - the cache is only shared between threads there
+    fcntl = None
+
+import numpy as np
+
+from embeddings import get_embedder
+
+# min cosine similarity between prompts for a cache hit, by embedder (THRESHOLD
+# for sentence-transformers models)
+THRESHOLD = 0.9
+THRESHOLDS = {"hashing": 0.85}
+# words that flip or change what a question asks - prompts that differ in these
+# are never the same question
+CONTRAST_WORDS = frozenset(
+    "not no never without none nor cannot best worst most least first last before after".split()
+)
+# embedders that need the same content words for a hit
+WORD_MATCH_EMBEDDERS = frozenset({"hashing"})
+# words that don't change what a question asks
+STOP_WORDS = frozenset(
+    "a an the in on at of for to from by with about and or is are was were be been am do does did "
+    "i me my we our you your it its this that these those there their they he she his her "
+    "what which who whom whose how why when where please tell give s".split()
+)
+# min similarity (difflib ratio) of two words that count as the same word - a
+# typo or plural, not another word ("rice" vs "dal", "north" vs "south")
+WORD_SIMILARITY = 0.8
+MAX_ENTRIES = 1000
+EVICTION_POLICIES = ("lru", "lfu", "fifo")
+MIN_WORDS = 3
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_WORD = re.compile(r"\w+")
+
+
+def question_key(prompt: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """the numbers & contrast words in a prompt - similar prompts only ask the
+    same question if these are the same"""
+    text = prompt.casefold().replace("n't", " not")
+    words = set(_WORD.findall(text))
+    return frozenset(_NUMBER.findall(text)), frozenset(words & CONTRAST_WORDS)
+
+
+def content_words(prompt: str) -> FrozenSet[str]:
+    """the words of a prompt that say what it asks about (no stop words)"""
+    return frozenset(_WORD.findall(prompt.casefold())) - STOP_WORDS
+
+
+def same_content_words(words: FrozenSet[str], other: FrozenSet[str]) -> bool:
+    """whether every word in each set is (nearly) a word in the other"""
+
+    def covered(a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+        return all(
+            word in b or any(SequenceMatcher(None, word, candidate).ratio() >= WORD_SIMILARITY for candidate in b)
+            for word in a
+        )
+
+    return covered(words, other) and covered(other, words)
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embedder=None,
+        threshold: Optional[float] = None,
+        max_entries: int = MAX_ENTRIES,
+        eviction: str = "lru",
+        ttl: Optional[float] = None,
+        min_words: int = MIN_WORDS,
+        path: Optional[str] = None,
+        scope: str = "",
+        match_words: Optional[bool] = None,
+    ):
+        """threshold - THRESHOLDS for the embedder, if not given; scope - entries
+        only match lookups in the same scope (e.g. "gemini/gemini-2.0-flash");
+        match_words - hits need the same content words (default: for WORD_MATCH_EMBEDDERS)"""
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {EVICTION_POLICIES}, not {eviction!r}")
+        self.embedder = embedder or get_embedder()
+        self.threshold = threshold if threshold is not None else THRESHOLDS.get(self.embedder.name, THRESHOLD)
+        self.max_entries = max_entries
+        self.eviction = eviction
+        self.ttl = ttl
+        self.min_words = min_words
+        self.path = Path(path) if path else None
+        self.scope = scope
+        self.match_words = match_words if match_words is not None else self.embedder.name in WORD_MATCH_EMBEDDERS
+
+        # row i of the matrix is the embedding of entries[i]["prompt"]
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self._entries: List[Dict[str, Any]] = []
+        # which entries are in this cache's scope
+        self._in_scope = np.zeros(0, dtype=bool)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        # LLM time the hits saved & time spent looking up (seconds)
+        self.time_saved = 0.0
+        self.lookup_time = 0.0
+        if self.path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _cacheable(self, prompt: str) -> bool:
+        return len(prompt.split()) >= self.min_words
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """the cached response to the most similar prompt, if it's similar enough"""
+        if not self._cacheable(prompt):
+            return None
+        start = time.perf_counter()
+        query = self.embedder.embed([prompt])[0]
+        with self._lock:
+            self.lookups += 1
+            response = None
+            if self._entries:
+                similarities = np.where(self._in_scope, self._vectors @ query, -1.0)
+                # most similar first - the first one that asks the same question
+                candidates = np.flatnonzero(similarities >= self.threshold)
+                key, words = question_key(prompt), content_words(prompt)
+                for i in candidates[np.argsort(-similarities[candidates])]:
+                    entry = self._entries[i]
+                    if self._expired(entry) or question_key(entry["prompt"]) != key:
+                        continue
+                    if self.match_words and not same_content_words(words, content_words(entry["prompt"])):
+                        continue
+                    entry["hits"] += 1
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                    self.time_saved += entry["latency"]
+                    response = entry["response"]
+                    break
+            self.lookup_time += time.perf_counter() - start
+        return response
+
+    def add(self, prompt: str, response: str, latency: float = 0.0) -> None:
+        """cache a response - latency is the time it took the LLM to produce it"""
+        if not self._cacheable(prompt):
+            return
+        vector = self.embedder.embed([prompt])
+        now = time.time()
+        entry = {
+            "prompt": prompt,
+            "response": response,
+            "scope": self.scope,
+            "latency": latency,
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        with self._lock:
+            self._evict(room_for=1)
+            self._entries.append(entry)
+            self._vectors = np.concatenate([self._vectors, vector])
+            self._in_scope = np.append(self._in_scope, True)
+            if self.path is not None:
+                self._save()
+
+    def get_or_compute(self, prompt: str, compute: Callable[[str], str]) -> str:
+        """the cached response, else compute(prompt) (which is then cached)"""
+        response = self.lookup(prompt)
+        if response is None:
+            start = time.perf_counter()
+            response = compute(prompt)
+            self.add(prompt, response, time.perf_counter() - start)
+        return response
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+
+    def _evict(self, room_for: int = 0) -> None:
+        """drop expired entries, then entries (by the eviction policy) till there
+        is room for `room_for` more"""
+        keep = [i for i, entry in enumerate(self._entries) if not self._expired(entry)]
+        excess = len(keep) + room_for - self.max_entries
+        if excess > 0:
+            if self.eviction == "lru":
+                order = sorted(keep, key=lambda i: self._entries[i]["last_used"])
+            elif self.eviction == "lfu":
+                order = sorted(keep, key=lambda i: (self._entries[i]["hits"], self._entries[i]["last_used"]))
+            else:
+                order = sorted(keep, key=lambda i: self._entries[i]["created"])
+            evicted = set(order[:excess])
+            keep = [i for i in keep if i not in evicted]
+        if len(keep) < len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep]
+            self._in_scope = self._in_scope[keep]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "time_saved": self.time_saved,
+                "avg_lookup_ms": 1000 * self.lookup_time / self.lookups if self.lookups else 0.0,
+            }
+
+    @property
+    def _file(self) -> Path:
+        return self.path / "cache.npz"
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """hold the cache file against other processes (saving the cache)"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _read(self) -> Optional[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        """the vectors & entries in the cache file - None if there are none (or
+        they were saved with another embedder)"""
+        try:
+            with np.load(self._file, allow_pickle=False) as data:
+                vectors, entries = data["vectors"], json.loads(str(data["entries"]))
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+        if vectors.shape != (len(entries), self.embedder.dim):
+            return None
+        return vectors.astype(np.float32), entries
+
+    def _merge(self, vectors: np.ndarray, entries: List[Dict[str, Any]]) -> None:
+        """add the entries another process saved (& the hits it counted) to ours"""
+        index = {(entry.get("scope", ""), entry["prompt"]): i for i, entry in enumerate(self._entries)}
+        new = []
+        for i, entry in enumerate(entries):
+            ours = index.get((entry.get("scope", ""), entry["prompt"]))
+            if ours is None:
+                new.append(i)
+            else:
+                self._entries[ours]["hits"] = max(self._entries[ours]["hits"], entry["hits"])
+                self._entries[ours]["last_used"] = max(self._entries[ours]["last_used"], entry["last_used"])
+        if new:
+            self._entries += [entries[i] for i in new]
+            self._vectors = np.concatenate([self._vectors, vectors[new]])
+        # (entries saved before scopes existed have none)
+        self._in_scope = np.array([entry.get("scope", "") == self.scope for entry in self._entries], dtype=bool)
+
+    def _save(self) -> None:
+        # re-read & merged under the lock, so entries other processes added
+        # meanwhile aren't lost - then written to a temp file & renamed into
+        # place, so a reader (or a crash) never sees a half written cache
+        with self._file_lock():
+            saved = self._read()
+            if saved is not None:
+                self._merge(*saved)
+                self._evict()
+            fd, temp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, vectors=self._vectors, entries=np.array(json.dumps(self._entries)))
+                os.replace(temp_path, self._file)
+            except BaseException:
+                Path(temp_path).unlink(missing_ok=True)
+                raise
+
+    def _load(self) -> None:
+        saved = self._read()
+        if saved is None:
+            return
+        self._merge(*saved)
+        self._evict()
+
+
+def remember(agent, prompt: str, response: str) -> None:
+    """add a cached question & answer to an agent's memory, as if the agent had
+    answered it, so follow-up questions still have their context"""
+    from agno.memory.agent import AgentRun
+    from agno.models.message import Message
+    from agno.run.response import RunResponse
+
+    if agent.memory is None:
+        return
+    user = Message(role="user", content=prompt)
+    assistant = Message(role="assistant", content=response)
+    agent.memory.add_messages(messages=[user, assistant])
+    agent.memory.add_run(
+        AgentRun(message=user, response=RunResponse(content=response, messages=[user, assistant]))
+    )
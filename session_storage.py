@@ -0,0 +1,453 @@
+"""
+session_storage.py - agent session storage for many concurrent sessions (SQLite)
+
+SqliteAgentStorage keeps each session as one row & rewrites the whole thing
+(every run, every message) after each run. agno reads it back in full before
+each run, though with add_history_to_messages only the last few runs are ever
+sent to the model. With several Streamlit sessions writing at once, the writers
+queue up on the database lock & reads get slower as the histories grow.
+
+PooledSqliteStorage is a drop-in replacement (for agents) that
+    - opens the database in WAL mode, so readers never block on a writer, and
+      hands out connections from a small pool instead of one per query
+    - keeps runs in their own table, one row per run (keyed by session id), so
+      a write only appends the new runs & a read loads only the last N of them
+    - defers writes to a background thread, which writes everything that came
+      in meanwhile (from all sessions) in one transaction
+
+Sessions in a database written by SqliteAgentStorage (legacy_db_file) are
+imported, split into runs, the first time the new database is created - the
+old file itself is only read.
+
+Note: the agent computes its session metrics from the messages it has loaded,
+so with this storage they cover the last N runs, not the whole session.
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from agno.storage.base import Storage
+from agno.storage.session.agent import AgentSession
+from agno.utils.log import log_debug, logger
+
+from tracing import span, start_span
+
+# no of runs loaded with a session - match the agent's num_history_runs
+HISTORY_RUNS = 3
+# no of connections kept open
+POOL_SIZE = 4
+# max time a deferred write waits before it's written (seconds)
+FLUSH_INTERVAL = 0.5
+# write right away once this many runs are waiting
+MAX_PENDING_RUNS = 64
+# how long to wait for a lock held by another process (milliseconds)
+BUSY_TIMEOUT = 10_000
+
+SESSION_COLUMNS = [
+    "session_id",
+    "user_id",
+    "agent_id",
+    "team_session_id",
+    "memory",
+    "agent_data",
+    "session_data",
+    "extra_data",
+    "created_at",
+    "updated_at",
+]
+JSON_COLUMNS = {"memory", "agent_data", "session_data", "extra_data"}
+SYSTEM_ROLES = ("system", "developer")
+
+
+def _row_bytes(rows: List[tuple]) -> int:
+    """(roughly) the size of rows we write - their text columns"""
+    return sum(len(value) for row in rows for value in row if isinstance(value, str))
+
+
+def _split_system_messages(messages: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """the leading system message(s) & the rest"""
+    system_count = 0
+    while system_count < len(messages) and messages[system_count].get("role") in SYSTEM_ROLES:
+        system_count += 1
+    return messages[:system_count], messages[system_count:]
+
+
+def _messages_per_run(messages: List[dict], n_runs: int) -> List[List[dict]]:
+    """split a session's messages into its runs - each run starts with a user
+    message. If they don't line up, all messages go with the last run."""
+    groups: List[List[dict]] = []
+    for message in messages:
+        if message.get("role") == "user" or not groups:
+            groups.append([])
+        groups[-1].append(message)
+    if len(groups) != n_runs:
+        groups = [[] for _ in range(n_runs - 1)] + [messages] if n_runs else []
+    return groups
+
+
+class PooledSqliteStorage(Storage):
+    def __init__(
+        self,
+        table_name: str,
+        db_file: str,
+        history_runs: Optional[int] = HISTORY_RUNS,
+        pool_size: int = POOL_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_pending_runs: int = MAX_PENDING_RUNS,
+        legacy_db_file: Optional[str] = None,
+    ):
+        """history_runs - no of (latest) runs loaded with a session (None = all)
+        flush_interval - 0 writes every session right away (no deferred writes)
+        legacy_db_file - a SqliteAgentStorage database, imported when db_file is created"""
+        super().__init__("agent")
+        self.table_name = table_name
+        self.runs_table = f"{table_name}_runs"
+        self.db_file = str(Path(db_file).resolve())
+        self.history_runs = history_runs
+        self.flush_interval = flush_interval
+        self.max_pending_runs = max_pending_runs
+
+        Path(self.db_file).parent.mkdir(parents=True, exist_ok=True)
+        is_new = not Path(self.db_file).exists()
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        self.create()
+        if is_new and legacy_db_file is not None and Path(legacy_db_file).exists():
+            self.import_legacy(legacy_db_file)
+
+        # session id -> [seq of the first loaded run, no of runs & no of messages
+        # (after the system message) the agent's memory holds that are already stored]
+        self._positions: Dict[str, List[int]] = {}
+        # writes waiting for the writer thread - session id -> (session row, {seq: run row})
+        self._pending: Dict[str, Tuple[tuple, Dict[int, tuple]]] = {}
+        self._pending_runs = 0
+        # ids of the sessions the current flush is writing (until it commits)
+        self._flushing: Set[str] = set()
+        self._lock = threading.Lock()
+        # one flush at a time - a read waits for the flush writing its session
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        if self.flush_interval > 0:
+            threading.Thread(target=self._writer, daemon=True).start()
+            atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit mode - transactions are started explicitly
+        connection = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        connection.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        # in WAL mode, NORMAL is still safe from corruption (it only skips an fsync per commit)
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connection() as connection:
+            # take the write lock up front, instead of failing to upgrade a read lock later
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def create(self) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.table_name} (
+                    session_id TEXT PRIMARY KEY, user_id TEXT, agent_id TEXT, team_session_id TEXT,
+                    memory TEXT, agent_data TEXT, session_data TEXT, extra_data TEXT,
+                    created_at INTEGER, updated_at INTEGER)"""
+            )
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table_name}_user_id ON {self.table_name} (user_id)"
+            )
+            # the primary key is the index on session id - the last N runs of a
+            # session are one index range scan
+            connection.execute(
+                f"""CREATE TABLE IF NOT EXISTS {self.runs_table} (
+                    session_id TEXT NOT NULL, seq INTEGER NOT NULL, run TEXT, messages TEXT,
+                    created_at INTEGER, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"""
+            )
+
+    def upgrade_schema(self) -> None:
+        pass
+
+    def import_legacy(self, legacy_db_file: str) -> int:
+        """copy the sessions of a SqliteAgentStorage database (same table name)
+        into our tables, one row per run - returns the no of sessions imported"""
+        legacy = sqlite3.connect(f"file:{Path(legacy_db_file).resolve()}?mode=ro", uri=True)
+        try:
+            cursor = legacy.execute(f"SELECT * FROM {self.table_name}")
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not import sessions from {legacy_db_file}: {e}")
+            return 0
+        finally:
+            legacy.close()
+
+        session_rows, run_rows = [], []
+        for data in rows:
+            memory = json.loads(data.get("memory") or "{}")
+            runs = memory.pop("runs", None) or []
+            memory["system_messages"], messages = _split_system_messages(memory.pop("messages", None) or [])
+            data["memory"] = json.dumps(memory, default=str)
+            session_rows.append(tuple(data.get(column) for column in SESSION_COLUMNS))
+            for seq, (run, run_messages) in enumerate(zip(runs, _messages_per_run(messages, len(runs)))):
+                run_rows.append(
+                    (
+                        data["session_id"],
+                        seq,
+                        json.dumps(run, default=str),
+                        json.dumps(run_messages, default=str),
+                        data.get("updated_at"),
+                    )
+                )
+        with self._transaction() as connection:
+            connection.executemany(
+                f"""INSERT OR IGNORE INTO {self.table_name} ({', '.join(SESSION_COLUMNS)})
+                    VALUES ({', '.join('?' * len(SESSION_COLUMNS))})""",
+                session_rows,
+            )
+            connection.executemany(f"INSERT OR IGNORE INTO {self.runs_table} VALUES (?, ?, ?, ?, ?)", run_rows)
+        logger.info(f"Imported {len(session_rows)} sessions ({len(run_rows)} runs) from {legacy_db_file}")
+        return len(session_rows)
+
+    def _to_session(self, row: tuple, connection: sqlite3.Connection, trace=None) -> AgentSession:
+        data = {
+            column: json.loads(value) if column in JSON_COLUMNS and value is not None else value
+            for column, value in zip(SESSION_COLUMNS, row)
+        }
+        session_id = data["session_id"]
+
+        query = f"SELECT seq, run, messages FROM {self.runs_table} WHERE session_id = ? ORDER BY seq DESC"
+        params: tuple = (session_id,)
+        if self.history_runs is not None:
+            query += " LIMIT ?"
+            params += (self.history_runs,)
+        runs = connection.execute(query, params).fetchall()[::-1]
+
+        memory = data["memory"] or {}
+        system_messages = memory.pop("system_messages", [])
+        messages = [message for _, _, run_messages in runs for message in json.loads(run_messages)]
+        memory["runs"] = [json.loads(run) for _, run, _ in runs]
+        memory["messages"] = system_messages + messages
+        data["memory"] = memory
+
+        first_seq = runs[0][0] if runs else self._next_seq(session_id, connection)
+        self._positions[session_id] = [first_seq, len(runs), len(messages)]
+        if trace is not None:
+            size = sum(len(value) for value in row if isinstance(value, str))
+            trace.set(runs=len(runs), bytes=size + sum(len(run) + len(msgs) for _, run, msgs in runs))
+        return AgentSession.from_dict(data)
+
+    def _next_seq(self, session_id: str, connection: sqlite3.Connection) -> int:
+        row = connection.execute(
+            f"SELECT MAX(seq) FROM {self.runs_table} WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def read(self, session_id: str, user_id: Optional[str] = None) -> Optional[AgentSession]:
+        """the session with (only) its last history_runs runs"""
+        with span("storage.read", session_id=session_id) as trace:
+            with self._lock:
+                pending = session_id in self._pending or session_id in self._flushing
+            if pending:
+                # read our own writes - incl. the ones a flush has taken but not
+                # committed yet (flush waits for it), or we'd load stale runs
+                self.flush()
+
+            query = f"SELECT {', '.join(SESSION_COLUMNS)} FROM {self.table_name} WHERE session_id = ?"
+            params: tuple = (session_id,)
+            if user_id is not None:
+                query += " AND user_id = ?"
+                params += (user_id,)
+            with self._connection() as connection:
+                row = connection.execute(query, params).fetchone()
+                if row is None:
+                    self._positions[session_id] = [self._next_seq(session_id, connection), 0, 0]
+                    return None
+                return self._to_session(row, connection, trace)
+
+    def get_all_session_ids(self, user_id: Optional[str] = None, agent_id: Optional[str] = None) -> List[str]:
+        self.flush()
+        query = f"SELECT session_id FROM {self.table_name} WHERE 1 = 1"
+        params: tuple = ()
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        if agent_id is not None:
+            query += " AND agent_id = ?"
+            params += (agent_id,)
+        with self._connection() as connection:
+            rows = connection.execute(query + " ORDER BY created_at DESC", params).fetchall()
+        return [row[0] for row in rows]
+
+    def get_all_sessions(self, user_id: Optional[str] = None, entity_id: Optional[str] = None) -> List[AgentSession]:
+        self.flush()
+        query = f"SELECT {', '.join(SESSION_COLUMNS)} FROM {self.table_name} WHERE 1 = 1"
+        params: tuple = ()
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        if entity_id is not None:
+            query += " AND agent_id = ?"
+            params += (entity_id,)
+        with self._connection() as connection:
+            rows = connection.execute(query + " ORDER BY created_at DESC", params).fetchall()
+            return [self._to_session(row, connection) for row in rows]
+
+    def upsert(self, session: AgentSession) -> Optional[AgentSession]:
+        """store the session & the runs the agent added since it was read - the
+        write itself is deferred (unless flush_interval is 0)"""
+        trace = start_span("storage.upsert", session_id=session.session_id)
+        memory = dict(session.memory or {})
+        runs = memory.pop("runs", None) or []
+        messages = memory.pop("messages", None) or []
+        # the system message is rewritten each time (it can change) - the other
+        # messages are stored with the run they belong to
+        memory["system_messages"], messages = _split_system_messages(messages)
+
+        now = int(time.time())
+        values = session.to_dict()
+        values["memory"] = memory
+        values["created_at"] = values.get("created_at") or now
+        values["updated_at"] = now
+        session_row = tuple(
+            json.dumps(values[column], default=str) if column in JSON_COLUMNS else values[column]
+            for column in SESSION_COLUMNS
+        )
+
+        with self._lock:
+            # a session the agent did not read first holds its whole history
+            first_seq, stored_runs, stored_messages = self._positions.setdefault(session.session_id, [0, 0, 0])
+            run_rows = {}
+            for i in range(stored_runs, len(runs)):
+                # new messages go with the last new run
+                new_messages = messages[stored_messages:] if i == len(runs) - 1 else []
+                run_rows[first_seq + i] = (
+                    session.session_id,
+                    first_seq + i,
+                    json.dumps(runs[i], default=str),
+                    json.dumps(new_messages, default=str),
+                    now,
+                )
+            if run_rows:
+                self._positions[session.session_id] = [first_seq, len(runs), len(messages)]
+
+            _, pending_runs = self._pending.get(session.session_id, (None, {}))
+            pending_runs.update(run_rows)
+            self._pending[session.session_id] = (session_row, pending_runs)
+            self._pending_runs += len(run_rows)
+            flush_now = self.flush_interval <= 0 or self._pending_runs >= self.max_pending_runs
+        trace.set(new_runs=len(run_rows), bytes=_row_bytes([session_row, *run_rows.values()]))
+        trace.end()
+
+        if flush_now:
+            if self.flush_interval <= 0:
+                self.flush()
+            else:
+                self._wake.set()
+        return session
+
+    def flush(self) -> None:
+        """write all deferred writes now, in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._pending_runs = 0
+                self._flushing = set(pending)
+            try:
+                self._write(pending)
+            finally:
+                with self._lock:
+                    self._flushing = set()
+
+    def _write(self, pending: Dict[str, Tuple[tuple, Dict[int, tuple]]]) -> None:
+        if not pending:
+            return
+
+        session_rows = [session_row for session_row, _ in pending.values()]
+        run_rows = [run_row for _, runs in pending.values() for run_row in runs.values()]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in SESSION_COLUMNS[1:] if column != "created_at")
+        trace = start_span("storage.flush", sessions=len(session_rows), runs=len(run_rows))
+        trace.set(bytes=_row_bytes(session_rows + run_rows))
+        try:
+            with self._transaction() as connection:
+                connection.executemany(
+                    f"""INSERT INTO {self.table_name} ({', '.join(SESSION_COLUMNS)})
+                        VALUES ({', '.join('?' * len(SESSION_COLUMNS))})
+                        ON CONFLICT (session_id) DO UPDATE SET {updates}""",
+                    session_rows,
+                )
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {self.runs_table} VALUES (?, ?, ?, ?, ?)", run_rows
+                )
+        except sqlite3.Error as e:
+            trace.end(error=e)
+            logger.warning(f"Error writing {len(pending)} sessions, will retry: {e}")
+            with self._lock:
+                # put them back - unless a newer write of the session came in meanwhile
+                for session_id, (session_row, runs) in pending.items():
+                    if session_id in self._pending:
+                        newer_row, newer_runs = self._pending[session_id]
+                        self._pending[session_id] = (newer_row, {**runs, **newer_runs})
+                    else:
+                        self._pending[session_id] = (session_row, runs)
+                self._pending_runs += len(run_rows)
+            raise
+        trace.end()
+        log_debug(f"Wrote {len(session_rows)} sessions & {len(run_rows)} runs")
+
+    def _writer(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # already logged, we try again on the next round
+                pass
+
+    def close(self) -> None:
+        """write what's pending & stop the writer thread"""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def delete_session(self, session_id: Optional[str] = None):
+        if session_id is None:
+            return
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._positions.pop(session_id, None)
+        with self._transaction() as connection:
+            connection.execute(f"DELETE FROM {self.runs_table} WHERE session_id = ?", (session_id,))
+            connection.execute(f"DELETE FROM {self.table_name} WHERE session_id = ?", (session_id,))
+
+    def drop(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._positions.clear()
+        with self._transaction() as connection:
+            connection.execute(f"DROP TABLE IF EXISTS {self.runs_table}")
+            connection.execute(f"DROP TABLE IF EXISTS {self.table_name}")
@@ -7,45 +7,58 @@ Code has been shared for learning purposes only! Use at own risk
 """
 
 import os
+from typing import Optional
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.duckduckgo import DuckDuckGoTools
-from agno.tools.newspaper4k import Newspaper4kTools
-from agno.storage.agent.sqlite import SqliteAgentStorage
-from agno.run.response import RunEvent, RunResponse
+
+# shared modules from the repo root (pip install -e . - see pyproject.toml)
+from llm_backend import get_backend
+from search_cache import CachedDuckDuckGoTools
+from session_storage import PooledSqliteStorage
+from agent_pool import AgentPool
+from article_reader import ParallelArticleTools
+from knowledge_base import KnowledgeTools
 
 # load API keys from .env file
 load_dotenv()
 
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
-else:
+# Gemini, unless another backend is picked with LLM_BACKEND (e.g. "fake" to run offline)
+llm = get_backend(default="gemini")
+if llm.name == "gemini" and not os.getenv("GOOGLE_API_KEY"):
     raise KeyError("GOOGLE_API_KEY is not defined in environment!")
 
-agent = Agent(
-    model=Gemini(id="gemini-2.0-flash-exp"),
-    tools=[DuckDuckGoTools(), Newspaper4kTools()],
-    description="Researcher writing an article about a topic",
-    instructions=[
-        "For the given topic, search for the top 5 links.",
-        "Then read each URL and extract the article text.",
-        "Analyze and prepare 5-10 bullets about the topic based on the information extracted",
-    ],
-    markdown=True,
-    show_tool_calls=True,
-    add_datetime_to_instructions=True,
-    add_history_to_messages=True,
-    # where to store message histories?
-    storage=SqliteAgentStorage(table_name="agent_sessions", db_file="./agent.db"),
+# where to store message histories? (WAL mode, deferred writes & only the runs
+# needed for the history are loaded - see session_storage.py) - shared by all agents.
+# Sessions in the old agent.db are imported the first time it is created
+storage = PooledSqliteStorage(
+    table_name="agent_sessions", db_file="./agent_sessions.db", legacy_db_file="./agent.db"
 )
 
 
-def as_stream(response):
-    for chunk in response:
-        if isinstance(chunk, RunResponse) and isinstance(chunk.content, str):
-            if chunk.event == RunEvent.run_response:
-                yield chunk.content
+def build_agent(session_id: Optional[str] = None) -> Agent:
+    """a new research agent - one per chat session, so sessions don't share history"""
+    return Agent(
+        model=llm.agno_model(),
+        # searches are cached for a few minutes & articles are read in parallel
+        # (one tool call for all the links)
+        # the knowledge base has the articles & video transcripts we have read before
+        tools=[KnowledgeTools(), CachedDuckDuckGoTools(), ParallelArticleTools()],
+        description="Researcher writing an article about a topic",
+        instructions=[
+            "First search the knowledge base for the topic - use what you find there, if it's relevant & recent enough.",
+            "For the given topic, search for the top 5 links.",
+            "Then read all the URLs at once (in one read_articles call) and extract the article text.",
+            "Analyze and prepare 5-10 bullets about the topic based on the information extracted",
+        ],
+        markdown=True,
+        show_tool_calls=True,
+        add_datetime_to_instructions=True,
+        add_history_to_messages=True,
+        session_id=session_id,
+        storage=storage,
+    )
+
+
+# agents are built lazily, one per session (see agent_pool.py)
+agent_pool = AgentPool(build_agent)
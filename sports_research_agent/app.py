@@ -1,38 +1,75 @@
 """app.py - streamlit based front-end for application"""
 
+import uuid
+
 import streamlit as st
-from utils import apply_styles
-from agents import agent, as_stream
+# utils.py (styles & chat history) is shared with chat_gpt_clone.py, in the repo root
+from utils import apply_styles, render_chat_history
+from agents import agent_pool
+from agent_stream import AgentStream
+from tracing import render_trace_panel, span, traced
+
+
+@traced("sports_research_agent.rerun")
+def main():
+    st.title("ChatGPT Clone")
+
+    # each chat gets its own agent (& chat history) - the pool (re)builds it for
+    # this id, so an evicted agent comes back with the same chat, not an older one
+    if "agent_session_id" not in st.session_state:
+        st.session_state.agent_session_id = str(uuid.uuid4())
+
+    if st.button("💬 New Chat"):
+        # reset chat history - a new chat id, with a new agent
+        st.session_state.messages = []
+        agent_pool.discard(st.session_state.agent_session_id)
+        st.session_state.agent_session_id = str(uuid.uuid4())
+        st.rerun()
+    session_id = st.session_state.agent_session_id
+
+    apply_styles()
+
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+
+    # display previous messages (only the most recent ones, unless asked for more)
+    with span("render.history", messages=len(st.session_state.messages)):
+        render_chat_history(st.session_state.messages)
 
-st.title("ChatGPT Clone")
+    if prompt := st.chat_input("What's up?"):
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
 
-if st.button("💬 New Chat"):
-    # reset chat history
-    st.session_state.messages = []
-    st.rerun()
+        with st.chat_message("assistant"), agent_pool.checkout(session_id) as agent:
+            # the agent runs in the background - show its tool calls as they happen
+            status = st.status("Researching...")
 
-apply_styles()
+            def show_progress(event):
+                if event.kind == "tool_started":
+                    status.update(label=f"Running {event.tool.get('tool_name')}...")
+                    status.write(f"🔧 {event.tool_label}")
+                else:
+                    status.write(f"✅ {event.tool.get('tool_name')} done")
 
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+            response = st.write_stream(AgentStream(agent, prompt).content(on_event=show_progress))
+            status.update(label="Done", state="complete")
 
-# display all previous messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+        st.session_state.messages.append(
+            {
+                "role": "assistant",
+                "content": response,
+            }
+        )
 
-if prompt := st.chat_input("What's up?"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
+    with st.sidebar.expander("Agent pool"):
+        stats = agent_pool.stats()
+        st.metric("Active agents", stats["active_agents"])
+        st.caption(
+            f"{stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+            f"{stats['busy_agents']} running now"
+        )
 
-    with st.chat_message("assistant"):
-        chunks = agent.run(prompt, stream=True)
-        response = st.write_stream(as_stream(chunks))
 
-    st.session_state.messages.append(
-        {
-            "role": "assistant",
-            "content": response,
-        }
-    )
+main()
+render_trace_panel("sports_research_agent")
@@ -0,0 +1,200 @@
+"""
+article_reader.py - a tool to read several articles at once (in parallel)
+
+Newspaper4kTools reads one URL per tool call, so an answer that needs 5 articles
+waits on 5 downloads & parses one after another. read_articles() downloads and
+parses all the URLs in parallel, each with its own timeout, and returns whatever
+has finished by the deadline - one slow news site can't stall the whole answer.
+
+Extracted articles are cached on disk (shared by all sessions), with the page's
+ETag/Last-Modified. A cached article is used as is for a while, after which it's
+revalidated with a conditional GET - if the page has not changed, the server
+sends no body & we skip the (CPU heavy) parse too.
+
+Articles we parse are also added to the knowledge base (see knowledge_base.py),
+so the agents can find them again without going to the web.
+
+@Author: Manish Bhobe
+My experiments with Python, AI/ML and Generative AI
+Code has been shared for learning purposes only! Use at own risk
+"""
+
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.message import Message
+from typing import Any, Dict, List, Optional, Tuple
+
+import newspaper
+from agno.tools import Toolkit
+from agno.utils.log import log_debug, logger
+
+# shared modules from the repo root (pip install -e . - see pyproject.toml)
+from disk_cache import DiskCache, make_key
+from knowledge_base import index_in_background
+from tracing import propagate, span
+
+# max time to download one article (seconds)
+URL_TIMEOUT = 8.0
+# max time for the whole tool call - articles not read by then are skipped
+DEADLINE = 12.0
+# max no of articles downloaded at the same time
+MAX_WORKERS = 8
+# don't download more than this from any one page
+MAX_BYTES = 5 * 1024 * 1024
+USER_AGENT = "Mozilla/5.0 (compatible; SportsResearchAgent/1.0)"
+# cached articles are used without asking the site for this long (seconds),
+# after which they are revalidated
+FRESH_FOR = 30 * 60
+
+# extracted articles by URL - shared by all sessions/processes
+article_cache = DiskCache(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "articles"),
+    max_bytes=128 * 1024 * 1024,
+)
+
+
+def download(
+    url: str, timeout: float = URL_TIMEOUT, headers: Optional[Dict[str, str]] = None
+) -> Tuple[Optional[str], Message]:
+    """download a page, giving up if the whole download takes longer than timeout.
+    Returns the page (None if the server says it's not modified) & the response headers"""
+    deadline = time.monotonic() + timeout
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, **(headers or {})})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, e.headers
+        raise
+    with response:
+        charset = response.headers.get_content_charset() or "utf-8"
+        body = bytearray()
+        while block := response.read(64 * 1024):
+            body.extend(block)
+            if len(body) > MAX_BYTES:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Download took longer than {timeout} seconds")
+    return body.decode(charset, errors="replace"), response.headers
+
+
+def parse_article(url: str, html: str) -> Dict[str, Any]:
+    """extract the title, authors, date & text of an article from its HTML"""
+    article = newspaper.Article(url)
+    article.download(input_html=html)
+    article.parse()
+
+    article_data: Dict[str, Any] = {"url": url}
+    if article.title:
+        article_data["title"] = article.title
+    if article.authors:
+        article_data["authors"] = article.authors
+    if article.publish_date:
+        article_data["publish_date"] = article.publish_date.isoformat()
+    if article.text:
+        article_data["text"] = article.text
+    return article_data
+
+
+class ParallelArticleTools(Toolkit):
+    def __init__(
+        self,
+        url_timeout: float = URL_TIMEOUT,
+        deadline: float = DEADLINE,
+        max_workers: int = MAX_WORKERS,
+        article_length: Optional[int] = None,
+        cache: Optional[DiskCache] = article_cache,
+        fresh_for: float = FRESH_FOR,
+        index_articles: bool = True,
+        **kwargs,
+    ):
+        super().__init__(name="parallel_article_tools", **kwargs)
+        self.url_timeout = url_timeout
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self.article_length = article_length
+        self.cache = cache
+        self.fresh_for = fresh_for
+        self.index_articles = index_articles
+        self.register(self.read_articles)
+
+    def parse(self, url: str, html: str) -> Dict[str, Any]:
+        article = parse_article(url, html)
+        if self.index_articles and "text" in article:
+            # what we read is added to the knowledge base the agents search
+            index_in_background(url, article["text"], {"title": article.get("title")})
+        return article
+
+    def fetch_article(self, url: str) -> Dict[str, Any]:
+        """the extracted article - from the cache if it's fresh or the page has not
+        changed (conditional GET), else downloaded & parsed"""
+        if self.cache is None:
+            return self.parse(url, download(url, self.url_timeout)[0])
+
+        key = make_key(stage="article", url=url)
+        entry = self.cache.get(key)
+        if entry is not None and time.time() - entry["fetched_at"] < self.fresh_for:
+            return entry["article"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        html, response_headers = download(url, self.url_timeout, headers)
+
+        if html is None and entry is not None:
+            # not modified - no body to download, nothing to parse
+            entry["fetched_at"] = time.time()
+        else:
+            entry = {
+                "article": self.parse(url, html),
+                "etag": response_headers.get("ETag"),
+                "last_modified": response_headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+        self.cache.set(key, entry)
+        return entry["article"]
+
+    def get_article_data(self, url: str) -> Dict[str, Any]:
+        with span("article.read", url=url) as trace:
+            article_data = dict(self.fetch_article(url))
+            if self.article_length and "text" in article_data:
+                article_data["text"] = article_data["text"][: self.article_length]
+            trace.set(text_chars=len(article_data.get("text") or ""))
+        return article_data
+
+    def read_articles(self, urls: List[str]) -> str:
+        """Use this function to read several articles at once. Pass in ALL the URLs you
+        want to read in a single call - they are downloaded in parallel.
+
+        Args:
+            urls (List[str]): The URLs of the articles.
+
+        Returns:
+            str: JSON list with the title, authors, publish date & text of each article
+                (or the error, for articles that could not be read in time).
+        """
+        log_debug(f"Reading {len(urls)} articles in parallel")
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        read = propagate(self.get_article_data)
+        futures = [pool.submit(read, url) for url in urls]
+        wait(futures, timeout=self.deadline)
+        # don't wait for the stragglers
+        pool.shutdown(wait=False, cancel_futures=True)
+
+        articles = []
+        for url, future in zip(urls, futures):
+            if not future.done() or future.cancelled():
+                articles.append({"url": url, "error": "Timed out"})
+            elif future.exception() is not None:
+                logger.warning(f"Error reading article from {url}: {future.exception()}")
+                articles.append({"url": url, "error": str(future.exception())})
+            else:
+                articles.append(future.result())
+        return json.dumps(articles, indent=2)
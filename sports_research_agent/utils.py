@@ -1,17 +0,0 @@
-"""utils.py - utility functions"""
-
-import streamlit as st
-
-
-def apply_styles():
-    st.markdown(
-        """
-  <style>
-  hr.divider {
-  background-color: white;
-  margin: 0;
-  }
-  </style>
-  <hr class='divider' />""",
-        unsafe_allow_html=True,
-    )
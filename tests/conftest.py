@@ -0,0 +1,7 @@
+"""conftest.py - make the modules in the repo root importable in the tests"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
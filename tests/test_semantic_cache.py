@@ -0,0 +1,65 @@
+"""test_semantic_cache.py - which rewordings hit the semantic cache (hashing embedder)"""
+
+import multiprocessing
+
+import pytest
+
+from embeddings import get_embedder
+from semantic_cache import SemanticCache
+
+# (cached prompt, lookup) - the same question, reworded
+SAME_QUESTION = [
+    ("best vada pav in Mumbai?", "Mumbai's best vada pav"),
+    ("How do I cook rice in a pressure cooker?", "how do i cook rice in pressure cooker"),
+    ("who won the IPL final", "Who won the IPL final?"),
+    ("best restaurants in South Mumbai", "best resturants in South Mumbai"),
+]
+# similar prompts that ask something else
+OTHER_QUESTION = [
+    ("how to cook rice in a pressure cooker", "how to cook dal in a pressure cooker"),
+    ("who won the IPL final", "who lost the IPL final"),
+    ("best South Mumbai restaurants", "best North Mumbai restaurants"),
+    ("who won the IPL in 2023", "who won the IPL in 2024"),
+    ("best time to visit Goa", "worst time to visit Goa"),
+]
+
+
+def cache(**kwargs):
+    return SemanticCache(embedder=get_embedder("hashing"), **kwargs)
+
+
+@pytest.mark.parametrize("cached, prompt", SAME_QUESTION)
+def test_rewording_hits(cached, prompt):
+    answers = cache()
+    answers.add(cached, "answer")
+    assert answers.lookup(prompt) == "answer"
+
+
+@pytest.mark.parametrize("cached, prompt", OTHER_QUESTION)
+def test_other_question_misses(cached, prompt):
+    answers = cache()
+    answers.add(cached, "answer")
+    assert answers.lookup(prompt) is None
+
+
+def test_other_scope_misses():
+    answers = cache(scope="gemini/gemini-2.0-flash")
+    answers.add("best vada pav in Mumbai?", "answer")
+    assert cache(scope="openai/gpt-4o").lookup("best vada pav in Mumbai?") is None
+
+
+def add_entries(path, worker, n):
+    answers = cache(path=path)
+    for i in range(n):
+        answers.add(f"question {worker} number {i} about cricket", f"answer {worker}/{i}")
+
+
+def test_processes_sharing_a_cache_keep_all_entries(tmp_path):
+    workers = [multiprocessing.Process(target=add_entries, args=(str(tmp_path), w, 20)) for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    answers = cache(path=str(tmp_path))
+    assert len(answers) == 80
+    assert answers.lookup("question 3 number 7 about cricket") == "answer 3/7"
@@ -0,0 +1,45 @@
+"""test_transcript_chunks.py - chunking & stitching of long transcripts"""
+
+from transcript_chunks import chunk_entries, chunk_overlaps, stitch_chunks
+
+
+def entries_of(texts):
+    return [{"text": text, "start": 2.0 * i, "duration": 2.0} for i, text in enumerate(texts)]
+
+
+def test_stitching_restores_the_transcript():
+    words = [f"word{i}" for i in range(3000)]
+    entries = entries_of(" ".join(words[i : i + 6]) for i in range(0, len(words), 6))
+    chunks = chunk_entries(entries, max_chars=400)
+    assert len(chunks) > 1
+    assert stitch_chunks(chunks, chunk_overlaps(entries, max_chars=400)).split() == words
+    # also without knowing the overlaps
+    assert stitch_chunks(chunks).split() == words
+
+
+def test_seam_survives_a_changed_word():
+    words = [f"word{i}" for i in range(600)]
+    entries = entries_of(" ".join(words[i : i + 6]) for i in range(0, len(words), 6))
+    chunks = chunk_entries(entries, max_chars=400)
+    # the LLM changed a word in the repeated text at the start of each chunk
+    changed = [chunks[0]] + [chunk.replace(chunk.split()[3], "changed", 1) for chunk in chunks[1:]]
+    assert stitch_chunks(changed, chunk_overlaps(entries, max_chars=400)).split() == words
+
+
+def test_repetitive_text_is_not_cut():
+    # a phrase that repeats all through the talk must not be taken for the seam
+    entries = entries_of(["and then we go to the store"] * 200)
+    chunks = chunk_entries(entries, max_chars=300)
+    stitched = stitch_chunks(chunks, chunk_overlaps(entries, max_chars=300))
+    assert len(stitched.split()) == 1400
+    # without the overlaps, at worst some of the repeat is kept - nothing is lost
+    assert len(stitch_chunks(chunks).split()) >= 1400
+
+
+def test_chunk_overlaps():
+    entries = entries_of(["one two", "three four five", "six"] * 50)
+    overlaps = chunk_overlaps(entries, max_chars=100, overlap=2)
+    assert overlaps[0] == 0
+    chunks = chunk_entries(entries, max_chars=100, overlap=2)
+    for previous, chunk, overlap in zip(chunks, chunks[1:], overlaps[1:]):
+        assert chunk.split()[:overlap] == previous.split()[-overlap:]
@@ -0,0 +1,31 @@
+"""test_transcript_index.py - finding what was said when in a transcript"""
+
+from transcript_index import SegmentIndex
+
+
+def index_of(texts):
+    return SegmentIndex.from_entries(
+        {"text": text, "start": 10.0 * i, "duration": 10.0} for i, text in enumerate(texts)
+    )
+
+
+def test_find_matches_whole_words_only():
+    index = index_of(["the cupboard is empty", "they won the World", "Cup final", "a cup of tea"])
+    assert [seconds for seconds, _ in index.find("cup")] == [20.0, 30.0]
+    # across segments, ignoring case
+    assert [seconds for seconds, _ in index.find("world cup")] == [10.0]
+    assert index.find("board") == []
+
+
+def test_find_phrases_that_end_in_punctuation():
+    index = index_of(["we write C++ and C", "then C# code"])
+    assert [seconds for seconds, _ in index.find("C++")] == [0.0]
+    assert [seconds for seconds, _ in index.find("c#")] == [10.0]
+
+
+def test_text_between_and_round_trip():
+    index = index_of(["one", "two", "three", "four"])
+    assert index.text_between(10.0, 30.0) == "two three"
+    restored = SegmentIndex.from_dict(index.to_dict())
+    assert restored.text_between(10.0, 30.0) == "two three"
+    assert restored.find("four") == [(30.0, "one two three four")]
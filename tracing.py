@@ -0,0 +1,397 @@
+"""
+tracing.py - timed spans for model calls, tool calls, storage & rendering
+
+A trace is a tree of spans - e.g. one Streamlit rerun, with a span for each
+phase, model call & tool call in it. Spans carry attributes: model calls record
+the time to first token (ttft_ms), tokens/second & prompt/response sizes, tool
+& storage calls their payload sizes.
+
+    with span("render.history", messages=len(messages)):
+        ...                                     # timed, nested under the current span
+
+    s = start_span("llm.stream", model=model)   # started now, ended when the stream ends
+    tokens = trace_stream(llm.stream(prompt, model), s)
+
+Finished traces are appended to a local file (TRACE_FILE, .traces/traces.jsonl by
+default) as OpenTelemetry (OTLP/JSON) export requests - one per line - so any
+OTLP tool can read them, and the latest ones are kept in memory for the debug
+panel (render_trace_panel - shown when the app's URL has ?debug=1, or with
+TRACE_PANEL=1). Set TRACING=0 to turn tracing off. The file is rotated when it
+reaches TRACE_MAX_BYTES (traces.jsonl.1, .2, ... - the oldest of TRACE_BACKUPS
+is dropped), so it never grows without bounds.
+
+The current span is kept in a contextvar, so spans nest across function calls &
+asyncio tasks. Thread pools don't pass it on - submit propagate(fn) instead of fn.
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+TRACING = os.getenv("TRACING", "1").lower() not in ("0", "false", "no")
+TRACE_FILE = os.getenv(
+    "TRACE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".traces", "traces.jsonl"),
+)
+# the trace file is rotated at this size, keeping this many old files
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "genai-apps")
+# no of finished traces kept in memory (for the debug panel)
+MAX_TRACES = 50
+# spans are written to the file when a trace ends, or when this many are waiting
+MAX_BUFFERED_SPANS = 512
+# roughly - used to estimate tokens/second from the response size
+CHARS_PER_TOKEN = 4
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end_time", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time_ns()
+        self.end_time: Optional[int] = None
+        self.attributes: Dict[str, Any] = attributes
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_time if self.end_time is not None else time.time_ns()
+        return (end - self.start) / 1e6
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_time is not None:
+            return
+        self.end_time = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _exporter.export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # internal
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        if self.error:
+            otlp["status"] = {"code": 2, "message": self.error}
+        return otlp
+
+
+class _NoopSpan:
+    """what you get when tracing is off"""
+
+    name = ""
+    attributes: Dict[str, Any] = {}
+    duration_ms = 0.0
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class _Exporter:
+    def __init__(self, path: str, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._buffer: List[Span] = []
+        # trace id -> its finished spans, oldest trace first
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # (rotating & appending to the file)
+        self._file_lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            self._traces.setdefault(span.trace_id, []).append(span)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > MAX_TRACES:
+                self._traces.popitem(last=False)
+            if span.parent_id is not None and len(self._buffer) < MAX_BUFFERED_SPANS:
+                return
+            spans, self._buffer = self._buffer, []
+        self._write(spans)
+
+    def flush(self) -> None:
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        self._write(spans)
+
+    def _write(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                    "scopeSpans": [
+                        {"scope": {"name": "tracing"}, "spans": [span.to_otlp() for span in spans]}
+                    ],
+                }
+            ]
+        }
+        line = json.dumps(request) + "\n"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._file_lock:
+                self._rotate(len(line.encode("utf-8")))
+                # one write per batch, so lines from several processes don't interleave
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError:
+            # tracing must never break the app
+            pass
+
+    def _rotate(self, incoming: int) -> None:
+        """move the file to .1 (.1 to .2 etc.) if `incoming` more bytes would take
+        it over max_bytes"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def traces(self) -> List[List[Span]]:
+        with self._lock:
+            return [list(spans) for spans in self._traces.values()]
+
+
+_exporter = _Exporter(TRACE_FILE)
+atexit.register(_exporter.flush)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attributes):
+    """start a span (under `parent`, default: the current span) - it is not made
+    the current span & must be end()ed. For spans that outlive the block they're
+    started in, e.g. streams"""
+    if not TRACING:
+        return _NOOP
+    return Span(name, parent or _current.get(), **attributes)
+
+
+@contextmanager
+def use_span(s) -> Iterator[Any]:
+    """make the span `s` the current span inside the block (doesn't end it)"""
+    if not isinstance(s, Span):
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Any]:
+    """time the block as a span (child of the current span) - errors are recorded
+    on the span & re-raised"""
+    if not TRACING:
+        yield _NOOP
+        return
+    s = Span(name, _current.get(), **attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except Exception as e:
+        _current.reset(token)
+        s.end(error=e)
+        raise
+    except BaseException:
+        # e.g. Streamlit's st.rerun()/st.stop() - not an error
+        _current.reset(token)
+        s.end()
+        raise
+    _current.reset(token)
+    s.end()
+
+
+def traced(name: Optional[str] = None, **attributes):
+    """decorator - time every call of the function as a span"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__qualname__, **attributes):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def propagate(fn: Callable) -> Callable:
+    """fn, run in the caller's context - so spans it starts in a pool's thread
+    nest under the caller's current span"""
+    if not TRACING:
+        return fn
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # a context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+
+    return wrapper
+
+
+def record_output(s, text_chars: int, ttft_ns: Optional[int] = None, started_ns: Optional[int] = None) -> None:
+    """set a model call's output attributes - response size, estimated tokens &
+    tokens/second (over the time after the first token, if it streamed). The time
+    to first token counts from `started_ns` (when the stream was first read), if
+    given, else from the span's start"""
+    if not isinstance(s, Span):
+        return
+    tokens = round(text_chars / CHARS_PER_TOKEN)
+    end = time.time_ns()
+    generating = (end - (ttft_ns if ttft_ns is not None else s.start)) / 1e9
+    s.set(response_chars=text_chars, tokens=tokens)
+    if ttft_ns is not None:
+        s.set(ttft_ms=round((ttft_ns - (started_ns if started_ns is not None else s.start)) / 1e6, 2))
+    if generating > 0:
+        s.set(tokens_per_s=round(tokens / generating, 1))
+
+
+def trace_stream(tokens: Iterable[str], s) -> Iterator[str]:
+    """pass a model's token stream through - the span `s` (see start_span) ends
+    with the stream & records the time to first token, no of chunks & tokens/second.
+    The time to first token counts from when the stream is first read - a stream
+    may wait (e.g. in a thread pool's queue) after it's created; that's queued_ms"""
+    # (runs on the first read)
+    started = time.time_ns()
+    if isinstance(s, Span):
+        s.set(queued_ms=round((started - s.start) / 1e6, 2))
+    first, chunks, chars, error = None, 0, 0, None
+    try:
+        for token in tokens:
+            if first is None:
+                first = time.time_ns()
+            chunks += 1
+            chars += len(token)
+            yield token
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # (also if the reader stopped early)
+        s.set(chunks=chunks)
+        record_output(s, chars, first, started)
+        s.end(error=error)
+
+
+def recent_traces(limit: int = 10, root: Optional[str] = None) -> List[List[Span]]:
+    """the latest finished traces (newest first), each a list of spans - only
+    those whose root span's name starts with `root`, if given"""
+    traces = []
+    for spans in reversed(_exporter.traces()):
+        roots = [s for s in spans if s.parent_id is None]
+        if not roots or (root is not None and not roots[0].name.startswith(root)):
+            continue
+        traces.append(spans)
+        if len(traces) == limit:
+            break
+    return traces
+
+
+def format_trace(spans: List[Span]) -> str:
+    """a trace as an indented text tree, with start offsets & durations"""
+    children: Dict[Optional[str], List[Span]] = {}
+    for s in sorted(spans, key=lambda s: s.start):
+        children.setdefault(s.parent_id, []).append(s)
+    ids = {s.span_id for s in spans}
+    # spans whose parent is missing (e.g. dropped) are shown at the top level
+    top = [s for s in spans if s.parent_id is None or s.parent_id not in ids]
+    t0 = min(s.start for s in spans)
+    lines: List[str] = []
+
+    def add(s: Span, depth: int):
+        attributes = " ".join(f"{key}={value}" for key, value in s.attributes.items())
+        error = f" ERROR {s.error}" if s.error else ""
+        lines.append(
+            f"{(s.start - t0) / 1e6:8.1f}ms {s.duration_ms:9.1f}ms  "
+            f"{'  ' * depth}{s.name} {attributes}{error}".rstrip()
+        )
+        for child in children.get(s.span_id, []):
+            add(child, depth + 1)
+
+    for s in sorted(top, key=lambda s: s.start):
+        add(s, 0)
+    return "\n".join(lines)
+
+
+def render_trace_panel(root: Optional[str] = None, limit: int = 5) -> None:
+    """Streamlit debug panel (in the sidebar) with the latest traces - only shown
+    when the app's URL has ?debug=1 or TRACE_PANEL=1 is set. Call it at the end
+    of the script, so it includes the rerun that just ended"""
+    import streamlit as st
+
+    if st.query_params.get("debug") != "1" and os.getenv("TRACE_PANEL") != "1":
+        return
+    with st.sidebar.expander("Traces", expanded=True):
+        if not TRACING:
+            st.caption("Tracing is off (TRACING=0)")
+            return
+        traces = recent_traces(limit, root)
+        if not traces:
+            st.caption("No traces yet")
+        for spans in traces:
+            top = min(spans, key=lambda s: s.start)
+            st.caption(f"{top.name} · {top.duration_ms:,.0f}ms · {len(spans)} spans")
+            st.code(format_trace(spans), language=None)
+        st.caption(f"All traces: {TRACE_FILE}")
+
+
+def flush() -> None:
+    """write the finished spans that are still buffered to the trace file"""
+    _exporter.flush()
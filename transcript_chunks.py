@@ -0,0 +1,229 @@
+"""
+transcript_chunks.py - split long raw transcripts into overlapping chunks
+    (so they can be punctuated in parallel) & stitch the results back together
+
+A YouTube transcript is a list of entries like {"text": ..., "start": ..., "duration": ...}.
+We never split inside an entry - chunks always start & end on an entry (timestamp)
+boundary, and the last few entries of one chunk are repeated at the start of the
+next one, so the LLM has some context at the seam. The repeated text is removed again
+when the punctuated chunks are stitched back - only where the end of one chunk
+lines up with the start of the next, and (if chunk_overlaps() tells how long the
+repeat is) as much of it as was repeated, so a phrase that recurs in the talk
+itself is never mistaken for the seam. Stitching also works on chunks
+that are still streaming in, so the text can be shown as it's generated.
+"""
+
+import re
+import threading
+from difflib import SequenceMatcher
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# default size of each chunk (in characters of raw text) - well below what the
+# model can punctuate within its output token limit
+CHUNK_CHARS = 6000
+# no of transcript entries repeated at the start of the next chunk
+CHUNK_OVERLAP = 3
+# how many words at either side of a seam we look at to find the repeated text
+SEAM_WINDOW = 80
+# minimum no of matching words before we treat text at the seam as a repeat
+MIN_SEAM_MATCH = 4
+# the LLM may drop or add a word at the seam - how far the repeat may be off
+SEAM_SLACK = 2
+# min similarity (0-1) of the end of one chunk & the start of the next for a repeat
+MIN_SEAM_SIMILARITY = 0.8
+
+_WORD = re.compile(r"\S+")
+_NON_ALNUM = re.compile(r"[^0-9a-z']+")
+_SENTENCE_END = ".!?:\"')*"
+
+
+def _chunk_bounds(texts: List[str], max_chars: int, overlap: int) -> List[Tuple[int, int]]:
+    """(start, end) entry indices of each chunk"""
+    bounds, start = [], 0
+    while start < len(texts):
+        end, size = start, 0
+        # always take at least one entry, even if it's longer than max_chars
+        while end < len(texts) and (end == start or size + len(texts[end]) <= max_chars):
+            size += len(texts[end]) + 1
+            end += 1
+        bounds.append((start, end))
+        if end >= len(texts):
+            break
+        # step back a few entries for the overlap, but always make progress
+        start = max(end - overlap, start + 1)
+    return bounds
+
+
+def _entry_texts(entries: List[Dict]) -> List[str]:
+    return [entry["text"].strip() for entry in entries if entry["text"].strip()]
+
+
+def chunk_entries(
+    entries: List[Dict], max_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP
+) -> List[str]:
+    """split transcript entries into chunks of raw text, on entry boundaries,
+    with `overlap` entries repeated across consecutive chunks"""
+    texts = _entry_texts(entries)
+    return [" ".join(texts[start:end]) for start, end in _chunk_bounds(texts, max_chars, overlap)]
+
+
+def chunk_overlaps(
+    entries: List[Dict], max_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP
+) -> List[int]:
+    """no of words each chunk of chunk_entries() repeats from the one before (0
+    for the first) - tells stream_stitched() how much to trim at each seam"""
+    texts = _entry_texts(entries)
+    overlaps, previous_end = [], 0
+    for start, end in _chunk_bounds(texts, max_chars, overlap):
+        overlaps.append(sum(len(_WORD.findall(text)) for text in texts[start:previous_end]))
+        previous_end = end
+    return overlaps
+
+
+def _normalize(word: str) -> str:
+    return _NON_ALNUM.sub("", word.lower())
+
+
+def _seam_length(prev_words: List[str], cur_words: List[str], expected: Optional[int] = None) -> int:
+    """no of words at the start of `cur_words` that repeat the end of `prev_words`
+    (0 if none) - the repeat must end at the end of prev_words & start at the start
+    of cur_words (give or take SEAM_SLACK words the LLM changed). In repetitive text
+    several lengths fit - then the one closest to `expected` (never much longer or
+    shorter), else the shortest - better to keep a repeat than to cut real text"""
+    if not prev_words:
+        return 0
+    candidates = []
+    for length in range(MIN_SEAM_MATCH, len(cur_words) + 1):
+        # (cheap check first - the repeat ends with the last word of prev_words)
+        if cur_words[length - 1] != prev_words[-1]:
+            continue
+        for prev_length in range(max(1, length - SEAM_SLACK), min(len(prev_words), length + SEAM_SLACK) + 1):
+            matcher = SequenceMatcher(None, prev_words[-prev_length:], cur_words[:length], autojunk=False)
+            if matcher.ratio() >= MIN_SEAM_SIMILARITY:
+                candidates.append(length)
+                break
+    if not candidates:
+        return 0
+    if expected:
+        candidates = [length for length in candidates if abs(length - expected) <= max(SEAM_SLACK, expected // 5)]
+        return min(candidates, key=lambda length: (abs(length - expected), -length), default=0)
+    return min(candidates)
+
+
+def _trim_seam(previous: str, current: str, expected: Optional[int] = None) -> str:
+    """drop the text at the start of `current` that repeats the end of `previous`
+    (`expected` - about how many words were repeated, if known)"""
+    # only look at the tail of the text stitched so far (a word is rarely > 20 chars)
+    prev_words = [_normalize(w) for w in _WORD.findall(previous[-SEAM_WINDOW * 20 :])]
+    prev_words = prev_words[-SEAM_WINDOW:]
+    cur_matches = list(_WORD.finditer(current))[:SEAM_WINDOW]
+    cur_words = [_normalize(m.group()) for m in cur_matches]
+
+    length = _seam_length(prev_words, cur_words, expected)
+    if not length:
+        # nothing (reliably) repeated - keep the chunk as is
+        return current
+
+    # cut just after the last repeated word in the current chunk
+    cut = cur_matches[length - 1].end()
+    return current[cut:].lstrip(" \t.,;")
+
+
+def stream_stitched(
+    chunks: Iterable[Iterable[str]],
+    on_chunk: Optional[Callable[[str], None]] = None,
+    overlaps: Optional[List[int]] = None,
+) -> Iterator[str]:
+    """stitch chunks that are still being generated (each chunk is an iterable of
+    tokens), yielding text as soon as it is final. Only the first few words of each
+    chunk are held back, till we can see where the text repeated at the seam ends.
+    `on_chunk` is called with the (trimmed) text of each chunk once it is complete.
+    `overlaps` - the no of words each chunk repeats (see chunk_overlaps()), if known"""
+    tail = ""  # end of the text stitched so far, to find the seams
+    for i, tokens in enumerate(chunks):
+        tokens = iter(tokens)
+        head = ""
+        if tail:
+            for token in tokens:
+                head += token
+                if len(_WORD.findall(head)) >= SEAM_WINDOW:
+                    break
+            head = _trim_seam(tail, head.lstrip(), overlaps[i] if overlaps else None)
+
+        chunk_text, separator = [], ""
+        pending = ""  # whitespace held back, in case it's the end of the chunk
+        for piece in chain([head], tokens):
+            if not chunk_text:
+                piece = piece.lstrip()
+                if not piece:
+                    continue
+                if tail:
+                    # start a new paragraph, unless the seam falls mid-sentence
+                    separator = "\n\n" if tail[-1] in _SENTENCE_END else " "
+                    yield separator
+            text = pending + piece
+            stripped = text.rstrip()
+            pending = text[len(stripped) :]
+            if stripped:
+                chunk_text.append(stripped)
+                yield stripped
+
+        if chunk_text:
+            chunk_text = "".join(chunk_text)
+            tail = (tail + separator + chunk_text)[-SEAM_WINDOW * 20 :]
+            if on_chunk is not None:
+                on_chunk(chunk_text)
+
+
+def stitch_chunks(chunks: List[str], overlaps: Optional[List[int]] = None) -> str:
+    """join punctuated chunks back in order, removing the repeated text at each seam"""
+    return "".join(stream_stitched(([chunk] for chunk in chunks), overlaps=overlaps))
+
+
+class TokenBuffer:
+    """tokens of one chunk - written by the worker thread that generates them &
+    read back (in order, as they arrive) by the thread that stitches the chunks"""
+
+    def __init__(self):
+        self._tokens = []
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def write(self, token: str) -> None:
+        with self._cond:
+            self._tokens.append(token)
+            self._cond.notify_all()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def fill(self, tokens: Iterable[str]) -> None:
+        """write all tokens, then close the buffer (run this in a worker thread)"""
+        try:
+            for token in tokens:
+                self.write(token)
+        except Exception as e:
+            # hand the error over to the reader
+            self.close(e)
+        else:
+            self.close()
+
+    def __iter__(self) -> Iterator[str]:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self._tokens) and not self._done:
+                    self._cond.wait()
+                if i < len(self._tokens):
+                    token = self._tokens[i]
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            i += 1
+            yield token
@@ -0,0 +1,139 @@
+"""
+transcript_index.py - find what was said when in a transcript (& when something was said)
+
+A YouTube transcript is a list of entries like {"text": ..., "start": ..., "duration": ...}.
+SegmentIndex keeps them compact - all the text in one string & each segment's
+start, duration & offset into that string in arrays - so it's small to keep (it's
+cached next to the punctuated transcript) & quick to query with a binary search:
+    - text_between(600, 1200) - what was said in minutes 10-20, e.g. to summarize
+      just that part of the video, instead of processing all of it again
+    - find("world cup") - when it was said (seconds from the start)
+"""
+
+import base64
+import re
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Tuple
+
+# characters of context shown around a match (either side)
+SNIPPET_CHARS = 60
+
+
+def _pack(values: array) -> str:
+    # stored little-endian, whatever the machine
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _unpack(typecode: str, data: str) -> array:
+    values = array(typecode)
+    values.frombytes(base64.b64decode(data))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class SegmentIndex:
+    __slots__ = ("text", "starts", "durations", "offsets")
+
+    def __init__(self, text: str, starts: array, durations: array, offsets: array):
+        """segment i is text[offsets[i]:offsets[i + 1]] (with a space at the end),
+        spoken from starts[i] for durations[i] seconds"""
+        self.text = text
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "SegmentIndex":
+        """from YouTubeTranscriptApi.get_transcript() entries (in time order)"""
+        parts: List[str] = []
+        starts, durations, offsets = array("d"), array("d"), array("q")
+        size = 0
+        for entry in entries:
+            text = " ".join(entry["text"].split())
+            if not text:
+                continue
+            starts.append(float(entry["start"]))
+            durations.append(float(entry.get("duration", 0.0)))
+            offsets.append(size)
+            parts.append(text)
+            size += len(text) + 1
+        return cls(" ".join(parts), starts, durations, offsets)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def duration(self) -> float:
+        """seconds till the end of the last segment"""
+        return self.starts[-1] + self.durations[-1] if self.starts else 0.0
+
+    def segment_text(self, i: int) -> str:
+        end = self.offsets[i + 1] - 1 if i + 1 < len(self.offsets) else len(self.text)
+        return self.text[self.offsets[i] : end]
+
+    def segment_at(self, seconds: float) -> int:
+        """the segment being spoken at `seconds` (the last one starting by then)"""
+        return max(bisect_right(self.starts, seconds) - 1, 0)
+
+    def segment_of(self, offset: int) -> int:
+        """the segment the character at `offset` (into text) is in"""
+        return max(bisect_right(self.offsets, offset) - 1, 0)
+
+    def text_between(self, start: float, end: float) -> str:
+        """what was said from `start` till `end` (seconds) - whole segments"""
+        if not self.starts or end <= start:
+            return ""
+        first = self.segment_at(start)
+        if self.starts[first] + self.durations[first] <= start:
+            # it ended before `start` (a pause)
+            first += 1
+        # segments starting before `end`
+        last = bisect_left(self.starts, end)
+        if last <= first:
+            return ""
+        end_offset = self.offsets[last] - 1 if last < len(self.offsets) else len(self.text)
+        return self.text[self.offsets[first] : end_offset]
+
+    def find(self, phrase: str, limit: int = 10) -> List[Tuple[float, str]]:
+        """when was `phrase` said? (start of the segment it's in, seconds) - with
+        the text around it, for each time (ignoring case & extra whitespace). Only
+        whole words match - "cup" is not found in "cupboard"."""
+        words = phrase.split()
+        if not words:
+            return []
+        # (?<!\w) & (?!\w) rather than \b, so phrases like "C++" work too
+        pattern = re.compile(
+            r"(?<!\w)" + r"\s+".join(re.escape(word) for word in words) + r"(?!\w)", re.IGNORECASE
+        )
+        matches = []
+        for match in pattern.finditer(self.text):
+            start = max(match.start() - SNIPPET_CHARS, 0)
+            snippet = self.text[start : match.end() + SNIPPET_CHARS]
+            matches.append((self.starts[self.segment_of(match.start())], snippet))
+            if len(matches) == limit:
+                break
+        return matches
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON serializable (see from_dict) - the arrays as base64"""
+        return {
+            "text": self.text,
+            "starts": _pack(self.starts),
+            "durations": _pack(self.durations),
+            "offsets": _pack(self.offsets),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SegmentIndex":
+        return cls(
+            data["text"],
+            _unpack("d", data["starts"]),
+            _unpack("d", data["durations"]),
+            _unpack("q", data["offsets"]),
+        )
@@ -0,0 +1,129 @@
+"""
+tree_summarizer.py - hierarchical (tree) summarization of long texts
+
+Instead of putting a whole (long) text into one prompt, the text is split into
+fixed-size sections, which are summarized in parallel (the leaves of the tree).
+Then groups of `fan_out` summaries are merged into one summary, level by level,
+till only one summary (the root) is left.
+
+Every node is cached on its content - a leaf on the hash of its section & a merged
+node on the hashes of its children. Sections are cut at fixed offsets, so if text
+is appended (e.g. a transcript that's still growing) only the last section changes,
+and only the nodes on its path to the root are summarized again.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from disk_cache import hash_text, make_key
+from tracing import propagate, span
+
+# default size of each section (in characters)
+CHUNK_SIZE = 8000
+# default no of summaries that are merged into one at each level of the tree
+FAN_OUT = 4
+# max no of summaries generated at the same time
+MAX_WORKERS = 4
+
+
+class _MemoryCache:
+    """in-memory stand-in for DiskCache (same get/set interface)"""
+
+    def __init__(self):
+        self._entries: Dict[str, Any] = {}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._entries.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = value
+
+
+class TreeSummarizer:
+    def __init__(
+        self,
+        summarize: Callable[[str], str],
+        merge: Callable[[List[str]], str],
+        chunk_size: int = CHUNK_SIZE,
+        fan_out: int = FAN_OUT,
+        max_workers: int = MAX_WORKERS,
+        cache=None,
+        namespace: str = "",
+    ):
+        """
+        summarize - summarizes one section of text (one LLM call)
+        merge - merges a list of summaries into one summary (one LLM call)
+        cache - anything with DiskCache's get/set methods (default: in memory)
+        namespace - mixed into all cache keys, should change whenever the model
+            or prompts behind summarize/merge change
+        """
+        if fan_out < 2:
+            raise ValueError("fan_out must be at least 2")
+        self.summarize_fn = summarize
+        self.merge_fn = merge
+        self.chunk_size = chunk_size
+        self.fan_out = fan_out
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else _MemoryCache()
+        self.namespace = namespace
+
+    def split(self, text: str) -> List[str]:
+        """split text into sections of (at most) chunk_size characters, breaking
+        at the last whitespace in each section where possible"""
+        sections, start = [], 0
+        while start < len(text):
+            end = start + self.chunk_size
+            if end < len(text):
+                # don't cut a word in half
+                space = text.rfind(" ", start + self.chunk_size // 2, end)
+                if space != -1:
+                    end = space + 1
+            sections.append(text[start:end])
+            start = end
+        return sections
+
+    def summarize_leaf(self, section: str) -> str:
+        """summary of one section (cached)"""
+        key = make_key(namespace=self.namespace, node="leaf", text=hash_text(section))
+        summary = self.cache.get(key)
+        if summary is None:
+            summary = self.summarize_fn(section)
+            self.cache.set(key, summary)
+        return summary
+
+    def merge_nodes(self, summaries: List[str]) -> str:
+        """summary of a group of summaries (cached)"""
+        if len(summaries) == 1:
+            return summaries[0]
+        key = make_key(
+            namespace=self.namespace,
+            node="merge",
+            children=[hash_text(summary) for summary in summaries],
+        )
+        summary = self.cache.get(key)
+        if summary is None:
+            summary = self.merge_fn(summaries)
+            self.cache.set(key, summary)
+        return summary
+
+    def summarize_sections(self, sections: List[str]) -> str:
+        """summarize a text that's already split into sections"""
+        if not sections:
+            return ""
+        with span("summary.tree", sections=len(sections)) as trace, ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as pool:
+            level = list(pool.map(propagate(self.summarize_leaf), sections))
+            levels = 1
+            while len(level) > 1:
+                groups = [
+                    level[i : i + self.fan_out]
+                    for i in range(0, len(level), self.fan_out)
+                ]
+                level = list(pool.map(propagate(self.merge_nodes), groups))
+                levels += 1
+            trace.set(levels=levels)
+        return level[0]
+
+    def summarize(self, text: str) -> str:
+        return self.summarize_sections(self.split(text))
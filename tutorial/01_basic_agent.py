@@ -16,26 +16,38 @@ Code has been shared for learning purposes only! Use at own risk
 """
 
 import os
+from pathlib import Path
 from textwrap import dedent
 from dotenv import load_dotenv, find_dotenv
 from rich import print
 from rich.console import Console
 from rich.markdown import Markdown
 
-from agno.agent import Agent, RunResponse
-from agno.models.google import Gemini
-import google.generativeai as genai
+from agno.agent import Agent
+
+# shared modules from the repo root (pip install -e . - see pyproject.toml)
+from llm_backend import get_backend
+from semantic_cache import SemanticCache
 
 # load all API keys from .env file
 load_dotenv(find_dotenv())
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Gemini, unless another backend is picked with LLM_BACKEND (e.g. "fake" to run offline)
+llm = get_backend(default="gemini")
 
 console = Console()
 
+# repeated (or reworded) questions are answered from a cache, kept on disk so it's
+# shared across runs (& with 01_basic_agent_streamlit.py, same agent) - answers
+# only match if they came from the same backend & model
+answers = SemanticCache(
+    path=Path(__file__).resolve().parent / ".cache" / "basic_agent_answers",
+    scope=f"{llm.name}/{llm.model_id('agent')}",
+)
+
 my_agent = Agent(
     name="Basic Q&A Agent",
     # here you specify the model - we are using Google Gemini 2.0 Flash
-    model=Gemini(id="gemini-2.0-flash-exp"),
+    model=llm.agno_model(),
     # the system message for this agent
     description=dedent(
         ## make it work like a local from Mumbai
@@ -76,6 +88,12 @@ while True:
         break
     # my_agent.print_response(user_prompt)
     console.print("[yellow]Thinking...[/yellow]", end="")
-    response: RunResponse = my_agent.run(user_prompt)
+    answer = answers.get_or_compute(user_prompt, lambda prompt: my_agent.run(prompt).content)
     console.print("\r", end="")
-    console.print(Markdown(response.content))
+    console.print(Markdown(answer))
+
+stats = answers.stats()
+console.print(
+    f"[green]Answer cache: {stats['hits']}/{stats['lookups']} hits ({stats['hit_rate']:.0%}), "
+    f"saved {stats['time_saved']:.1f}s of LLM time[/green]"
+)
@@ -18,44 +18,70 @@ Code has been shared for learning purposes only! Use at own risk
 
 import streamlit as st
 import os
+from pathlib import Path
 from textwrap import dedent
 from dotenv import load_dotenv, find_dotenv
-from agno.agent import Agent, RunResponse
-from agno.models.google import Gemini
-import google.generativeai as genai
+from agno.agent import Agent
 
-# Load environment variables and configure Gemini
+# shared modules from the repo root (pip install -e . - see pyproject.toml)
+from llm_backend import get_backend
+from semantic_cache import SemanticCache
+
+# Load environment variables and pick the LLM backend
 load_dotenv(find_dotenv())
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-# Initialize Agent
-my_agent = Agent(
-    name="Basic Q&A Agent",
-    model=Gemini(id="gemini-2.0-flash-exp"),
-    description=dedent(
-        """
-        - Think of yourself as an enthusiastic assistant, ready to help you with any questions you have.
-        - You have deep knowledge about the world, and about Mumbai in particular.
-        """
-    ),
-    instructions=dedent(
-        """
-        - You are a local from Mumbai, India, who is proficient in English as well as local slang.
-        - Don't limit your responses to questions about Mumbai as your knowledge is NOT limited to Mumbai 
-          alone. Answer any question from the user.
-        - Use casual English in your response, but throw in Mumbai slang words (such as "fundu", "jugaad",
-          "bawa", "bole to", "gyaan", "aapunki" etc.) - it will make you more relatable. Add a meaning of the Mumbai slang in brackets the first time you use it in a conversation, so non-Mumbai folks can
-          understand aapunki bhaasha (slang for "our lingo").
-        - Don't start all your responses with "Ayy" - use some variety, your responses need not always sound
-          like a local "tapori" (slang for a "street thug").
-        - Use any tools provided to you only if you cannot answer the question directly. Don't use tools for 
-          every question.
-        - If you cannot answer a question, say so, and don't try to fake it. Apologize in classic Mumbai 
-          style.
-        """
-    ),
-    debug_mode=False,  # Set to False in production
-)
+# Gemini, unless another backend is picked with LLM_BACKEND (e.g. "fake" to run offline)
+llm = get_backend(default="gemini")
+
+
+def build_agent() -> Agent:
+    return Agent(
+        name="Basic Q&A Agent",
+        model=llm.agno_model(),
+        description=dedent(
+            """
+            - Think of yourself as an enthusiastic assistant, ready to help you with any questions you have.
+            - You have deep knowledge about the world, and about Mumbai in particular.
+            """
+        ),
+        instructions=dedent(
+            """
+            - You are a local from Mumbai, India, who is proficient in English as well as local slang.
+            - Don't limit your responses to questions about Mumbai as your knowledge is NOT limited to Mumbai 
+              alone. Answer any question from the user.
+            - Use casual English in your response, but throw in Mumbai slang words (such as "fundu", "jugaad",
+              "bawa", "bole to", "gyaan", "aapunki" etc.) - it will make you more relatable. Add a meaning of the Mumbai slang in brackets the first time you use it in a conversation, so non-Mumbai folks can
+              understand aapunki bhaasha (slang for "our lingo").
+            - Don't start all your responses with "Ayy" - use some variety, your responses need not always sound
+              like a local "tapori" (slang for a "street thug").
+            - Use any tools provided to you only if you cannot answer the question directly. Don't use tools for 
+              every question.
+            - If you cannot answer a question, say so, and don't try to fake it. Apologize in classic Mumbai 
+              style.
+            """
+        ),
+        debug_mode=False,  # Set to False in production
+    )
+
+
+# Initialize Agent - once per session, not on every rerun (Streamlit re-runs this
+# whole script on each interaction). All the sessions' models share one API client.
+if "agent" not in st.session_state:
+    st.session_state.agent = build_agent()
+my_agent = st.session_state.agent
+
+
+@st.cache_resource
+def get_answer_cache() -> SemanticCache:
+    # one cache for all sessions - questions other users already asked (even
+    # reworded) are answered without calling the LLM. Kept on disk & shared with
+    # 01_basic_agent.py (same agent), for answers of the same backend & model
+    return SemanticCache(
+        path=Path(__file__).resolve().parent / ".cache" / "basic_agent_answers",
+        scope=f"{llm.name}/{llm.model_id('agent')}",
+    )
+
+
+answers = get_answer_cache()
 
 # Streamlit UI
 st.title("Mumbai Local: Ask Anything!")
@@ -70,26 +96,44 @@ with question:
     user_input = st.text_area("Your Question", height=100)
     if st.button("Submit"):
         if user_input:
-            # Get agent response
-            response: RunResponse = my_agent.run(user_input)
-            # agent_response = response.output
+            # Get agent response (from the cache, if it was asked before)
+            answer = answers.get_or_compute(user_input, lambda prompt: my_agent.run(prompt).content)
 
             # Update chat history
             st.session_state.chat_history.append(
-                {"user": user_input, "agent": response.content}
+                {"user": user_input, "agent": answer}
             )
 
 # Display chat history in a scrollable area
 st.markdown("---")
 st.subheader("Conversation")
-chat_area = st.empty()  # Create an empty container to update the chat
+
+# only the most recent conversations are shown on each rerun (long histories
+# otherwise slow down every interaction) - use "Show earlier" to see more
+HISTORY_WINDOW = 10
+
+
+def format_chat(user: str, agent: str) -> str:
+    return f"**You:** {user}\n\n{agent}\n\n---\n\n"
+
 
 if st.session_state.chat_history:
-    chat_content = ""
-    for chat in reversed(st.session_state.chat_history):
-        # show most recent response first
-        chat_content += f"**You:** {chat['user']}\n\n"
-        chat_content += f"{chat['agent']}\n\n---\n\n"
-    chat_area.markdown(chat_content)
+    shown = st.session_state.get("chat_history_shown", HISTORY_WINDOW)
+    # show most recent response first
+    recent = st.session_state.chat_history[-shown:]
+    for chat in reversed(recent):
+        st.markdown(format_chat(chat["user"], chat["agent"]))
+
+    earlier = len(st.session_state.chat_history) - len(recent)
+    if earlier > 0:
+        if st.button(f"⬇️ Show earlier conversations ({earlier} more)"):
+            st.session_state.chat_history_shown = shown + HISTORY_WINDOW
+            st.rerun()
 else:
-    chat_area.markdown("No conversation yet.")
+    st.markdown("No conversation yet.")
+
+stats = answers.stats()
+st.sidebar.caption(
+    f"Answer cache: {stats['hits']}/{stats['lookups']} hits ({stats['hit_rate']:.0%}), "
+    f"{stats['time_saved']:.1f}s of LLM time saved"
+)
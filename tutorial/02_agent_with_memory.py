@@ -20,26 +20,39 @@ Code has been shared for learning purposes only! Use at own risk
 """
 
 import os
+import time
+import uuid
 from textwrap import dedent
 from dotenv import load_dotenv, find_dotenv
 from rich import print
 from rich.console import Console
 from rich.markdown import Markdown
 
-from agno.agent import Agent, RunResponse
-from agno.models.google import Gemini
-import google.generativeai as genai
+from agno.agent import Agent
+
+# shared modules from the repo root (pip install -e . - see pyproject.toml)
+from llm_backend import get_backend
+from semantic_cache import SemanticCache, remember
 
 # load all API keys from .env file
 load_dotenv(find_dotenv())
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Gemini, unless another backend is picked with LLM_BACKEND (e.g. "fake" to run offline)
+llm = get_backend(default="gemini")
 
 console = Console()
 
+# the agent's answers depend on the conversation so far - so they are only cached
+# for this conversation (in memory, keyed by its session, backend & model): a
+# question repeated (or reworded) later in the chat is answered from the cache.
+# Short prompts (usually follow-ups like "tell me more") are never cached
+session_id = str(uuid.uuid4())
+answers = SemanticCache(min_words=5, scope=f"{llm.name}/{llm.model_id('agent')}/{session_id}")
+
 my_agent = Agent(
     name="Basic Q&A Agent with history",
     # here you specify the model - we are using Google Gemini 2.0 Flash
-    model=Gemini(id="gemini-2.0-flash-exp"),
+    model=llm.agno_model(),
+    session_id=session_id,
     # the system message for this agent
     description=dedent(
         ## make it work like a local from Mumbai
@@ -84,6 +97,19 @@ while True:
         break
     # my_agent.print_response(user_prompt)
     console.print("[yellow]Thinking...[/yellow]", end="")
-    response: RunResponse = my_agent.run(user_prompt)
+    answer = answers.lookup(user_prompt)
+    if answer is None:
+        start = time.perf_counter()
+        answer = my_agent.run(user_prompt).content
+        answers.add(user_prompt, answer, time.perf_counter() - start)
+    else:
+        # so follow-up questions still know what we were talking about
+        remember(my_agent, user_prompt, answer)
     console.print("\r", end="")
-    console.print(Markdown(response.content))
+    console.print(Markdown(answer))
+
+stats = answers.stats()
+console.print(
+    f"[green]Answer cache: {stats['hits']}/{stats['lookups']} hits ({stats['hit_rate']:.0%}), "
+    f"saved {stats['time_saved']:.1f}s of LLM time[/green]"
+)
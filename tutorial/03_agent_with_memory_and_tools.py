@@ -27,13 +27,15 @@ from rich.console import Console
 from rich.markdown import Markdown
 
 from agno.agent import Agent, RunResponse
-from agno.models.google import Gemini
-from agno.tools.duckduckgo import DuckDuckGoTools
-import google.generativeai as genai
+
+# shared modules from the repo root (pip install -e . - see pyproject.toml)
+from llm_backend import get_backend
+from search_cache import CachedDuckDuckGoTools
 
 # load all API keys from .env file
 load_dotenv(find_dotenv())
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Gemini, unless another backend is picked with LLM_BACKEND (e.g. "fake" to run offline)
+llm = get_backend(default="gemini")
 
 console = Console()
 
@@ -41,7 +43,7 @@ console = Console()
 my_agent = Agent(
     name="Basic Q&A Agent with history",
     # here you specify the model - we are using Google Gemini 2.0 Flash
-    model=Gemini(id="gemini-2.0-flash-exp"),
+    model=llm.agno_model(),
     # the system message for this agent
     description=dedent(
         ## make it work like a local from Mumbai
@@ -73,8 +75,8 @@ my_agent = Agent(
     # retain last 5 messages in memory
     add_history_to_messages=True,
     num_history_responses=5,
-    # add our web search tools
-    tools=[DuckDuckGoTools()],
+    # add our web search tools (repeated searches are answered from a cache)
+    tools=[CachedDuckDuckGoTools()],
     show_tool_calls=True,
 )
 
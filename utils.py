@@ -1,4 +1,5 @@
-"""utils.py - utility functions"""
+"""utils.py - utility functions, shared by the chat apps (chat_gpt_clone.py &
+sports_research_agent/app.py)"""
 
 import streamlit as st
 
@@ -15,3 +16,24 @@ def apply_styles():
   <hr class='divider' />""",
         unsafe_allow_html=True,
     )
+
+
+# no of (most recent) chat messages rendered on each rerun
+HISTORY_WINDOW = 20
+
+
+def render_chat_history(messages, window=HISTORY_WINDOW, key="chat_history"):
+    """render the most recent `window` messages, with a button to load earlier ones
+    (long chats otherwise re-render hundreds of messages on every rerun)"""
+    shown_key = f"{key}_shown"
+    shown = st.session_state.get(shown_key, window)
+    start = max(0, len(messages) - shown)
+
+    if start > 0:
+        if st.button(f"⬆️ Load earlier messages ({start} more)", key=f"{key}_load_earlier"):
+            st.session_state[shown_key] = shown + window
+            st.rerun()
+
+    for message in messages[start:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
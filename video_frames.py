@@ -0,0 +1,234 @@
+"""
+video_frames.py - shrink a video to its keyframes (+ audio track) before sending it
+    to the model
+
+Most of our footage (meetings, lectures) is long & static, so most frames are
+near-duplicates of the one before. Instead of uploading the whole video, we
+    1. decode a few frames per second (OpenCV) & shrink them to tiny grayscale thumbnails
+    2. find scene changes with vectorized NumPy differences between consecutive thumbnails
+    3. keep only those keyframes, downscaled, as JPEGs (with their timestamps) -
+       at most MAX_KEYFRAMES, spread evenly over the video, so a long, busy video
+       doesn't turn into hundreds of images in one request
+    4. extract the audio track (ffmpeg), so nothing that's said is lost
+
+get_or_extract_keyframes() keeps the result on disk, indexed by the content hash
+of the video, so later questions about the same video skip the decoding - & the
+audio file is named after that hash, so its File API upload is reused too.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from disk_cache import DiskCache, make_key
+
+# no of frames per second we look at
+SAMPLE_FPS = 1.0
+# mean absolute difference (0-255) between thumbnails that counts as a scene change
+SCENE_THRESHOLD = 12.0
+# keep at least one frame every so many seconds, even if nothing changes
+MAX_GAP = 60.0
+# keyframes are downscaled to (at most) this width
+FRAME_WIDTH = 768
+JPEG_QUALITY = 80
+# max no of keyframes kept (sent to the model)
+MAX_KEYFRAMES = 100
+# size of the thumbnails used to compare frames
+THUMB_SIZE = (64, 36)
+# no of sampled frames decoded (& compared) at a time
+BATCH_SIZE = 32
+# keyframes kept by get_or_extract_keyframes() - one sub directory per video
+KEYFRAMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "keyframes")
+
+
+@dataclass
+class Keyframes:
+    frames: List[str] = field(default_factory=list)  # paths to JPEG files
+    timestamps: List[float] = field(default_factory=list)  # seconds into the video
+    audio: Optional[str] = None  # path to the audio track (if any)
+    original_bytes: int = 0
+    work_dir: Optional[str] = None
+
+    @property
+    def reduced_bytes(self) -> int:
+        paths = self.frames + ([self.audio] if self.audio else [])
+        return sum(os.path.getsize(path) for path in paths)
+
+    def cleanup(self):
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def select_keyframes(
+    thumbs: np.ndarray,
+    timestamps: np.ndarray,
+    previous: Optional[np.ndarray] = None,
+    last_kept: float = -np.inf,
+    threshold: float = SCENE_THRESHOLD,
+    max_gap: float = MAX_GAP,
+) -> List[int]:
+    """indices of the keyframes in a batch of (n, h, w) grayscale thumbnails.
+    `previous` is the last thumbnail of the previous batch & `last_kept` the
+    timestamp of the last keyframe so far"""
+    if previous is None:
+        # the very first frame is always a keyframe
+        diffs = np.concatenate([[np.inf], _mean_diffs(thumbs)])
+    else:
+        diffs = _mean_diffs(np.concatenate([previous[np.newaxis], thumbs]))
+
+    keep = []
+    for i in range(len(thumbs)):
+        if diffs[i] > threshold or timestamps[i] - last_kept >= max_gap:
+            keep.append(i)
+            last_kept = timestamps[i]
+    return keep
+
+
+def thin_keyframes(keyframes: Keyframes, max_frames: int = MAX_KEYFRAMES) -> None:
+    """keep at most `max_frames` of the keyframes, evenly spaced (the first & last
+    are kept) - the others are deleted"""
+    if len(keyframes.frames) <= max_frames:
+        return
+    keep = set(np.linspace(0, len(keyframes.frames) - 1, max_frames).round().astype(int).tolist())
+    for i, path in enumerate(keyframes.frames):
+        if i not in keep:
+            os.remove(path)
+    keyframes.frames = [path for i, path in enumerate(keyframes.frames) if i in keep]
+    keyframes.timestamps = [t for i, t in enumerate(keyframes.timestamps) if i in keep]
+
+
+def _mean_diffs(thumbs: np.ndarray) -> np.ndarray:
+    """mean absolute difference of each thumbnail from the one before (all at once)"""
+    return np.abs(np.diff(thumbs.astype(np.int16), axis=0)).mean(axis=(1, 2))
+
+
+def extract_audio(video_path: str, out_dir: str, name: str = "audio.mp3") -> Optional[str]:
+    """copy the audio track to a (small) mp3 file with ffmpeg - None if there is
+    no audio track or ffmpeg is not installed"""
+    if shutil.which("ffmpeg") is None:
+        return None
+    audio_path = os.path.join(out_dir, name)
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-vn", "-ac", "1", "-b:a", "48k", audio_path],
+        capture_output=True,
+    )
+    if result.returncode != 0 or not os.path.exists(audio_path):
+        return None
+    return audio_path
+
+
+def extract_keyframes(
+    video_path: str,
+    sample_fps: float = SAMPLE_FPS,
+    threshold: float = SCENE_THRESHOLD,
+    max_gap: float = MAX_GAP,
+    frame_width: int = FRAME_WIDTH,
+    max_frames: int = MAX_KEYFRAMES,
+    out_dir: Optional[str] = None,
+    audio_name: str = "audio.mp3",
+) -> Keyframes:
+    """decode the video & keep only the scene-change keyframes (at most `max_frames`)
+    + the audio track - written to `out_dir` (kept), or a temp dir (removed by cleanup())"""
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {video_path}")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, round(fps / sample_fps))
+    keyframes = Keyframes(original_bytes=os.path.getsize(video_path))
+    if out_dir is None:
+        keyframes.work_dir = out_dir = tempfile.mkdtemp()
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+
+    # frames are decoded in batches, so we never hold more than a batch in memory
+    thumbs, timestamps, frames = [], [], []
+    previous, last_kept = None, -np.inf
+
+    def flush():
+        nonlocal previous, last_kept
+        if not thumbs:
+            return
+        keep = select_keyframes(np.array(thumbs), np.array(timestamps), previous, last_kept, threshold, max_gap)
+        for i in keep:
+            path = os.path.join(out_dir, f"frame_{len(keyframes.frames):05d}.jpg")
+            cv2.imwrite(path, frames[i], [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            keyframes.frames.append(path)
+            keyframes.timestamps.append(timestamps[i])
+            last_kept = timestamps[i]
+        previous = thumbs[-1]
+        thumbs.clear()
+        timestamps.clear()
+        frames.clear()
+
+    index = 0
+    while capture.grab():
+        if index % step == 0:
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            thumbs.append(cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA))
+            timestamps.append(index / fps)
+            height, width = frame.shape[:2]
+            if width > frame_width:
+                frame = cv2.resize(
+                    frame, (frame_width, round(height * frame_width / width)), interpolation=cv2.INTER_AREA
+                )
+            frames.append(frame)
+            if len(frames) == BATCH_SIZE:
+                flush()
+        index += 1
+    capture.release()
+    flush()
+    thin_keyframes(keyframes, max_frames)
+
+    keyframes.audio = extract_audio(video_path, out_dir, audio_name)
+    return keyframes
+
+
+def _prune_keyframes(cache_dir: str, max_age: float) -> None:
+    """delete the keyframes of videos nobody asked about for `max_age` seconds"""
+    if not os.path.isdir(cache_dir):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def get_or_extract_keyframes(
+    video_path: str, content_hash: str, index: DiskCache, cache_dir: str = KEYFRAMES_DIR
+) -> Tuple[Keyframes, bool]:
+    """the keyframes (+ audio track) of a video & whether they were reused - only
+    extracted if the same content has not been extracted before (or its files are gone)"""
+    key = make_key(
+        stage="keyframes", sha256=content_hash, sample_fps=SAMPLE_FPS, threshold=SCENE_THRESHOLD,
+        max_gap=MAX_GAP, frame_width=FRAME_WIDTH, max_frames=MAX_KEYFRAMES,
+    )
+    # the audio file name is also its File API name (agno uploads it under its
+    # stem), so the same video's audio is uploaded once, not on every question
+    video_dir = os.path.join(cache_dir, content_hash[:32])
+    entry = index.get(key)
+    if entry is not None:
+        keyframes = Keyframes(**entry)
+        paths = keyframes.frames + ([keyframes.audio] if keyframes.audio else [])
+        if os.path.isdir(video_dir) and all(os.path.exists(path) for path in paths):
+            # still in use - not pruned
+            os.utime(video_dir)
+            return keyframes, True
+
+    if index.ttl is not None:
+        _prune_keyframes(cache_dir, index.ttl)
+    shutil.rmtree(video_dir, ignore_errors=True)
+    keyframes = extract_keyframes(video_path, out_dir=video_dir, audio_name=f"audio-{content_hash[:32]}.mp3")
+    index.set(key, asdict(keyframes))
+    return keyframes, False
@@ -1,24 +1,22 @@
 import streamlit as st
 from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.duckduckgo import DuckDuckGoTools
-from google.generativeai import upload_file, get_file
-import google.generativeai as genai
+from agno.media import Audio, Image
 
 import time
 from pathlib import Path
 
-import tempfile
-
 from dotenv import load_dotenv
+from llm_backend import configure_gemini, get_backend
+from search_cache import CachedDuckDuckGoTools
+from video_upload import save_upload, get_or_upload_video, upload_index
+from video_frames import get_or_extract_keyframes
+from tracing import render_trace_panel, span, start_span, use_span
 
 load_dotenv()
 
-import os
-
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if API_KEY:
-    genai.configure(api_key=API_KEY)
+# the File API (uploads) always needs Gemini - configured once per process, not
+# on every rerun (that would drop the API client's open connections)
+configure_gemini()
 
 # Page configuration
 st.set_page_config(
@@ -33,8 +31,10 @@ st.header("Powered by Gemini 2.0 Flash Exp")
 def initialize_agent():
     return Agent(
         name="Video AI Summarizer",
-        model=Gemini(id="gemini-2.0-flash-exp"),
-        tools=[DuckDuckGoTools()],
+        # Gemini, unless another backend is picked with LLM_BACKEND
+        # (uploads always go to the Gemini File API though)
+        model=get_backend(default="gemini").agno_model(),
+        tools=[CachedDuckDuckGoTools()],
         markdown=True,
     )
 
@@ -50,9 +50,8 @@ video_file = st.file_uploader(
 )
 
 if video_file:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        temp_video.write(video_file.read())
-        video_path = temp_video.name
+    # copy the upload to disk in blocks (not as one big in-memory copy) & hash it
+    video_path, video_hash = save_upload(video_file, suffix=".mp4")
 
     st.video(video_path, format="video/mp4", start_time=0)
 
@@ -61,19 +60,23 @@ if video_file:
         placeholder="Ask anything about the video content. The AI agent will analyze and gather additional context if needed.",
         help="Provide specific questions or insights you want from the video.",
     )
+    keyframes_only = st.checkbox(
+        "Send only keyframes + audio (faster for long, mostly static videos)",
+        value=True,
+        help="Only frames where the scene changes (and the audio track) are sent to the model, instead of the whole video.",
+    )
 
     if st.button("🔍 Analyze Video", key="analyze_video_button"):
         if not user_query:
             st.warning("Please enter a question or insight to analyze the video.")
         else:
+            keyframes = None
+            reused = False
+            # one trace per analysis - keyframes, upload & agent run are timed in it
+            analysis = start_span("video_summarizer.analyze", keyframes_only=keyframes_only)
             try:
-                with st.spinner("Processing video and gathering insights..."):
-                    # Upload and process video file
-                    processed_video = upload_file(video_path)
-                    while processed_video.state.name == "PROCESSING":
-                        time.sleep(1)
-                        processed_video = get_file(processed_video.name)
-
+                start_time = time.perf_counter()
+                with st.spinner("Processing video and gathering insights..."), use_span(analysis):
                     # Prompt generation for analysis
                     analysis_prompt = f"""
                         Analyze the uploaded video for content and context.
@@ -83,19 +86,71 @@ if video_file:
                         Provide a detailed, user-friendly, and actionable response.
                         """
 
-                    # AI agent processing
-                    response = multimodal_Agent.run(
-                        analysis_prompt, videos=[processed_video]
-                    )
+                    if keyframes_only:
+                        # decode locally & keep only the scene changes + audio track
+                        # - skipped if this video was decoded before (its audio upload is reused too)
+                        with span("video.keyframes") as trace:
+                            keyframes, reused = get_or_extract_keyframes(video_path, video_hash, upload_index)
+                            trace.set(frames=len(keyframes.frames), bytes=keyframes.reduced_bytes, reused=reused)
+                        frame_times = ", ".join(
+                            f"{int(t) // 60:02d}:{int(t) % 60:02d}"
+                            for t in keyframes.timestamps
+                        )
+                        analysis_prompt += f"""
+                        The video is provided as its keyframes (one image per scene, taken at
+                        {frame_times} respectively) and its audio track.
+                        """
+                        sent_bytes = keyframes.reduced_bytes
+                        # AI agent processing
+                        with span("agent.run", agent="Video AI Summarizer", bytes=sent_bytes):
+                            response = multimodal_Agent.run(
+                                analysis_prompt,
+                                images=[Image(filepath=frame) for frame in keyframes.frames],
+                                audio=[Audio(filepath=keyframes.audio)] if keyframes.audio else None,
+                            )
+                    else:
+                        # Upload (in resumable chunks) and wait till the video is processed
+                        # - skipped if this video was uploaded before (nothing is sent then)
+                        with span("video.upload") as trace:
+                            processed_video, reused = get_or_upload_video(video_path, video_hash)
+                            sent_bytes = 0 if reused else Path(video_path).stat().st_size
+                            trace.set(bytes=sent_bytes, reused=reused)
+                        # AI agent processing
+                        with span("agent.run", agent="Video AI Summarizer", bytes=sent_bytes):
+                            response = multimodal_Agent.run(
+                                analysis_prompt, videos=[processed_video]
+                            )
+                elapsed = time.perf_counter() - start_time
 
                 # Display the result
                 st.subheader("Analysis Result")
                 st.markdown(response.content)
+                original_bytes = Path(video_path).stat().st_size
+                if reused and keyframes:
+                    sent = (
+                        f"Reused the keyframes of this video ({sent_bytes / 1e6:,.1f} MB "
+                        f"of {original_bytes / 1e6:,.1f} MB)"
+                    )
+                elif reused:
+                    sent = f"Reused the upload of this video ({original_bytes / 1e6:,.1f} MB, nothing sent)"
+                elif original_bytes:
+                    sent = (
+                        f"Sent {sent_bytes / 1e6:,.1f} MB of {original_bytes / 1e6:,.1f} MB "
+                        f"({100 * (1 - sent_bytes / original_bytes):.0f}% less)"
+                    )
+                else:
+                    sent = f"Sent {sent_bytes / 1e6:,.1f} MB (empty video file)"
+                st.caption(
+                    f"{sent} · {elapsed:.1f}s end to end"
+                    + (f" · {len(keyframes.frames)} keyframes" if keyframes else "")
+                )
 
             except Exception as error:
+                analysis.end(error=error)
                 st.error(f"An error occurred during analysis: {error}")
             finally:
-                # Clean up temporary video file
+                analysis.end()
+                # Clean up temporary video file (the keyframes are kept for the next question)
                 Path(video_path).unlink(missing_ok=True)
 else:
     st.info("Upload a video file to begin analysis.")
@@ -111,3 +166,5 @@ st.markdown(
     """,
     unsafe_allow_html=True,
 )
+
+render_trace_panel("video_summarizer")
@@ -1,11 +1,93 @@
+import math
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-import google.generativeai as genai
 import streamlit as st
 from youtube_transcript_api import YouTubeTranscriptApi
+from transcript_chunks import (
+    chunk_entries,
+    chunk_overlaps,
+    stream_stitched,
+    TokenBuffer,
+    CHUNK_CHARS,
+    CHUNK_OVERLAP,
+)
+from disk_cache import DiskCache, hash_text, make_key
+from tree_summarizer import TreeSummarizer
+from llm_backend import LLMBackend, get_backend
+from knowledge_base import index_in_background
+from job_queue import JobQueue, QueueFull
+from transcript_index import SegmentIndex
+from registry import shared
+from tracing import propagate, render_trace_panel, span, start_span, traced, use_span
+
+# the backend's "default" model tier (see llm_backend.py)
+MODEL = "default"
+GENERATION_CONFIG = {"temperature": 0.0, "max_output_tokens": 1024 * 5}
+# max no of transcript chunks we punctuate (or summarize) at the same time
+MAX_WORKERS = 4
+# section size & fan-out of the summary tree (see tree_summarizer.py)
+SUMMARY_CHUNK_SIZE = 8000
+SUMMARY_FAN_OUT = 4
+# max no of videos transcribed at the same time (by all sessions) & max no waiting
+# for their turn - more are turned away (see job_queue.py)
+MAX_JOBS = 2
+MAX_QUEUED_JOBS = 20
+# how often a waiting session's position in line is updated (seconds)
+QUEUE_POLL_INTERVAL = 0.5
+# max no of places shown when searching the transcript
+MAX_MATCHES = 10
+
+PUNCTUATE_PROMPT = """
+    You are an expert transcriber, who can format raw text using the correct punctuations & formatting (such as inserting logical paragraphs, bullets or numbered lists where applicable) to create a professional looking text. 
+
+    ## Instructions ----
+    Don't generate any spurious text such as "Ok, here is....". 
+    {title_instructions}
+
+    Please transcribe the following raw script:
+
+    {video_transcript}
+    """
+
+TITLE_INSTRUCTIONS = """Do generate a title/header for the script with proper markdpwn followed by the script 
+    using professional formatting as described above."""
+
+CONTINUATION_INSTRUCTIONS = """Don't generate a title/header - this text continues from a previous part of the script,
+    so just generate the script using professional formatting as described above."""
+
+SUMMARY_PROMPT = """
+    Please summarize the following text. Do not miss out any key points & messages
+    from the text provided. Use good formatting in your response, such as paragraphs,
+    bullets, numbered lists etc., as appropriate. Don't generate any spurious text such as 
+    "Ok here is a summary..."
+
+    Text to summarize:
+
+    {text}
+    """
+
+MERGE_PROMPT = """
+    Below are summaries of consecutive parts of one long text, in order. Combine them
+    into a single summary of the whole text. Do not miss out any key points & messages
+    from the summaries provided. Use good formatting in your response, such as paragraphs,
+    bullets, numbered lists etc., as appropriate. Don't generate any spurious text such as 
+    "Ok here is a summary..."
+
+    Summaries to combine:
+
+    {summaries}
+    """
+
+# transcripts, punctuated transcripts & summaries are cached on disk, so a video
+# we have already processed (in any session/process) costs no API calls
+cache = DiskCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Gemini, unless another backend is picked with LLM_BACKEND (e.g. "fake" to run offline)
+llm = get_backend(default="gemini")
 
 
 def get_video_id(url):
@@ -28,46 +110,52 @@ def get_video_id(url):
 
 def get_model_response(prompt: str) -> str:
     """pass in any prompt to model & get response"""
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    gen_config = genai.GenerationConfig(temperature=0.0, max_output_tokens=1024 * 5)
-    response = model.generate_content(prompt, generation_config=gen_config)
+    return llm.generate(prompt, MODEL, **GENERATION_CONFIG)
 
-    return response.text
 
+def get_model_response_stream(prompt: str) -> Iterator[str]:
+    """pass in any prompt to model & get response, as the tokens are generated"""
+    return llm.stream(prompt, MODEL, **GENERATION_CONFIG)
 
-def get_punctuated_transcript(video_transcript: str) -> str:
-    """calls and LLM that punctuates raw text"""
 
-    prompt = f"""
-    You are an expert transcriber, who can format raw text using the correct punctuations & formatting (such as inserting logical paragraphs, bullets or numbered lists where applicable) to create a professional looking text. 
+def get_cache_key(stage: str, prompt_template: str, **inputs) -> str:
+    """cache key for an LLM stage - changes if the model, the prompt or
+    the generation config change, so stale results are never returned"""
+    return make_key(
+        stage=stage,
+        backend=llm.name,
+        model=llm.model_id(MODEL),
+        prompt=hash_text(prompt_template),
+        config=GENERATION_CONFIG,
+        **inputs,
+    )
 
-    ## Instructions ----
-    Don't generate any spurious text such as "Ok, here is....". 
-    Do generate a title/header for the script with proper markdpwn followed by the script 
-    using professional formatting as described above.
 
-    Please transcribe the following raw script:
+def get_punctuated_transcript(
+    video_transcript: str, continuation: bool = False, stream: bool = False
+):
+    """calls and LLM that punctuates raw text
+    (set continuation=True for all but the first chunk of a long transcript, so
+    the LLM does not generate a title for each chunk & stream=True to get the
+    response as an iterator of tokens)"""
 
-    {video_transcript}
-    """
+    prompt = PUNCTUATE_PROMPT.format(
+        title_instructions=(
+            CONTINUATION_INSTRUCTIONS if continuation else TITLE_INSTRUCTIONS
+        ),
+        video_transcript=video_transcript,
+    )
     # model = genai.GenerativeModel("gemini-1.5-flash")
     # response = model.generate_content(prompt)
 
+    if stream:
+        return get_model_response_stream(prompt)
     return get_model_response(prompt)
 
 
-def get_summary(text: str) -> str:
-    """summarize long text"""
-    prompt = f"""
-    Please summarize the following text. Do not miss out any key points & messages
-    from the text provided. Use good formatting in your response, such as paragraphs,
-    bullets, numbered lists etc., as appropriate. Don't generate any spurious text such as 
-    "Ok here is a summary..."
-
-    Text to summarize:
-
-    {text}
-    """
+def summarize_text(text: str) -> str:
+    """summarize (a section of) text with one LLM call"""
+    prompt = SUMMARY_PROMPT.format(text=text)
     # model = genai.GenerativeModel("gemini-1.5-flash")
     # gen_config = genai.GenerationConfig(temperature=0.0, max_output_tokens=1024 * 5)
     # response = model.generate_content(prompt, generation_config=gen_config)
@@ -75,53 +163,332 @@ def get_summary(text: str) -> str:
     return get_model_response(prompt)
 
 
+def merge_summaries(summaries: List[str]) -> str:
+    """combine summaries of consecutive parts of a long text into one summary"""
+    prompt = MERGE_PROMPT.format(summaries="\n\n---\n\n".join(summaries))
+    return get_model_response(prompt)
+
+
+def make_summarizer() -> TreeSummarizer:
+    """long texts are summarized as a tree - sections in parallel, then the partial
+    summaries are merged level by level. All nodes are cached on their content."""
+    return TreeSummarizer(
+        summarize_text,
+        merge_summaries,
+        chunk_size=SUMMARY_CHUNK_SIZE,
+        fan_out=SUMMARY_FAN_OUT,
+        max_workers=MAX_WORKERS,
+        cache=cache,
+        namespace=get_cache_key("summary", SUMMARY_PROMPT + MERGE_PROMPT),
+    )
+
+
+summarizer = make_summarizer()
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """send every LLM request of this module through `backend` (e.g. a
+    RateLimitedBackend) - the summarizer is rebuilt, so nothing holds on to the
+    old one"""
+    global llm, summarizer
+    llm = backend
+    summarizer = make_summarizer()
+
+
+def get_summary(text: str) -> str:
+    """summarize long text"""
+    return summarizer.summarize(text)
+
+
+def summarize_sections(sections: queue.Queue) -> str:
+    """consumer side of the transcript -> summary pipeline: summarizes each
+    punctuated section as soon as it arrives on the queue (None marks the end),
+    then merges the section summaries into one summary"""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        completed, leaves = [], []
+        summarize_leaf = propagate(summarizer.summarize_leaf)
+        while (section := sections.get()) is not None:
+            completed.append(section)
+            leaves.append(pool.submit(summarize_leaf, section))
+        # wait for the leaves, then build the rest of the tree (leaves are cached now)
+        for leaf in leaves:
+            leaf.result()
+    return summarizer.summarize_sections(completed)
+
+
+def index_transcript(video_id, text: str):
+    """add the transcript to the knowledge base the agents search (in the background)"""
+    index_in_background(
+        f"youtube:{video_id}", text, {"url": f"https://www.youtube.com/watch?v={video_id}"}
+    )
+
+
+def punctuate_chunk(chunk: str, continuation: bool) -> Iterator[str]:
+    """the punctuated chunk, as its tokens are generated - each chunk is cached
+    (on its text) once it's complete, so a transcript that failed halfway only
+    punctuates the chunks it didn't get to"""
+    key = get_cache_key(
+        "punctuated_chunk",
+        PUNCTUATE_PROMPT + (CONTINUATION_INSTRUCTIONS if continuation else TITLE_INSTRUCTIONS),
+        chunk=hash_text(chunk),
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    for token in get_punctuated_transcript(chunk, continuation, stream=True):
+        tokens.append(token)
+        yield token
+    cache.set(key, "".join(tokens))
+
+
+def get_punctuated_key(video_id) -> str:
+    return get_cache_key(
+        "punctuated_sections",
+        PUNCTUATE_PROMPT + TITLE_INSTRUCTIONS + CONTINUATION_INSTRUCTIONS,
+        video_id=video_id,
+        chunking=[CHUNK_CHARS, CHUNK_OVERLAP],
+    )
+
+
+def get_summary_key(video_id) -> str:
+    """the whole video's summary (the tree's nodes are cached on their own, too)"""
+    return get_cache_key(
+        "video_summary",
+        SUMMARY_PROMPT + MERGE_PROMPT,
+        video_id=video_id,
+        chunking=[CHUNK_CHARS, CHUNK_OVERLAP, SUMMARY_CHUNK_SIZE, SUMMARY_FAN_OUT],
+    )
+
+
+def fetch_transcript(video_id) -> List[Dict]:
+    """the raw transcript entries (text, start & duration)"""
+    # the raw transcript does not depend on the model/prompt, so it has its own key
+    with span("transcript.fetch", video_id=video_id) as trace:
+        transcript = cache.get_or_compute(
+            make_key(stage="transcript", video_id=video_id),
+            lambda: YouTubeTranscriptApi.get_transcript(video_id),
+        )
+        trace.set(entries=len(transcript))
+    return transcript
+
+
+def stream_transcript(video_id, sections: Optional[queue.Queue] = None) -> Iterator[str]:
+    """producer side of the pipeline: yields the punctuated transcript as it is
+    generated & puts each completed section on the `sections` queue (if given)"""
+    key = get_punctuated_key(video_id)
+    on_section = sections.put if sections is not None else None
+
+    try:
+        cached = cache.get(key)
+        if cached is not None:
+            for section in cached["sections"]:
+                if on_section:
+                    on_section(section)
+            # no-op if it's already in the knowledge base
+            index_transcript(video_id, cached["text"])
+            start_span("transcript.cached", video_id=video_id, chars=len(cached["text"])).end()
+            yield cached["text"]
+            return
+
+        transcript = fetch_transcript(video_id)
+        # split into overlapping chunks, so long videos don't run into the
+        # model's output token limit
+        chunks = chunk_entries(transcript)
+        # now ask our LLM to punctuate all the chunks in parallel - the text is
+        # stitched back in order as it streams in (only the first chunk gets a title)
+        buffers = [TokenBuffer() for _ in chunks]
+        pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        # (ended when the whole transcript has streamed) - the chunks' LLM calls nest under it
+        punctuate = start_span("transcript.punctuate", video_id=video_id, chunks=len(chunks))
+        with use_span(punctuate):
+            for i, (chunk, buffer) in enumerate(zip(chunks, buffers)):
+                pool.submit(buffer.fill, punctuate_chunk(chunk, i > 0))
+
+        parts, completed = [], []
+
+        def on_chunk(section: str):
+            completed.append(section)
+            if on_section:
+                on_section(section)
+
+        try:
+            for text in stream_stitched(buffers, on_chunk=on_chunk, overlaps=chunk_overlaps(transcript)):
+                parts.append(text)
+                yield text
+        finally:
+            # don't start any more chunks if the reader stopped early
+            pool.shutdown(wait=False, cancel_futures=True)
+            punctuate.set(chars=sum(len(part) for part in parts))
+            punctuate.end()
+
+        # the timestamps are kept with it, for questions about parts of the video
+        segments = SegmentIndex.from_entries(transcript)
+        cache.set(key, {"text": "".join(parts), "sections": completed, "segments": segments.to_dict()})
+        index_transcript(video_id, "".join(parts))
+    finally:
+        if sections is not None:
+            sections.put(None)
+
+
 def get_transcript(video_id):
-    transcript = YouTubeTranscriptApi.get_transcript(video_id)
-    full_transcript = " ".join(
-        [entry["text"] for entry in transcript]
-    )  # Combine into one string
-    # now ask our LLM to punctuate it
-    return get_punctuated_transcript(full_transcript)
+    return "".join(stream_transcript(video_id))
+
+
+def get_segment_index(video_id) -> SegmentIndex:
+    """the raw transcript with its timestamps (see transcript_index.py) - from the
+    punctuated transcript's cache entry, if it's been processed"""
+    cached = cache.get(get_punctuated_key(video_id))
+    if cached is not None and "segments" in cached:
+        return SegmentIndex.from_dict(cached["segments"])
+    return SegmentIndex.from_entries(fetch_transcript(video_id))
+
+
+def summarize_range(video_id, start: float, end: float) -> str:
+    """summarize what was said from `start` till `end` (seconds) - only that part
+    of the transcript goes to the LLM"""
+    with span("transcript.range", video_id=video_id, start=start, end=end) as trace:
+        text = get_segment_index(video_id).text_between(start, end)
+        trace.set(chars=len(text))
+        return get_summary(text) if text else ""
+
+
+def format_time(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
 
 
 # -------------------------------------------------------------------
 
-st.set_page_config(
-    page_title="Generative AI Video Transcriber",
-    page_icon="✨",
-)
+# sessions asking for the same video share one run, & only MAX_JOBS videos are
+# processed at a time (the script is re-run on every interaction, so the queue
+# is kept in the registry - one for all sessions)
+jobs = shared("video_transcriber.jobs", lambda: JobQueue(MAX_JOBS, MAX_QUEUED_JOBS))
 
-st.title("YouTube Video Transcriber 📽️💬")
 
-video_url = st.text_input(
-    "Enter (or paste) YouTube Video URL into text box below and press Enter to transcribe & summarize it:"
-)
+def wait_for_turn(ticket) -> None:
+    """show the user their place in line, till it's their turn"""
+    if ticket.wait(timeout=0):
+        return
+    status = st.empty()
+    with span("job.wait", video_id=ticket.key, coalesced=not ticket.leader):
+        while not ticket.wait(timeout=QUEUE_POLL_INTERVAL):
+            position = ticket.position()
+            if not ticket.leader:
+                status.info(
+                    "⏳ Someone else is transcribing this video right now - you'll see it as soon as it's done"
+                    + (f" (#{position} in line)" if position else "")
+                )
+            else:
+                status.info(f"⏳ Lots of videos are being transcribed right now - you're #{position} in line")
+    status.empty()
 
 
-if video_url:
-    video_id = get_video_id(video_url)
+def render_summary_header() -> None:
+    st.markdown("---")
+    st.markdown(
+        f"<h2 style='color=skyblue;'>Summary</h2>",
+        unsafe_allow_html=True,
+    )
 
-    if video_id:
-        try:
-            st.video(video_url)
-            with st.spinner("Generating transcript & summary..."):
-                transcript = get_transcript(video_id)
-                summary = get_summary(transcript)
-            st.write(transcript)
-            # transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            # full_transcript = " ".join(
-            #     [entry["text"] for entry in transcript]
-            # )  # Combine into one string
-            # st.write("Transcript:")
-            # st.write(full_transcript)  # Display the transcript in Streamlit
-
-            st.markdown("---")
-            st.markdown(
-                f"<h2 style='color=skyblue;'>Summary</h2>",
-                unsafe_allow_html=True,
-            )
-            st.write(summary)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
-    elif video_url:
-        st.error("Invalid YouTube URL. Please enter a valid URL.")
+
+def render_follow_ups(video_id) -> None:
+    """questions about parts of the video - answered from the segment index, with
+    (at most) a small LLM call, instead of processing the whole video again"""
+    segments = get_segment_index(video_id)
+    if not len(segments):
+        return
+    st.markdown("---")
+    minutes = max(math.ceil(segments.duration / 60), 1)
+    start, end = st.slider("Summarize minutes", 0, minutes, (0, min(minutes, 10)))
+    if st.button("Summarize this part"):
+        with st.spinner(f"Summarizing minutes {start}-{end}..."):
+            st.write(summarize_range(video_id, start * 60, end * 60) or "Nothing is said in this part of the video.")
+
+    phrase = st.text_input("Find where something is said in the video:")
+    if phrase:
+        matches = segments.find(phrase, limit=MAX_MATCHES)
+        if not matches:
+            st.caption(f'"{phrase}" is not said in the video.')
+        for seconds, snippet in matches:
+            url = f"https://www.youtube.com/watch?v={video_id}&t={int(seconds)}s"
+            st.markdown(f"[{format_time(seconds)}]({url}) …{snippet}…")
+
+
+def render_video(video_id) -> None:
+    """transcribe & summarize the video, as the results come in"""
+    # the summary is generated (in the background) from the sections of the
+    # transcript as they are completed, while the transcript is still streaming in
+    sections = queue.Queue()
+    with ThreadPoolExecutor(max_workers=1) as summary_pool:
+        summary = summary_pool.submit(propagate(summarize_sections), sections)
+        st.write_stream(stream_transcript(video_id, sections))
+
+        render_summary_header()
+        with st.spinner("Generating summary..."):
+            st.write(summary.result())
+    cache.set(get_summary_key(video_id), summary.result())
+
+
+def transcribe_video(video_id) -> Tuple[str, str]:
+    """the punctuated transcript & summary of a video, without the UI - the same
+    pipeline (& cache entries) as render_video, for batch runs"""
+    summary = cache.get(get_summary_key(video_id))
+    if summary is not None and cache.get(get_punctuated_key(video_id)) is not None:
+        return get_transcript(video_id), summary
+
+    sections = queue.Queue()
+    with ThreadPoolExecutor(max_workers=1) as summary_pool:
+        summary = summary_pool.submit(propagate(summarize_sections), sections)
+        transcript = "".join(stream_transcript(video_id, sections))
+    cache.set(get_summary_key(video_id), summary.result())
+    return transcript, summary.result()
+
+
+@traced("video_transcriber.rerun")
+def main():
+    """the Streamlit app (see batch_transcriber.py to process a list of videos)"""
+    st.set_page_config(
+        page_title="Generative AI Video Transcriber",
+        page_icon="✨",
+    )
+
+    st.title("YouTube Video Transcriber 📽️💬")
+
+    video_url = st.text_input(
+        "Enter (or paste) YouTube Video URL into text box below and press Enter to transcribe & summarize it:"
+    )
+
+    if video_url:
+        video_id = get_video_id(video_url)
+
+        if video_id:
+            try:
+                st.video(video_url)
+                summary = cache.get(get_summary_key(video_id))
+                if summary is not None and cache.get(get_punctuated_key(video_id)) is not None:
+                    # processed before - shown straight from the cache, without a
+                    # place in the job queue (so are the follow-up questions, on
+                    # every rerun they cause)
+                    st.write_stream(stream_transcript(video_id))
+                    render_summary_header()
+                    st.write(summary)
+                else:
+                    # (sessions waiting for the same video get its results from the cache)
+                    with jobs.ticket(video_id) as ticket:
+                        wait_for_turn(ticket)
+                        render_video(video_id)
+                render_follow_ups(video_id)
+            except QueueFull:
+                st.warning("Too many videos are being transcribed right now - please try again in a minute.")
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+        elif video_url:
+            st.error("Invalid YouTube URL. Please enter a valid URL.")
+
+
+if __name__ == "__main__":
+    main()
+    render_trace_panel("video_transcriber")
@@ -0,0 +1,177 @@
+"""
+video_upload.py - upload (large) videos to the Gemini File API
+
+- save_upload() streams a Streamlit upload to a temp file in fixed-size blocks,
+  so the video is never copied in memory as one big bytes object, hashing the
+  content on the way
+- upload_video() uses the File API's resumable upload protocol: the file is sent
+  in chunks & if a chunk fails (network hiccup) we ask the server how much it has
+  received and carry on from there, instead of starting from scratch
+- wait_for_processing() polls the file's state with exponential backoff & gives
+  up after a timeout, so a worker is never blocked forever
+- get_or_upload_video() keeps an index (shared by all sessions & processes, and
+  persisted on disk) from the content hash to the uploaded file, so the same
+  video is only uploaded & processed once while the uploaded file is alive (it
+  also tells if the file was reused, i.e. nothing was sent)
+
+Note: the resumable protocol needs chunks to be sent in order, so chunks are
+uploaded one after another - a single connection saturates the uplink anyway.
+"""
+
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Tuple
+
+from google.generativeai import get_file
+
+from disk_cache import DiskCache, make_key
+
+UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+# size of blocks we read/write the upload with
+BLOCK_SIZE = 1024 * 1024
+# upload chunk size - must be a multiple of 256 KB (except for the last chunk)
+CHUNK_SIZE = 16 * 1024 * 1024
+# no of times a failed chunk is retried (after asking the server where to resume)
+MAX_RETRIES = 5
+# per-request timeout (seconds)
+REQUEST_TIMEOUT = 60
+# the File API deletes uploaded files after 48 hours - don't reuse a file that's
+# about to expire (seconds)
+EXPIRY_MARGIN = 15 * 60
+
+# content hash -> uploaded file, shared by all sessions/processes (survives restarts)
+upload_index = DiskCache(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "uploads"),
+    ttl=48 * 60 * 60,
+)
+
+
+def save_upload(
+    uploaded_file: BinaryIO, suffix: str = ".mp4", block_size: int = BLOCK_SIZE
+) -> Tuple[str, str]:
+    """copy an uploaded file to a temp file, one block at a time & return its
+    path and the SHA-256 hash of its content"""
+    sha256 = hashlib.sha256()
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_video:
+        while block := uploaded_file.read(block_size):
+            sha256.update(block)
+            temp_video.write(block)
+    return temp_video.name, sha256.hexdigest()
+
+
+def _request(url: str, headers: dict, data: bytes = b""):
+    request = urllib.request.Request(url, data=data, headers=headers, method="POST")
+    return urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT)
+
+
+def start_upload(path: str, mime_type: Optional[str] = None, api_key: Optional[str] = None) -> str:
+    """start a resumable upload session for the file & return the session URL"""
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    mime_type = mime_type or mimetypes.guess_type(path)[0] or "video/mp4"
+    headers = {
+        "X-Goog-Upload-Protocol": "resumable",
+        "X-Goog-Upload-Command": "start",
+        "X-Goog-Upload-Header-Content-Length": str(os.path.getsize(path)),
+        "X-Goog-Upload-Header-Content-Type": mime_type,
+        "Content-Type": "application/json",
+    }
+    body = json.dumps({"file": {"display_name": Path(path).name}}).encode("utf-8")
+    with _request(f"{UPLOAD_URL}?key={api_key}", headers, body) as response:
+        return response.headers["X-Goog-Upload-URL"]
+
+
+def query_upload(session_url: str) -> int:
+    """no of bytes the server has received so far for an upload session"""
+    headers = {"X-Goog-Upload-Command": "query"}
+    with _request(session_url, headers) as response:
+        if response.headers.get("X-Goog-Upload-Status") == "final":
+            return -1
+        return int(response.headers.get("X-Goog-Upload-Size-Received", 0))
+
+
+def resume_upload(path: str, session_url: str, offset: int = 0, chunk_size: int = CHUNK_SIZE) -> str:
+    """upload the file from `offset` onwards in chunks, resuming after failed chunks.
+    Returns the name of the uploaded file (e.g. "files/abc123")"""
+    size = os.path.getsize(path)
+    retries = 0
+    with open(path, "rb") as f:
+        while True:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            last = offset + len(chunk) >= size
+            headers = {
+                "Content-Length": str(len(chunk)),
+                "X-Goog-Upload-Offset": str(offset),
+                "X-Goog-Upload-Command": "upload, finalize" if last else "upload",
+            }
+            try:
+                with _request(session_url, headers, chunk) as response:
+                    if last:
+                        return json.loads(response.read())["file"]["name"]
+                offset += len(chunk)
+                retries = 0
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                # client errors (other than timeouts/throttling) won't go away on a retry
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500 and e.code not in (408, 429):
+                    raise
+                retries += 1
+                if retries > MAX_RETRIES:
+                    raise
+                time.sleep(min(2**retries, 30))
+                # pick up from wherever the server got to (if it's reachable again)
+                try:
+                    offset = query_upload(session_url)
+                except (urllib.error.URLError, TimeoutError, ConnectionError):
+                    continue
+                if offset < 0:
+                    raise RuntimeError("Upload was already finalized, start a new one")
+
+
+def wait_for_processing(file, timeout: float = 600, initial_delay: float = 0.5, max_delay: float = 10):
+    """poll the file's state (with exponential backoff) till it's done processing"""
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while file.state.name == "PROCESSING":
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"{file.name} still processing after {timeout} seconds")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        file = get_file(file.name)
+
+    if file.state.name == "FAILED":
+        raise RuntimeError(f"Processing of {file.name} failed")
+    return file
+
+
+def upload_video(path: str, chunk_size: int = CHUNK_SIZE, timeout: float = 600):
+    """upload a video with the resumable protocol & wait till it's ready to use"""
+    session_url = start_upload(path)
+    name = resume_upload(path, session_url, chunk_size=chunk_size)
+    return wait_for_processing(get_file(name), timeout=timeout)
+
+
+def get_or_upload_video(path: str, content_hash: str, index: DiskCache = upload_index) -> Tuple[Any, bool]:
+    """the processed, uploaded file for a video & whether it was reused - uploaded
+    only if the same content has not been uploaded before (or that upload has expired)"""
+    key = make_key(stage="uploaded_video", sha256=content_hash)
+    entry = index.get(key)
+    if entry is not None and entry["expires_at"] > time.time() + EXPIRY_MARGIN:
+        try:
+            file = get_file(entry["name"])
+            if file.state.name == "ACTIVE":
+                return file, True
+        except Exception:
+            # deleted on the server - upload it again
+            pass
+
+    file = upload_video(path)
+    index.set(key, {"name": file.name, "expires_at": file.expiration_time.timestamp()})
+    return file, False